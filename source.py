@@ -1,444 +1,4128 @@
-# import asyncio
-# import json
-# import uuid
-# from datetime import datetime
-# from decimal import Decimal
-# from typing import Any, Dict, List, Optional
-
-# import nest_asyncio
-# from mcp.server import Server
-# from mcp.types import (
-#     LATEST_PROTOCOL_VERSION,
-#     Prompt,
-#     PromptMessage,
-#     Resource,
-#     ResourceTemplate,
-#     TextContent,
-#     Tool,
-# )
-# import structlog
-# import asyncio
-# import json
-# import uuid
-# from datetime import datetime, timezone
-# from decimal import Decimal
-# from typing import Any, Dict, List, Optional
-
-# import nest_asyncio
-# from mcp.server import Server
-# from mcp.types import (
-#     LATEST_PROTOCOL_VERSION,
-#     Prompt,
-#     PromptMessage,
-#     Resource,
-#     ResourceTemplate,
-#     TextContent,
-#     Tool,
-# )
-# import structlog
+import asyncio
+import contextlib
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import multiprocessing
+import os
+import re
+import socket
+import struct
+import sys
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+from urllib.parse import parse_qs, unquote
+
+import nest_asyncio
+import numpy as np
+import uvicorn
+from mcp.server import Server
+from mcp.server.sse import SseServerTransport
+from mcp.server.stdio import stdio_server
+from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+from mcp.types import (
+    LATEST_PROTOCOL_VERSION,
+    Prompt,
+    PromptMessage,
+    Resource,
+    ResourceTemplate,
+    TextContent,
+    Tool,
+)
+import structlog
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+
+nest_asyncio.apply()
+logger = structlog.get_logger()
+mcp_server = Server("pe-orgair-server")
+
+# Mock Services Definitions (as defined in previous cells and needed for tool handlers)
+
+# Order of the seven dimension scores expected by the calculator
+DIMENSION_NAMES = [
+    "data_infrastructure",
+    "ai_governance",
+    "technology_stack",
+    "talent",
+    "leadership",
+    "use_case_portfolio",
+    "culture",
+]
+
+
+class MockOrgAIRCalculator:
+    def calculate(
+        self,
+        company_id: str,
+        sector_id: str,
+        dimension_scores: List[float],
+        talent_concentration: float,
+        hr_baseline: float,
+        position_factor: float,
+        evidence_count: int,
+    ) -> Dict[str, Any]:
+
+        avg_dimension_score = sum(dimension_scores) / len(dimension_scores) if dimension_scores else 0.0
+        vr_score = avg_dimension_score * (1 - talent_concentration / 2)
+        hr_score = hr_baseline * (1 + position_factor)
+        synergy_score = (vr_score * hr_score) / 100 * 0.5
+        final_score = (vr_score + hr_score + synergy_score) / 2.5
+        final_score = min(100.0, max(0.0, final_score))
+        ci_lower = max(0.0, final_score - (5 + (1-talent_concentration)*5))
+        ci_upper = min(100.0, final_score + (5 + talent_concentration*5))
+        sem = (ci_upper - ci_lower) / 3.92
+
+        return {
+            "score_id": str(uuid.uuid4()),
+            "company_id": company_id,
+            "final_score": float(final_score),
+            "components": {
+                "v_r_score": float(vr_score),
+                "h_r_score": float(hr_score),
+                "synergy_score": float(synergy_score),
+            },
+            "confidence_interval": {
+                "lower": float(ci_lower),
+                "upper": float(ci_upper),
+                "sem": float(sem),
+            },
+            "audit_trail": {
+                "weighted_mean": float(avg_dimension_score),
+                "cv": float(talent_concentration * 10),
+                "talent_risk_adj": float(talent_concentration * 15),
+            },
+            "timestamp": datetime.now(timezone.utc), # Use timezone.utc for consistency
+            "parameter_version": "v2.0",
+        }
+
+    def calculate_batch(
+        self,
+        dimension_scores: Any,
+        talent_concentration: Any,
+        hr_baseline: Any,
+        position_factor: Any,
+    ) -> Dict[str, np.ndarray]:
+        """Score N companies in one vectorized pass.
+
+        `dimension_scores` is an N x 7 matrix; the remaining arguments are
+        per-row arrays or scalars broadcast across all rows. Returns a dict of
+        float64 column arrays that match `calculate` element for element.
+        """
+        matrix = np.asarray(dimension_scores, dtype=np.float64)
+        if matrix.ndim != 2:
+            raise ValueError(f"dimension_scores must be a 2-D matrix, got shape {matrix.shape}")
+        n_rows, n_dims = matrix.shape
+        talent = np.broadcast_to(np.asarray(talent_concentration, dtype=np.float64), (n_rows,))
+        baseline = np.broadcast_to(np.asarray(hr_baseline, dtype=np.float64), (n_rows,))
+        position = np.broadcast_to(np.asarray(position_factor, dtype=np.float64), (n_rows,))
+
+        # Accumulate columns left to right so the mean rounds exactly like the
+        # scalar `sum(dimension_scores) / len(dimension_scores)`.
+        if n_dims:
+            total = matrix[:, 0].copy()
+            for j in range(1, n_dims):
+                total += matrix[:, j]
+            avg_dimension_score = total / n_dims
+        else:
+            avg_dimension_score = np.zeros(n_rows)
+
+        vr_score = avg_dimension_score * (1 - talent / 2)
+        hr_score = baseline * (1 + position)
+        synergy_score = (vr_score * hr_score) / 100 * 0.5
+        final_score = (vr_score + hr_score + synergy_score) / 2.5
+        final_score = np.minimum(100.0, np.maximum(0.0, final_score))
+        ci_lower = np.maximum(0.0, final_score - (5 + (1 - talent) * 5))
+        ci_upper = np.minimum(100.0, final_score + (5 + talent * 5))
+        sem = (ci_upper - ci_lower) / 3.92
+
+        return {
+            "final_score": final_score,
+            "v_r_score": vr_score,
+            "h_r_score": hr_score,
+            "synergy_score": synergy_score,
+            "ci_lower": ci_lower,
+            "ci_upper": ci_upper,
+            "sem": sem,
+            "weighted_mean": avg_dimension_score,
+            "cv": talent * 10,
+            "talent_risk_adj": talent * 15,
+        }
+
+MOCK_EVIDENCE_POOL = [
+    {"doc_id": "doc_1", "content": "Company X has invested heavily in cloud infrastructure, with specific mention of AWS Lambda and Azure Functions for scalable AI model deployment. Their data lake utilizes Snowflake.", "score": 0.95, "retrieval_method": "semantic", "metadata": {"company_id": "ACME-001", "dimension": "data_infrastructure", "source": "Q3 2023 Earnings Call Transcript"}},
+    {"doc_id": "doc_2", "content": "Recent job postings for 'AI Governance Lead' and 'Ethical AI Specialist' indicate a strong focus on responsible AI practices. They've also published an internal AI ethics guideline.", "score": 0.92, "retrieval_method": "keyword", "metadata": {"company_id": "ACME-001", "dimension": "ai_governance", "source": "Company Careers Page"}},
+    {"doc_id": "doc_3", "content": "Competitor Y recently launched an AI-powered customer service bot, reducing call center volume by 30%. Their technology stack appears to be largely open-source, including TensorFlow and PyTorch.", "score": 0.88, "retrieval_method": "semantic", "metadata": {"company_id": "GLOBAL-INC", "dimension": "tech_stack", "source": "Industry Report 2024"}},
+    {"doc_id": "doc_4", "content": "Internal HR data shows a 15% increase in AI/ML certifications among the engineering team over the last year. They run an internal AI academy.", "score": 0.91, "retrieval_method": "semantic", "metadata": {"company_id": "ACME-001", "dimension": "talent", "source": "Internal HR Report"}},
+    {"doc_id": "doc_5", "content": "The CEO's recent keynote emphasized 'AI-first' strategy and substantial investment in R&D, forming a dedicated AI steering committee.", "score": 0.93, "retrieval_method": "semantic", "metadata": {"company_id": "ACME-001", "dimension": "leadership", "source": "CEO Keynote Transcript"}},
+    {"doc_id": "doc_6", "content": "They are actively piloting AI solutions for predictive maintenance and supply chain optimization, with early success reported in cost reduction.", "score": 0.90, "retrieval_method": "keyword", "metadata": {"company_id": "ACME-001", "dimension": "use_case_portfolio", "source": "Pilot Project Update"}},
+    {"doc_id": "doc_7", "content": "An internal survey indicates high employee engagement with AI initiatives and a strong willingness to adapt to new AI tools.", "score": 0.89, "retrieval_method": "semantic", "metadata": {"company_id": "ACME-001", "dimension": "culture", "source": "Employee Engagement Survey"}},
+]
+
+# Queries containing these phrases ask for all of a company's evidence rather than a topic
+GENERIC_QUERY_PHRASES = ("ai readiness", "evidence")
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+
+
+def _tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; snake_case terms also emit their parts."""
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        if "_" in token:
+            tokens.extend(part for part in token.split("_") if part)
+    return tokens
+
+
+def _split_generic_query(query: str) -> Tuple[bool, str]:
+    """Return whether the query asks for all evidence, and the topical remainder."""
+    topic = query.lower()
+    generic = any(phrase in topic for phrase in GENERIC_QUERY_PHRASES)
+    for phrase in GENERIC_QUERY_PHRASES:
+        topic = topic.replace(phrase, " ")
+    return generic, topic.strip()
+
+
+class EvidenceIndex:
+    """In-memory inverted index over evidence content and metadata, ranked with BM25.
+
+    Postings map each term to {doc_number: term_frequency}; separate postings keyed by
+    company_id and dimension let filtered queries touch only the matching documents.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.prior_scores: List[float] = []
+        self.doc_lengths: List[int] = []
+        self.total_length = 0
+        self.term_postings: Dict[str, Dict[int, int]] = {}
+        self.company_postings: Dict[str, set] = {}
+        self.dimension_postings: Dict[str, set] = {}
+
+    def __len__(self) -> int:
+        return len(self.prior_scores)
+
+    def add(self, item: Dict[str, Any]) -> int:
+        """Index one evidence item dict and return its document number."""
+        metadata = item.get("metadata", {})
+        return self.add_document(
+            item["content"],
+            metadata.get("company_id"),
+            metadata.get("dimension"),
+            metadata.get("source", ""),
+            item.get("score", 0.0),
+        )
+
+    def add_document(
+        self,
+        content: str,
+        company_id: Optional[str],
+        dimension: Optional[str],
+        source: str,
+        prior_score: float,
+    ) -> int:
+        """Index one document's fields and return its document number."""
+        doc_number = len(self.prior_scores)
+        tokens = _tokenize(" ".join([content, dimension or "", source or ""]))
+
+        self.prior_scores.append(prior_score)
+        self.doc_lengths.append(len(tokens))
+        self.total_length += len(tokens)
+        for token in tokens:
+            postings = self.term_postings.setdefault(token, {})
+            postings[doc_number] = postings.get(doc_number, 0) + 1
+        self.company_postings.setdefault(company_id, set()).add(doc_number)
+        self.dimension_postings.setdefault(dimension, set()).add(doc_number)
+        return doc_number
+
+    def memory_bytes(self) -> int:
+        """Approximate heap size of the postings and per-document columns."""
+        postings = [self.term_postings, self.company_postings, self.dimension_postings]
+        return (
+            sys.getsizeof(self.prior_scores) + sys.getsizeof(self.doc_lengths)
+            + sum(sys.getsizeof(table) + sum(map(sys.getsizeof, table.values())) for table in postings)
+        )
+
+    def filtered_docs(self, company_id: Optional[str] = None, dimension: Optional[str] = None) -> Optional[set]:
+        """Documents allowed by the metadata filter, or None when unfiltered."""
+        allowed = None
+        if company_id:
+            allowed = self.company_postings.get(company_id, set())
+        if dimension:
+            dimension_docs = self.dimension_postings.get(dimension, set())
+            allowed = dimension_docs if allowed is None else allowed & dimension_docs
+        return allowed
+
+    def bm25_scores(self, query: str, allowed: Optional[set] = None) -> Dict[int, float]:
+        """Accumulate BM25 scores term-at-a-time over the postings of each query term."""
+        n_docs = len(self.prior_scores)
+        if not n_docs:
+            return {}
+        avg_length = self.total_length / n_docs
+        scores: Dict[int, float] = {}
+        for term in set(_tokenize(query)):
+            postings = self.term_postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            # Drive the loop from whichever side is smaller: the term postings or the filter
+            if allowed is not None and len(allowed) < len(postings):
+                matches = ((d, postings[d]) for d in allowed if d in postings)
+            else:
+                matches = ((d, tf) for d, tf in postings.items() if allowed is None or d in allowed)
+            for doc_number, tf in matches:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_number] / avg_length)
+                scores[doc_number] = scores.get(doc_number, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(
+        self,
+        query: str,
+        k: int,
+        company_id: Optional[str] = None,
+        dimension: Optional[str] = None,
+        allowed: Optional[set] = None,
+    ) -> List[Tuple[float, int]]:
+        """Return up to k (bm25_score, doc_number) pairs, best first.
+
+        `allowed` passes a filter already resolved by `filtered_docs`, so a batch of
+        queries over one company can share it.
+        """
+        if allowed is None:
+            allowed = self.filtered_docs(company_id, dimension)
+        generic, topic = _split_generic_query(query)
+        scores = self.bm25_scores(topic, allowed)
+        if generic and allowed is not None:
+            # A general query over a filtered company keeps every one of its documents
+            for doc_number in allowed:
+                scores.setdefault(doc_number, 0.0)
+        # Heap-based top-k; ties fall back to the precomputed evidence score
+        top = heapq.nlargest(
+            k,
+            scores.items(),
+            key=lambda entry: (entry[1], self.prior_scores[entry[0]], -entry[0]),
+        )
+        return [(score, doc_number) for doc_number, score in top]
+
+
+class HashedNgramEmbedder:
+    """Deterministic offline text embeddings built from signed, hashed character n-grams.
+
+    Uses crc32 rather than `hash()` so vectors are identical across processes and runs.
+    """
+
+    def __init__(self, dim: int = 256, ngram: int = 3):
+        self.dim = dim
+        self.ngram = ngram
+
+    def embed(self, text: str) -> np.ndarray:
+        padded = f" {' '.join(_TOKEN_PATTERN.findall(text.lower()))} "
+        hashes = np.fromiter(
+            (zlib.crc32(padded[i:i + self.ngram].encode()) for i in range(len(padded) - self.ngram + 1)),
+            dtype=np.uint32,
+        )
+        signs = np.where(hashes >> np.uint32(31), 1.0, -1.0).astype(np.float32)
+        vector = np.bincount(hashes % self.dim, weights=signs, minlength=self.dim).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_many(self, texts: Sequence[str]) -> np.ndarray:
+        return np.vstack([self.embed(text) for text in texts]) if texts else np.zeros((0, self.dim), np.float32)
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores: np.ndarray, rows: np.ndarray, k: int) -> List[Tuple[float, int]]:
+    """Best k (score, row) pairs via argpartition instead of a full sort."""
+    if k <= 0 or not len(scores):
+        return []
+    if len(scores) > k:
+        keep = np.argpartition(scores, -k)[-k:]
+        scores, rows = scores[keep], rows[keep]
+    order = np.argsort(-scores, kind="stable")
+    return [(float(scores[i]), int(rows[i])) for i in order]
+
+
+class BruteForceVectorIndex:
+    """Exact cosine search over every stored vector; the recall baseline for ANN indexes."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._vectors = np.zeros((16, dim), dtype=np.float32)
+        self._company_codes = np.zeros(16, dtype=np.int32)
+        self.size = 0
+        self.company_codes: Dict[Optional[str], int] = {}
+        self.company_rows: Dict[int, List[int]] = {}
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors[:self.size]
+
+    def add(self, vectors: np.ndarray, company_ids: Sequence[Optional[str]]) -> np.ndarray:
+        """Append L2-normalised vectors and return their row ids."""
+        vectors = _normalize_rows(vectors)
+        n_new = len(vectors)
+        if self.size + n_new > len(self._vectors):
+            capacity = max(self.size + n_new, 2 * len(self._vectors))
+            self._vectors = np.resize(self._vectors, (capacity, self.dim))
+            self._company_codes = np.resize(self._company_codes, capacity)
+        rows = np.arange(self.size, self.size + n_new)
+        self._vectors[rows] = vectors
+        for row, company_id in zip(rows.tolist(), company_ids):
+            code = self.company_codes.setdefault(company_id, len(self.company_codes))
+            self._company_codes[row] = code
+            self.company_rows.setdefault(code, []).append(row)
+        self.size += n_new
+        return rows
+
+    def memory_bytes(self) -> int:
+        return self._vectors.nbytes + self._company_codes.nbytes
+
+    def _company_subset(self, company_id: str) -> np.ndarray:
+        code = self.company_codes.get(company_id)
+        return np.asarray(self.company_rows.get(code, []), dtype=np.int64)
+
+    def _exact(self, query: np.ndarray, rows: np.ndarray, k: int) -> List[Tuple[float, int]]:
+        return _top_k(self._vectors[rows] @ query, rows, k)
+
+    def search(self, query: np.ndarray, k: int, company_id: Optional[str] = None) -> List[Tuple[float, int]]:
+        query = _normalize_rows(query)[0]
+        rows = self._company_subset(company_id) if company_id else np.arange(self.size)
+        return self._exact(query, rows, k)
+
+    def search_many(self, queries: np.ndarray, k: int, company_id: Optional[str] = None) -> List[List[Tuple[float, int]]]:
+        """Exact top-k for several queries over one shared candidate set, scored in a single matrix product."""
+        queries = _normalize_rows(queries)
+        rows = self._company_subset(company_id) if company_id else np.arange(self.size)
+        scores = self._vectors[rows] @ queries.T
+        return [_top_k(scores[:, column], rows, k) for column in range(len(queries))]
+
+
+def _spherical_kmeans(data: np.ndarray, n_clusters: int, n_iter: int, rng: np.random.Generator) -> np.ndarray:
+    """Lloyd iterations on the unit sphere (cosine assignment, normalised centroids)."""
+    centroids = data[rng.choice(len(data), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignment = np.argmax(data @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        occupied = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[occupied]
+        sums[occupied] = np.add.reduceat(data[order], starts, axis=0)
+        empty = counts == 0
+        if empty.any():
+            # Reseed empty clusters with random points so every list stays useful
+            sums[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+        centroids = _normalize_rows(sums)
+    return centroids
+
+
+class IVFVectorIndex(BruteForceVectorIndex):
+    """Inverted-file ANN index: vectors are bucketed by nearest k-means centroid and a
+    query scans only the `nprobe` closest buckets.
+
+    Below `train_threshold` vectors the index answers exactly. Company-filtered queries
+    are pre-filtered: small companies are scanned exactly, large ones probe the IVF lists
+    and drop rows from other companies before scoring.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        nlist: Optional[int] = None,
+        nprobe: int = 8,
+        train_threshold: int = 1024,
+        exact_filter_threshold: int = 4096,
+        n_iter: int = 10,
+        seed: int = 0,
+    ):
+        super().__init__(dim)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_threshold = train_threshold
+        self.exact_filter_threshold = exact_filter_threshold
+        self.n_iter = n_iter
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[np.ndarray] = []
+        self._pending: Dict[int, List[int]] = {}
+
+    def _assign(self, vectors: np.ndarray, chunk: int = 65536) -> np.ndarray:
+        return np.concatenate([
+            np.argmax(vectors[i:i + chunk] @ self.centroids.T, axis=1)
+            for i in range(0, len(vectors), chunk)
+        ]) if len(vectors) else np.zeros(0, dtype=np.int64)
+
+    def train(self) -> None:
+        """Cluster the stored vectors and (re)build every inverted list."""
+        rng = np.random.default_rng(self.seed)
+        nlist = min(self.size, self.nlist or max(1, int(math.sqrt(self.size))))
+        sample_size = min(self.size, nlist * 64)
+        sample = self.vectors[rng.choice(self.size, sample_size, replace=False)]
+        self.centroids = _spherical_kmeans(sample, nlist, self.n_iter, rng)
+        assignment = self._assign(self.vectors)
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(nlist + 1))
+        self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(nlist)]
+        self._pending = {}
+
+    def add(self, vectors: np.ndarray, company_ids: Sequence[Optional[str]]) -> np.ndarray:
+        rows = super().add(vectors, company_ids)
+        if self.centroids is None:
+            if self.size >= self.train_threshold:
+                self.train()
+        else:
+            for row, list_id in zip(rows.tolist(), self._assign(self._vectors[rows]).tolist()):
+                self._pending.setdefault(list_id, []).append(row)
+        return rows
+
+    def memory_bytes(self) -> int:
+        centroids = self.centroids.nbytes if self.centroids is not None else 0
+        return super().memory_bytes() + centroids + sum(ids.nbytes for ids in self._lists)
+
+    def _inverted_list(self, list_id: int) -> np.ndarray:
+        pending = self._pending.pop(list_id, None)
+        if pending:
+            self._lists[list_id] = np.concatenate([self._lists[list_id], pending])
+        return self._lists[list_id]
+
+    def search(self, query: np.ndarray, k: int, company_id: Optional[str] = None) -> List[Tuple[float, int]]:
+        query = _normalize_rows(query)[0]
+        if company_id:
+            subset = self._company_subset(company_id)
+            if self.centroids is None or len(subset) <= self.exact_filter_threshold:
+                return self._exact(query, subset, k)
+        elif self.centroids is None:
+            return self._exact(query, np.arange(self.size), k)
+
+        nprobe = min(self.nprobe, len(self._lists))
+        probe = np.argpartition(self.centroids @ query, -nprobe)[-nprobe:]
+        candidates = np.concatenate([self._inverted_list(int(i)) for i in probe])
+        if company_id:
+            candidates = candidates[self._company_codes[candidates] == self.company_codes[company_id]]
+        return self._exact(query, candidates, k)
+
+    def search_many(self, queries: np.ndarray, k: int, company_id: Optional[str] = None) -> List[List[Tuple[float, int]]]:
+        """Probe the inverted lists per query once trained; until then, and for small
+        filtered companies, score every query in one exact matrix product."""
+        if self.centroids is None or (company_id and len(self._company_subset(company_id)) <= self.exact_filter_threshold):
+            return super().search_many(queries, k, company_id)
+        return [self.search(query, k, company_id) for query in _normalize_rows(queries)]
+
+
+class LocalEmbeddingStore:
+    """Pluggable semantic leg: an embedder plus any vector index exposing add()/search()."""
+
+    def __init__(self, embedder: Optional[HashedNgramEmbedder] = None, index: Optional[BruteForceVectorIndex] = None):
+        self.embedder = embedder or HashedNgramEmbedder()
+        self.index = index if index is not None else IVFVectorIndex(self.embedder.dim)
+        self.doc_numbers: List[int] = []
+
+    def add(self, doc_number: int, text: str, company_id: Optional[str]) -> None:
+        self.index.add(self.embedder.embed(text)[None, :], [company_id])
+        self.doc_numbers.append(doc_number)
+
+    def add_many(self, doc_numbers: Sequence[int], texts: Sequence[str], company_ids: Sequence[Optional[str]]) -> None:
+        """Embed and index a batch in one vector-index append."""
+        if texts:
+            self.index.add(self.embedder.embed_many(texts), company_ids)
+            self.doc_numbers.extend(doc_numbers)
+
+    def memory_bytes(self) -> int:
+        return self.index.memory_bytes() + sys.getsizeof(self.doc_numbers)
+
+    def search(self, query: str, k: int, company_id: Optional[str] = None) -> List[Tuple[float, int]]:
+        """Return up to k (cosine, doc_number) pairs, best first."""
+        hits = self.index.search(self.embedder.embed(query), k, company_id=company_id)
+        return [(score, self.doc_numbers[row]) for score, row in hits]
+
+    def search_many(self, queries: Sequence[str], k: int, company_id: Optional[str] = None) -> List[List[Tuple[float, int]]]:
+        """Per-query (cosine, doc_number) lists, all scored against the same company's vectors."""
+        if not queries:
+            return []
+        hits = self.index.search_many(self.embedder.embed_many(queries), k, company_id=company_id)
+        return [[(score, self.doc_numbers[row]) for score, row in query_hits] for query_hits in hits]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[Tuple[float, int]]:
+    """Fuse ranked doc lists: score(d) = sum over lists of 1 / (k + rank(d))."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_number in enumerate(ranking, start=1):
+            fused[doc_number] = fused.get(doc_number, 0.0) + 1.0 / (k + rank)
+    return sorted(((score, doc) for doc, score in fused.items()), key=lambda entry: (-entry[0], entry[1]))
+
+
+# Estimated Jaccard similarity at or above which two evidence texts are near-duplicates
+NEAR_DUPLICATE_THRESHOLD = 0.7
+
+
+class MinHasher:
+    """MinHash signatures over hashed character shingles of normalised text.
+
+    The fraction of positions where two signatures agree estimates the Jaccard
+    similarity of the texts' shingle sets. Shingles use crc32 like the embedder, so
+    signatures are identical across processes and runs.
+    """
+
+    _PRIME = (1 << 31) - 1
+
+    def __init__(self, num_perm: int = 64, shingle: int = 5, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle = shingle
+        # Universal hashes (a*x + b) mod p stay below 2**62, so int64 never overflows
+        self._a = rng.integers(1, self._PRIME, num_perm, dtype=np.int64)[:, None]
+        self._b = rng.integers(0, self._PRIME, num_perm, dtype=np.int64)[:, None]
+
+    def signature(self, text: str) -> np.ndarray:
+        normalized = " ".join(_TOKEN_PATTERN.findall(text.lower()))
+        shingles = {normalized[i:i + self.shingle] for i in range(max(1, len(normalized) - self.shingle + 1))}
+        hashes = np.fromiter((zlib.crc32(shingle.encode()) for shingle in shingles), dtype=np.int64, count=len(shingles))
+        return ((self._a * (hashes % self._PRIME) + self._b) % self._PRIME).min(axis=1).astype(np.uint32)
+
+    def signatures(self, texts: Sequence[str]) -> np.ndarray:
+        return np.vstack([self.signature(text) for text in texts]) if texts else np.zeros((0, self.num_perm), np.uint32)
+
+
+def minhash_similarity(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Estimated Jaccard similarity between signature `a` and each row of `b` (or one signature)."""
+    return np.mean(np.atleast_2d(b) == a, axis=1)
+
+
+class LSHIndex:
+    """Banded locality-sensitive hashing over MinHash signatures.
+
+    Signatures are cut into `bands` bands of `rows` values; items sharing any whole band
+    are candidate near-duplicates. With 16 bands of 4 rows, pairs at Jaccard 0.7 collide
+    with probability ~0.98 and pairs at 0.3 with ~0.12.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets: List[Dict[bytes, List[Any]]] = [{} for _ in range(bands)]
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def query(self, signature: np.ndarray) -> List[Any]:
+        """Keys sharing at least one band with `signature`, in insertion order."""
+        found: Dict[Any, None] = {}
+        for buckets, band_key in zip(self._buckets, self._band_keys(signature)):
+            found.update(dict.fromkeys(buckets.get(band_key, ())))
+        return list(found)
+
+    def add(self, key: Any, signature: np.ndarray) -> None:
+        for buckets, band_key in zip(self._buckets, self._band_keys(signature)):
+            buckets.setdefault(band_key, []).append(key)
+
+    def memory_bytes(self) -> int:
+        return sum(sys.getsizeof(buckets) + sum(map(sys.getsizeof, buckets.values())) for buckets in self._buckets)
+
+
+class EvidenceStore:
+    """Read-only, offset-indexed columnar evidence file, opened via mmap.
+
+    Documents are stored sorted by (company_id, dimension) so each company and each
+    (company, dimension) group is a contiguous row range. Fixed-width columns (scores,
+    category codes, offsets) are NumPy views straight onto the mapped pages and content
+    is sliced out of the content blob on demand, so opening a store is O(1) and every
+    server process mapping the same file shares one copy in the page cache.
+
+    Layout: 8-byte magic, uint32 version, uint32 header length, a JSON header with the
+    string tables and section offsets, then 8-byte aligned sections.
+    """
+
+    MAGIC = b"ORGAIREV"
+    VERSION = 1
+    _PREFIX = struct.Struct("<8sII")
+
+    def __init__(self, buffer: Any):
+        self._buffer = buffer
+        self._view = memoryview(buffer)
+        magic, version, header_length = self._PREFIX.unpack_from(buffer, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError(f"Not an evidence store (magic={magic!r}, version={version})")
+        header = json.loads(bytes(self._view[self._PREFIX.size:self._PREFIX.size + header_length]))
+        self.companies: List[str] = header["companies"]
+        self.dimensions: List[str] = header["dimensions"]
+        self.sources: List[str] = header["sources"]
+        self.methods: List[str] = header["methods"]
+        self._company_codes = {company: code for code, company in enumerate(self.companies)}
+        self._dimension_codes = {dimension: code for code, dimension in enumerate(self.dimensions)}
+
+        sections = {
+            name: np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+            for name, (offset, dtype, count) in header["sections"].items()
+        }
+        self.scores = sections["scores"]
+        self.company_column = sections["company"]
+        self.dimension_column = sections["dimension"]
+        self.source_column = sections["source"]
+        self.method_column = sections["method"]
+        self._doc_id_offsets = sections["doc_id_offsets"]
+        self._content_offsets = sections["content_offsets"]
+        self._company_starts = sections["company_starts"]
+        self._group_company = sections["group_company"]
+        self._group_dimension = sections["group_dimension"]
+        self._group_starts = sections["group_starts"]
+        # Blob sections are sliced as raw bytes rather than through a NumPy view
+        self._doc_id_base = header["sections"]["doc_id_blob"][0]
+        self._content_base = header["sections"]["content_blob"][0]
+
+    @classmethod
+    def open(cls, path: str) -> "EvidenceStore":
+        with open(path, "rb") as handle:
+            return cls(mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @classmethod
+    def from_items(cls, items: Sequence[Dict[str, Any]]) -> "EvidenceStore":
+        """Build an in-memory store (same layout, backed by bytes instead of a file)."""
+        return cls(cls.encode(items))
+
+    @classmethod
+    def write(cls, path: str, items: Sequence[Dict[str, Any]]) -> str:
+        """Serialise items to `path` atomically so readers never map a partial file."""
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as handle:
+            handle.write(cls.encode(items))
+        os.replace(temp_path, path)
+        return path
+
+    @classmethod
+    def encode(cls, items: Sequence[Dict[str, Any]]) -> bytes:
+        companies = sorted({item["metadata"]["company_id"] for item in items})
+        dimensions = sorted({item["metadata"]["dimension"] for item in items})
+        sources = sorted({item["metadata"].get("source", "") for item in items})
+        methods = sorted({item.get("retrieval_method", "") for item in items})
+        company_codes = {value: code for code, value in enumerate(companies)}
+        dimension_codes = {value: code for code, value in enumerate(dimensions)}
+        source_codes = {value: code for code, value in enumerate(sources)}
+        method_codes = {value: code for code, value in enumerate(methods)}
+
+        ordered = sorted(
+            items,
+            key=lambda item: (company_codes[item["metadata"]["company_id"]], dimension_codes[item["metadata"]["dimension"]]),
+        )
+        company = np.array([company_codes[i["metadata"]["company_id"]] for i in ordered], dtype=np.uint32)
+        dimension = np.array([dimension_codes[i["metadata"]["dimension"]] for i in ordered], dtype=np.uint32)
+        doc_ids = [i["doc_id"].encode() for i in ordered]
+        contents = [i["content"].encode() for i in ordered]
+
+        group_keys = sorted({(int(c), int(d)) for c, d in zip(company, dimension)})
+        pair_rank = {key: rank for rank, key in enumerate(group_keys)}
+        group_of_row = np.array([pair_rank[(int(c), int(d))] for c, d in zip(company, dimension)], dtype=np.int64)
+
+        columns = {
+            "scores": np.array([i.get("score", 0.0) for i in ordered], dtype=np.float64),
+            "company": company,
+            "dimension": dimension,
+            "source": np.array([source_codes[i["metadata"].get("source", "")] for i in ordered], dtype=np.uint32),
+            "method": np.array([method_codes[i.get("retrieval_method", "")] for i in ordered], dtype=np.uint32),
+            "doc_id_offsets": np.concatenate(([0], np.cumsum([len(b) for b in doc_ids]))).astype(np.uint64),
+            "doc_id_blob": np.frombuffer(b"".join(doc_ids), dtype=np.uint8),
+            "content_offsets": np.concatenate(([0], np.cumsum([len(b) for b in contents]))).astype(np.uint64),
+            "content_blob": np.frombuffer(b"".join(contents), dtype=np.uint8),
+            "company_starts": np.searchsorted(company, np.arange(len(companies) + 1)).astype(np.uint64),
+            "group_company": np.array([c for c, _ in group_keys], dtype=np.uint32),
+            "group_dimension": np.array([d for _, d in group_keys], dtype=np.uint32),
+            "group_starts": np.searchsorted(group_of_row, np.arange(len(group_keys) + 1)).astype(np.uint64),
+        }
+
+        # Lay sections out after the header; iterate until the header length settles
+        header = {"companies": companies, "dimensions": dimensions, "sources": sources, "methods": methods}
+        header_length = 0
+        while True:
+            offset = cls._PREFIX.size + header_length
+            sections = {}
+            for name, array in columns.items():
+                offset += -offset % 8
+                sections[name] = [offset, array.dtype.str, len(array)]
+                offset += array.nbytes
+            header_bytes = json.dumps({**header, "sections": sections}).encode()
+            if len(header_bytes) == header_length:
+                break
+            header_length = len(header_bytes)
+
+        out = bytearray(offset)
+        cls._PREFIX.pack_into(out, 0, cls.MAGIC, cls.VERSION, header_length)
+        out[cls._PREFIX.size:cls._PREFIX.size + header_length] = header_bytes
+        for name, array in columns.items():
+            start = sections[name][0]
+            out[start:start + array.nbytes] = array.tobytes()
+        return bytes(out)
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def _blob_slice(self, offsets: np.ndarray, base: int, row: int, limit: Optional[int] = None) -> memoryview:
+        start, end = int(offsets[row]), int(offsets[row + 1])
+        if limit is not None:
+            end = min(end, start + limit)
+        return self._view[base + start:base + end]
+
+    def content_bytes(self, row: int) -> memoryview:
+        """Zero-copy view of a document's UTF-8 content."""
+        return self._blob_slice(self._content_offsets, self._content_base, row)
+
+    def content(self, row: int) -> str:
+        return str(self.content_bytes(row), "utf-8")
+
+    def excerpt(self, row: int, max_chars: int) -> str:
+        """Content truncated to `max_chars` (plus "..."), decoding at most 4 bytes per kept char."""
+        full_length = int(self._content_offsets[row + 1] - self._content_offsets[row])
+        raw = self._blob_slice(self._content_offsets, self._content_base, row, limit=4 * max_chars)
+        # A cut inside a multi-byte character only drops that character, which is past the limit anyway
+        text = str(raw, "utf-8", "ignore")
+        if len(text) > max_chars or full_length > len(raw):
+            return text[:max_chars] + "..."
+        return text
+
+    def doc_id(self, row: int) -> str:
+        return str(self._blob_slice(self._doc_id_offsets, self._doc_id_base, row), "utf-8")
+
+    def company_id(self, row: int) -> str:
+        return self.companies[self.company_column[row]]
+
+    def dimension(self, row: int) -> str:
+        return self.dimensions[self.dimension_column[row]]
+
+    def source(self, row: int) -> str:
+        return self.sources[self.source_column[row]]
+
+    def company_range(self, company_id: str) -> Tuple[int, int]:
+        """Row range [start, end) holding a company's documents (empty if unknown)."""
+        code = self._company_codes.get(company_id)
+        if code is None:
+            return 0, 0
+        return int(self._company_starts[code]), int(self._company_starts[code + 1])
+
+    def group_range(self, company_id: str, dimension: str) -> Tuple[int, int]:
+        """Row range [start, end) for one (company, dimension) group (empty if unknown)."""
+        company_code = self._company_codes.get(company_id)
+        dimension_code = self._dimension_codes.get(dimension)
+        if company_code is None or dimension_code is None:
+            return 0, 0
+        # Groups are sorted by (company, dimension): two binary searches find the group
+        lo = int(np.searchsorted(self._group_company, company_code, side="left"))
+        hi = int(np.searchsorted(self._group_company, company_code, side="right"))
+        group = lo + int(np.searchsorted(self._group_dimension[lo:hi], dimension_code))
+        if group >= hi or self._group_dimension[group] != dimension_code:
+            return 0, 0
+        return int(self._group_starts[group]), int(self._group_starts[group + 1])
+
+    def item(self, row: int, max_content_chars: Optional[int] = None) -> Dict[str, Any]:
+        """Materialise one row in the evidence item dict shape returned by retrieval."""
+        return {
+            "doc_id": self.doc_id(row),
+            "content": self.content(row) if max_content_chars is None else self.excerpt(row, max_content_chars),
+            "score": float(self.scores[row]),
+            "retrieval_method": self.methods[self.method_column[row]],
+            "metadata": {
+                "company_id": self.company_id(row),
+                "dimension": self.dimension(row),
+                "source": self.source(row),
+            },
+        }
+
+
+# Path to a file written by EvidenceStore.write; when set, every server process maps it
+EVIDENCE_STORE_ENV = "ORGAIR_EVIDENCE_STORE"
+
+
+class EvidenceShard:
+    """Keyword and vector indexes over one company's evidence (or a whole segment), built on first use.
+
+    The store keeps each company's documents in one contiguous row range [start, end),
+    written at ingest time, so a shard indexes only those rows under local doc numbers
+    and maps hits back to store rows by adding `start`.
+    """
+
+    def __init__(
+        self,
+        store: "EvidenceStore",
+        company_id: Optional[str],
+        embedder: Optional[HashedNgramEmbedder] = None,
+        minhasher: Optional[MinHasher] = None,
+    ):
+        started = time.perf_counter()
+        self.company_id = company_id
+        self.start, self.end = store.company_range(company_id) if company_id else (0, len(store))
+        self.index = EvidenceIndex()
+        self.embeddings = LocalEmbeddingStore(embedder)
+        texts, contents, companies = [], [], []
+        for row in range(self.start, self.end):
+            content = store.content(row)
+            dimension = store.dimension(row)
+            row_company = company_id or store.company_id(row)
+            self.index.add_document(content, row_company, dimension, store.source(row), float(store.scores[row]))
+            texts.append(f"{content} {dimension}")
+            contents.append(content)
+            companies.append(row_company)
+        self.embeddings.add_many(range(len(texts)), texts, companies)
+
+        # Near-duplicate clusters: each document points at the first earlier one it matches
+        self.signatures = (minhasher or MinHasher()).signatures(contents)
+        self.lsh = LSHIndex(self.signatures.shape[1])
+        self.duplicate_of = np.arange(len(contents))
+        for doc, signature in enumerate(self.signatures):
+            candidates = self.lsh.query(signature)
+            if candidates:
+                similarity = minhash_similarity(signature, self.signatures[candidates])
+                best = int(np.argmax(similarity))
+                if similarity[best] >= NEAR_DUPLICATE_THRESHOLD:
+                    self.duplicate_of[doc] = self.duplicate_of[candidates[best]]
+            self.lsh.add(doc, signature)
+        self.load_ms = (time.perf_counter() - started) * 1e3
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def memory_bytes(self) -> int:
+        return (
+            self.index.memory_bytes() + self.embeddings.memory_bytes()
+            + self.signatures.nbytes + self.duplicate_of.nbytes + self.lsh.memory_bytes()
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self),
+            "near_duplicates": int(np.count_nonzero(self.duplicate_of != np.arange(len(self)))),
+            "load_ms": round(self.load_ms, 3),
+            "memory_bytes": self.memory_bytes(),
+        }
+
+
+class EvidenceSegment:
+    """One immutable evidence store and the shards loaded from it so far."""
+
+    def __init__(
+        self,
+        store: "EvidenceStore",
+        embedder: Optional[HashedNgramEmbedder] = None,
+        minhasher: Optional[MinHasher] = None,
+    ):
+        self.store = store
+        self.embedder = embedder
+        self.minhasher = minhasher
+        self.shards: Dict[Optional[str], EvidenceShard] = {}
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def shard(self, company_id: Optional[str]) -> Optional[EvidenceShard]:
+        """The company's shard (the whole segment for None), loaded on first use; None if it has no rows."""
+        shard = self.shards.get(company_id)
+        if shard is None:
+            if company_id:
+                start, end = self.store.company_range(company_id)
+                if start == end:
+                    return None
+            shard = self.shards[company_id] = EvidenceShard(self.store, company_id, self.embedder, self.minhasher)
+        return shard
+
+    def items(self) -> Iterator[Dict[str, Any]]:
+        return (self.store.item(row) for row in range(len(self.store)))
+
+
+# Source reliability priors for re-ranking, matched by substring of the lower-cased source
+SOURCE_RELIABILITY = (
+    ("10-k", 1.0),
+    ("annual report", 1.0),
+    ("earnings call", 0.9),
+    ("transcript", 0.85),
+    ("internal", 0.8),
+    ("report", 0.75),
+    ("survey", 0.6),
+    ("press release", 0.55),
+    ("careers", 0.4),
+    ("job", 0.4),
+)
+DEFAULT_SOURCE_RELIABILITY = 0.5
+
+# Linear weights over FeatureReranker.FEATURES
+RERANK_FEATURE_WEIGHTS = {
+    "term_coverage": 1.0,
+    "dimension_match": 1.5,
+    "source_reliability": 0.5,
+    "first_stage": 0.75,
+    "evidence_score": 0.25,
+}
+
+
+class FeatureReranker:
+    """Second-stage scorer that reads each query/candidate pair jointly, like a cross-encoder.
+
+    Features are query-term coverage of the content, overlap between the query and the
+    candidate's dimension, a source reliability prior, the first-stage reciprocal rank
+    (`rank`, 0-based) and the stored evidence score; the score is their weighted sum. Any object with the
+    same `score(query, candidates) -> np.ndarray` method can be plugged in instead.
+    """
+
+    FEATURES = tuple(RERANK_FEATURE_WEIGHTS)
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None):
+        weights = {**RERANK_FEATURE_WEIGHTS, **(weights or {})}
+        self.weights = np.array([weights[name] for name in self.FEATURES])
+
+    @staticmethod
+    def source_reliability(source: str) -> float:
+        source = source.lower()
+        return next((prior for marker, prior in SOURCE_RELIABILITY if marker in source), DEFAULT_SOURCE_RELIABILITY)
+
+    def features(self, query: str, candidates: Sequence[Dict[str, Any]]) -> np.ndarray:
+        _, topic = _split_generic_query(query)
+        terms = set(_tokenize(topic))
+        rows = []
+        for candidate in candidates:
+            content_terms = set(_tokenize(candidate["content"]))
+            dimension_terms = set(candidate["dimension"].split("_"))
+            rows.append((
+                len(terms & content_terms) / len(terms) if terms else 0.0,
+                len(terms & dimension_terms) / len(dimension_terms) if terms else 0.0,
+                self.source_reliability(candidate["source"]),
+                1.0 / (1 + candidate["rank"]),
+                candidate["score"],
+            ))
+        return np.asarray(rows, dtype=np.float64).reshape(len(rows), len(self.FEATURES))
+
+    def score(self, query: str, candidates: Sequence[Dict[str, Any]]) -> np.ndarray:
+        return self.features(query, candidates) @ self.weights
+
+
+class RerankStage:
+    """Batched, time-boxed re-ranking of the first stage's top `top_n` candidates.
+
+    Candidates are scored `batch_size` at a time and the deadline is checked between
+    batches, so a query overruns `budget_ms` by at most one batch; when it does, the
+    first-stage order is returned unchanged and the query is counted as over budget.
+    """
+
+    def __init__(
+        self,
+        reranker: Any = None,
+        top_n: int = 20,
+        budget_ms: float = 5.0,
+        batch_size: int = 8,
+        sample_size: int = 1024,
+        clock=time.perf_counter,
+    ):
+        self.reranker = reranker if reranker is not None else FeatureReranker()
+        self.top_n = top_n
+        self.budget_ms = budget_ms
+        self.batch_size = batch_size
+        self.clock = clock
+        self.queries = 0
+        self.over_budget = 0
+        self._run_times: deque = deque(maxlen=sample_size)
+
+    def rerank(self, query: str, candidates: Sequence[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Scores for `candidates[:top_n]`, or None when the budget ran out first."""
+        budget = self.budget_ms / 1e3
+        started = self.clock()
+        head = candidates[:self.top_n]
+        scores = []
+        for batch_start in range(0, len(head), self.batch_size):
+            scores.append(self.reranker.score(query, head[batch_start:batch_start + self.batch_size]))
+            if self.clock() - started > budget:
+                break
+        elapsed = self.clock() - started
+        self.queries += 1
+        self._run_times.append(elapsed)
+        if elapsed > budget:
+            self.over_budget += 1
+            return None
+        return np.concatenate(scores) if scores else np.zeros(0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "top_n": self.top_n,
+            "budget_ms": self.budget_ms,
+            "queries": self.queries,
+            "over_budget": self.over_budget,
+            "run_ms": _latency_summary(self._run_times),
+        }
+
+
+class MockHybridRetriever:
+    """Hybrid BM25 + vector retrieval over a list of immutable evidence segments.
+
+    The first segment is the base store; ingestion appends small segments and
+    `merge_segments` folds them together so a query never fans out over too many.
+    An optional RerankStage rescores the fused top candidates on request.
+    Queries take a snapshot of the segment list, so a merge swaps it without locking readers.
+    """
+
+    def __init__(
+        self,
+        evidence: Optional[List[Dict[str, Any]]] = None,
+        store: Optional[EvidenceStore] = None,
+        embedder: Optional[HashedNgramEmbedder] = None,
+        minhasher: Optional[MinHasher] = None,
+        rerank_stage: Optional[RerankStage] = None,
+        rrf_k: int = 60,
+        candidate_depth: int = 50,
+        min_similarity: float = 0.25,
+    ):
+        if store is None:
+            path = os.environ.get(EVIDENCE_STORE_ENV)
+            if path:
+                store = EvidenceStore.open(path)
+            else:
+                store = EvidenceStore.from_items(MOCK_EVIDENCE_POOL if evidence is None else evidence)
+        self.embedder = embedder or HashedNgramEmbedder()
+        self.minhasher = minhasher or MinHasher()
+        self.rerank_stage = rerank_stage
+        # Shards are built on first query so opening a store stays O(1); company-filtered
+        # queries only ever load that company's shard of each segment
+        self.segments: List[EvidenceSegment] = [EvidenceSegment(store, self.embedder, self.minhasher)]
+        self.rrf_k = rrf_k
+        self.candidate_depth = candidate_depth
+        self.min_similarity = min_similarity
+        self._segments_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(segment) for segment in self.segments)
+
+    def add_segment(self, store: EvidenceStore) -> EvidenceSegment:
+        """Make a freshly built store searchable as a new segment."""
+        segment = EvidenceSegment(store, self.embedder, self.minhasher)
+        with self._segments_lock:
+            self.segments = self.segments + [segment]
+        return segment
+
+    def merge_segments(self, segments: Sequence[EvidenceSegment]) -> EvidenceSegment:
+        """Rewrite `segments` as one store and swap it in, warming the shards queries already use."""
+        items = [item for segment in segments for item in segment.items()]
+        merged = EvidenceSegment(EvidenceStore.from_items(items), self.embedder, self.minhasher)
+        for company_id in {company_id for segment in segments for company_id in list(segment.shards)}:
+            merged.shard(company_id)
+        replaced = {id(segment) for segment in segments}
+        with self._segments_lock:
+            # The merged segment takes the place of the first one it replaces
+            swapped: List[EvidenceSegment] = []
+            for segment in self.segments:
+                if id(segment) not in replaced:
+                    swapped.append(segment)
+                elif merged not in swapped:
+                    swapped.append(merged)
+            self.segments = swapped
+        return merged
+
+    def shard_stats(self) -> Dict[str, Any]:
+        segments = self.segments
+        shards: Dict[str, Dict[str, Any]] = {}
+        for segment in segments:
+            for company_id, shard in list(segment.shards.items()):
+                entry = shards.setdefault(company_id or "*", dict.fromkeys(shard.stats(), 0))
+                for key, value in shard.stats().items():
+                    entry[key] += value
+        return {
+            "segments": len(segments),
+            "documents": sum(len(segment) for segment in segments),
+            "companies": len({company for segment in segments for company in segment.store.companies}),
+            "loaded": sum(len(segment.shards) for segment in segments),
+            "memory_bytes": sum(shard["memory_bytes"] for shard in shards.values()),
+            "shards": shards,
+        }
+
+    def _semantic_topic(self, query: str) -> Optional[str]:
+        _, topic = _split_generic_query(query)
+        return None if topic in ("", "all") else topic
+
+    def _keep_semantic(self, hits: List[Tuple[float, int]], allowed: Optional[set]) -> List[Tuple[float, int]]:
+        return [
+            (score, doc_number)
+            for score, doc_number in hits
+            if score >= self.min_similarity and (allowed is None or doc_number in allowed)
+        ]
+
+    def _hits(
+        self,
+        segments: Sequence[EvidenceSegment],
+        queries: Sequence[str],
+        depth: int,
+        company_id: Optional[str],
+        dimensions: Sequence[Optional[str]],
+    ) -> Tuple[List[List[Tuple[float, Tuple[int, int]]]], List[List[Tuple[float, Tuple[int, int]]]]]:
+        """Per-query keyword and semantic hits keyed by (segment position, store row), best first.
+
+        `dimensions[i]` is query i's dimension filter (None for any dimension).
+        """
+        keyword: List[List[Tuple[float, Tuple[int, int]]]] = [[] for _ in queries]
+        semantic: List[List[Tuple[float, Tuple[int, int]]]] = [[] for _ in queries]
+        topics = [self._semantic_topic(query) for query in queries]
+        semantic_queries = [i for i, topic in enumerate(topics) if topic is not None]
+
+        for position, segment in enumerate(segments):
+            shard = segment.shard(company_id)
+            if shard is None:
+                continue
+            # Filters are resolved once per shard and distinct dimension and shared by the
+            # queries using them; all semantic queries are scored in a single matrix product
+            allowed = {dimension: shard.index.filtered_docs(company_id, dimension) for dimension in set(dimensions)}
+            dimension_docs = {
+                dimension: shard.index.filtered_docs(dimension=dimension) if dimension else None for dimension in set(dimensions)
+            }
+            for i, query in enumerate(queries):
+                keyword[i].extend(
+                    (score, (position, shard.start + doc))
+                    for score, doc in shard.index.search(query, depth, allowed=allowed[dimensions[i]])
+                )
+            batch = shard.embeddings.search_many([topics[i] for i in semantic_queries], depth)
+            for i, hits in zip(semantic_queries, batch):
+                semantic[i].extend(
+                    (score, (position, shard.start + doc)) for score, doc in self._keep_semantic(hits, dimension_docs[dimensions[i]])
+                )
+
+        if len(segments) > 1:
+            # Stable merge keeps each segment's tie order
+            keyword = [heapq.nlargest(depth, hits, key=lambda hit: hit[0]) for hits in keyword]
+            semantic = [heapq.nlargest(depth, hits, key=lambda hit: hit[0]) for hits in semantic]
+        return keyword, semantic
+
+    def _collapse_near_duplicates(
+        self,
+        segments: Sequence[EvidenceSegment],
+        company_id: Optional[str],
+        ranked: List[Tuple[float, Tuple[int, int]]],
+        k: int,
+    ) -> List[Tuple[float, Tuple[int, int], List[Tuple[int, int]]]]:
+        """Walk candidates best first, folding each near-duplicate into the first kept document it matches.
+
+        Documents in one shard are matched through the clusters built at index time;
+        across segments the candidate's signature is compared with the kept ones.
+        """
+        kept: List[Tuple[float, Tuple[int, int], List[Tuple[int, int]]]] = []
+        kept_signatures: List[np.ndarray] = []
+        clusters: Dict[Tuple[int, int], int] = {}
+        for score, key in ranked:
+            position, row = key
+            shard = segments[position].shard(company_id)
+            local = row - shard.start
+            cluster = (position, shard.start + int(shard.duplicate_of[local]))
+            signature = shard.signatures[local]
+            match = clusters.get(cluster)
+            if match is None and kept_signatures:
+                similarity = minhash_similarity(signature, np.vstack(kept_signatures))
+                best = int(np.argmax(similarity))
+                match = best if similarity[best] >= NEAR_DUPLICATE_THRESHOLD else None
+            if match is not None:
+                kept[match][2].append(key)
+                clusters.setdefault(cluster, match)
+                continue
+            if len(kept) == k:
+                break
+            clusters[cluster] = len(kept)
+            kept.append((score, key, []))
+            kept_signatures.append(signature)
+        return kept
+
+    def _rerank(
+        self,
+        segments: Sequence[EvidenceSegment],
+        query: str,
+        fused: List[Tuple[float, Tuple[int, int]]],
+    ) -> Tuple[List[Tuple[float, Tuple[int, int]]], Dict[Tuple[int, int], float]]:
+        """Reorder the head of the fused list by re-rank score; unchanged if the stage ran over budget."""
+        head = fused[:self.rerank_stage.top_n]
+        candidates = []
+        for rank, (_, (position, row)) in enumerate(head):
+            store = segments[position].store
+            candidates.append({
+                "content": store.content(row),
+                "dimension": store.dimension(row),
+                "source": store.source(row),
+                "score": float(store.scores[row]),
+                "rank": rank,
+            })
+        scores = self.rerank_stage.rerank(query, candidates)
+        if scores is None:
+            return fused, {}
+        order = np.argsort(-scores, kind="stable")
+        return [head[i] for i in order] + fused[len(head):], {head[i][1]: float(scores[i]) for i in order}
+
+    def _fuse(
+        self,
+        segments: Sequence[EvidenceSegment],
+        k: int,
+        keyword_hits: List[Tuple[float, Tuple[int, int]]],
+        semantic_hits: List[Tuple[float, Tuple[int, int]]],
+        max_content_chars: Optional[int],
+        company_id: Optional[str] = None,
+        diversify: bool = False,
+        rerank_query: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        fused = reciprocal_rank_fusion(
+            [[doc for _, doc in keyword_hits], [doc for _, doc in semantic_hits]],
+            k=self.rrf_k,
+        )
+        rerank_scores: Dict[Tuple[int, int], float] = {}
+        if rerank_query is not None and self.rerank_stage is not None:
+            fused, rerank_scores = self._rerank(segments, rerank_query, fused)
+
+        bm25 = {doc: score for score, doc in keyword_hits}
+        cosine = {doc: score for score, doc in semantic_hits}
+        results = []
+        if diversify:
+            ranked = self._collapse_near_duplicates(segments, company_id, fused, k)
+        else:
+            ranked = [(score, key, None) for score, key in fused[:k]]
+        for score, (position, row), duplicates in ranked:
+            item = {
+                **segments[position].store.item(row, max_content_chars),
+                "bm25_score": round(bm25.get((position, row), 0.0), 4),
+                "vector_score": round(cosine.get((position, row), 0.0), 4),
+                "fusion_score": round(score, 6),
+            }
+            if (position, row) in rerank_scores:
+                item["rerank_score"] = round(rerank_scores[(position, row)], 4)
+            if duplicates is not None:
+                item["near_duplicates"] = [segments[p].store.doc_id(r) for p, r in duplicates]
+            results.append(item)
+        return results
+
+    async def retrieve(
+        self,
+        query: str,
+        k: int,
+        filter_metadata: Optional[Dict[str, Any]],
+        max_content_chars: Optional[int] = None,
+        diversify: bool = False,
+        rerank: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """Top-k fused results.
+
+        With `rerank`, the configured RerankStage reorders the top candidates first; with
+        `diversify`, near-duplicates then collapse into the best-ranked copy.
+        """
+        filter_metadata = filter_metadata or {}
+        company_id = filter_metadata.get("company_id")
+        segments = self.segments
+        depth = max(k, self.candidate_depth)
+        keyword, semantic = self._hits(segments, [query], depth, company_id, [filter_metadata.get("dimension")])
+        return self._fuse(
+            segments, k, keyword[0], semantic[0], max_content_chars, company_id, diversify, query if rerank else None
+        )
+
+    async def retrieve_many(
+        self,
+        queries: Sequence[str],
+        k: int,
+        company_id: Optional[str] = None,
+        max_content_chars: Optional[int] = None,
+        diversify: bool = False,
+        rerank: bool = False,
+        dimensions: Optional[Sequence[Optional[str]]] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """Run several queries over one company in one pass.
+
+        Result i matches `retrieve(queries[i], ...)` filtered to `dimensions[i]` when given.
+        """
+        segments = self.segments
+        depth = max(k, self.candidate_depth)
+        dimensions = list(dimensions) if dimensions is not None else [None] * len(queries)
+        keyword, semantic = self._hits(segments, queries, depth, company_id, dimensions)
+        return [
+            self._fuse(
+                segments, k, keyword[i], semantic[i], max_content_chars, company_id, diversify, query if rerank else None
+            )
+            for i, query in enumerate(queries)
+        ]
+
+
+# Long documents are split into overlapping chunks of at most this many characters
+EVIDENCE_CHUNK_CHARS = 1200
+EVIDENCE_CHUNK_OVERLAP = 200
+
+
+def evidence_item(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalise a raw record, nested (`metadata`) or flat (company_id/dimension/source at the top), into an evidence item."""
+    metadata = raw.get("metadata") or raw
+    return {
+        "doc_id": str(raw["doc_id"]),
+        "content": str(raw["content"]),
+        "score": float(raw.get("score", 0.0)),
+        "retrieval_method": str(raw.get("retrieval_method", "ingested")),
+        "metadata": {
+            "company_id": str(metadata["company_id"]),
+            "dimension": str(metadata["dimension"]),
+            "source": str(metadata.get("source", "")),
+        },
+    }
+
+
+def read_evidence_jsonl(source: Union[str, Iterable[str]]) -> Iterator[Dict[str, Any]]:
+    """Stream evidence items from a JSONL dump (a path or any iterable of lines).
+
+    Each line is one record in either shape `evidence_item` accepts. Malformed lines are
+    logged and skipped so one bad record doesn't stop a dump.
+    """
+    with contextlib.ExitStack() as stack:
+        lines = stack.enter_context(open(source, encoding="utf-8")) if isinstance(source, str) else source
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield evidence_item(json.loads(line))
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                logger.warning("evidence_line_skipped", line=line_number, error=str(e))
+
+
+def chunk_evidence(
+    items: Iterable[Dict[str, Any]],
+    max_chars: int = EVIDENCE_CHUNK_CHARS,
+    overlap: int = EVIDENCE_CHUNK_OVERLAP,
+) -> Iterator[Dict[str, Any]]:
+    """Split long items into overlapping chunks on word boundaries; chunk i gets doc_id `<doc_id>#<i>`."""
+    for item in items:
+        content = item["content"]
+        if len(content) <= max_chars:
+            yield item
+            continue
+        start, part = 0, 0
+        while start < len(content):
+            end = min(len(content), start + max_chars)
+            if end < len(content):
+                # Back off to the last space so words are not cut, unless the window has none
+                space = content.rfind(" ", start + overlap + 1, end)
+                end = space if space > 0 else end
+            yield {**item, "doc_id": f"{item['doc_id']}#{part}", "content": content[start:end].strip()}
+            if end >= len(content):
+                break
+            start, part = max(end - overlap, start + 1), part + 1
+
+
+def evidence_content_hash(item: Dict[str, Any]) -> str:
+    """Dedup key: the same text for the same company, ignoring case and whitespace."""
+    normalized = " ".join(item["content"].lower().split())
+    return hashlib.sha256(f"{item['metadata']['company_id']}\x00{normalized}".encode()).hexdigest()
+
+
+class EvidenceIngestor:
+    """Streaming ingestion into a MockHybridRetriever: chunk, dedup by content hash, flush segments.
+
+    Items buffer until `segment_size` accumulate (or the stream ends) and are then
+    written as a new immutable segment. When more than `max_segments` exist, a
+    background thread merges the `merge_factor` smallest into one, so ingestion never
+    blocks on a merge and queries never fan out over an unbounded number of segments.
+    """
+
+    def __init__(
+        self,
+        retriever: MockHybridRetriever,
+        segment_size: int = 512,
+        max_segments: int = 8,
+        merge_factor: int = 4,
+        # Called on the ingesting thread after each flush, e.g. to drop cached retrievals
+        on_flush: Optional[Callable[[], None]] = None,
+    ):
+        self.retriever = retriever
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.merge_factor = max(2, merge_factor)
+        self.on_flush = on_flush
+        self._seen: Optional[set] = None
+        self._buffer: List[Dict[str, Any]] = []
+        self._merger = ThreadPoolExecutor(max_workers=1, thread_name_prefix="evidence-merge")
+        self._merge: Optional[Future] = None
+        self.totals = {"read": 0, "ingested": 0, "duplicates": 0, "segments_flushed": 0, "merges": 0}
+
+    @property
+    def seen(self) -> set:
+        # Hash the existing corpus once, on first ingest
+        if self._seen is None:
+            self._seen = {
+                evidence_content_hash(item) for segment in self.retriever.segments for item in segment.items()
+            }
+        return self._seen
+
+    def ingest(self, items: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """Chunk, dedup and append a stream of items; returns this call's counts."""
+        counts = {"read": 0, "ingested": 0, "duplicates": 0, "segments_flushed": 0}
+        for item in chunk_evidence(items):
+            counts["read"] += 1
+            digest = evidence_content_hash(item)
+            if digest in self.seen:
+                counts["duplicates"] += 1
+                continue
+            self.seen.add(digest)
+            self._buffer.append(item)
+            counts["ingested"] += 1
+            if len(self._buffer) >= self.segment_size:
+                counts["segments_flushed"] += self.flush()
+        counts["segments_flushed"] += self.flush()
+        for key, value in counts.items():
+            self.totals[key] += value
+        return counts
+
+    def flush(self) -> int:
+        """Write buffered items as a new segment; returns the number of segments written (0 or 1)."""
+        if not self._buffer:
+            return 0
+        items, self._buffer = self._buffer, []
+        self.retriever.add_segment(EvidenceStore.from_items(items))
+        if self.on_flush is not None:
+            self.on_flush()
+        self._schedule_merge()
+        return 1
+
+    def _schedule_merge(self) -> None:
+        if len(self.retriever.segments) > self.max_segments and (self._merge is None or self._merge.done()):
+            self._merge = self._merger.submit(self._merge_smallest)
+
+    def _merge_smallest(self) -> None:
+        while len(self.retriever.segments) > self.max_segments:
+            # Smallest first, so the base segment is only rewritten once ingested ones outgrow it
+            self.retriever.merge_segments(sorted(self.retriever.segments, key=len)[:self.merge_factor])
+            self.totals["merges"] += 1
+
+    def wait_for_merges(self) -> None:
+        if self._merge is not None:
+            self._merge.result()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.totals,
+            "buffered": len(self._buffer),
+            "segments": len(self.retriever.segments),
+            "merging": self._merge is not None and not self._merge.done(),
+        }
+
+
+# Seed holdings: fund -> companies with portfolio weight (invested capital share) and latest Org-AI-R
+MOCK_FUND_HOLDINGS = {
+    "PE-FUND-001": [
+        {"company_id": "ACME-001", "name": "ACME Corp", "weight": 0.14, "org_air": 72.5},
+        {"company_id": "GLOBAL-INC", "name": "Global Innovations Inc.", "weight": 0.12, "org_air": 64.8},
+        {"company_id": "HEALTH-SYS", "name": "Health Systems LLC", "weight": 0.11, "org_air": 58.3},
+        {"company_id": "NOVA-FIN", "name": "Nova Financial", "weight": 0.10, "org_air": 82.1},
+        {"company_id": "PEAK-MFG", "name": "Peak Manufacturing", "weight": 0.09, "org_air": 61.7},
+        {"company_id": "BRIGHT-RTL", "name": "Bright Retail Group", "weight": 0.08, "org_air": 66.0},
+        {"company_id": "GRID-ENR", "name": "GridPower Energy", "weight": 0.08, "org_air": 45.2},
+        {"company_id": "CLOUD-TECH", "name": "CloudTech Systems", "weight": 0.07, "org_air": 78.9},
+        {"company_id": "MEDI-CARE", "name": "MediCare Partners", "weight": 0.06, "org_air": 69.4},
+        {"company_id": "SWIFT-LOG", "name": "Swift Logistics", "weight": 0.06, "org_air": 63.2},
+        {"company_id": "ALPHA-INS", "name": "Alpha Insurance", "weight": 0.05, "org_air": 74.6},
+        {"company_id": "URBAN-CPG", "name": "Urban Consumer Goods", "weight": 0.04, "org_air": 70.9},
+    ],
+    "PE-FUND-002": [
+        {"company_id": "ACME-001", "name": "ACME Corp", "weight": 0.5, "org_air": 72.5},
+        {"company_id": "CLOUD-TECH", "name": "CloudTech Systems", "weight": 0.3, "org_air": 78.9},
+        {"company_id": "GRID-ENR", "name": "GridPower Energy", "weight": 0.2, "org_air": 45.2},
+    ],
+}
+
+# Herfindahl-Hirschman index bands (on normalized weights) for concentration_risk
+CONCENTRATION_HHI_BANDS = ((0.15, "low"), (0.25, "medium"))
+
+
+class _FundAggregate:
+    """Running sums for one fund, updated in O(1) per holding or score change.
+
+    Min/max come from lazy-deletion heaps: stale entries are skipped (and
+    periodically compacted) on read instead of being searched for on update.
+    """
+
+    def __init__(self):
+        self.weights: Dict[str, float] = {}
+        self.weight_total = 0.0
+        self.weight_sq_total = 0.0
+        self.scored_count = 0
+        self.score_total = 0.0
+        self.scored_weight_total = 0.0
+        self.weighted_score_total = 0.0
+        self.min_heap: List[Tuple[float, str]] = []
+        self.max_heap: List[Tuple[float, str]] = []
+
+    def apply(self, company_id: str, weight: float, score: Optional[float], sign: int) -> None:
+        """Add (sign=1) or remove (sign=-1) one holding's contribution."""
+        self.weight_total += sign * weight
+        self.weight_sq_total += sign * weight * weight
+        if score is None:
+            return
+        self.scored_count += sign
+        self.score_total += sign * score
+        self.scored_weight_total += sign * weight
+        self.weighted_score_total += sign * weight * score
+        if sign > 0:
+            heapq.heappush(self.min_heap, (score, company_id))
+            heapq.heappush(self.max_heap, (-score, company_id))
+
+    def extreme(self, heap: List[Tuple[float, str]], scores: Dict[str, float], sign: int) -> Optional[float]:
+        """Current min (sign=1) or max (sign=-1) score, dropping stale heap entries."""
+        if len(heap) > 2 * self.scored_count + 16:
+            heap[:] = [(sign * scores[c], c) for c in self.weights if c in scores]
+            heapq.heapify(heap)
+        while heap:
+            value, company_id = heap[0]
+            if company_id in self.weights and scores.get(company_id) == sign * value:
+                return sign * value
+            heapq.heappop(heap)
+        return None
+
+
+class FundPortfolioStore:
+    """Fund-to-company holdings with incrementally maintained fund aggregates.
+
+    `record_score` touches only the funds that hold the company, and each of those
+    in O(1) (plus a heap push for min/max), so re-scoring one company never
+    re-scans a portfolio.
+    """
+
+    def __init__(self):
+        self.scores: Dict[str, float] = {}
+        self.names: Dict[str, str] = {}
+        self.funds: Dict[str, _FundAggregate] = {}
+        self.funds_by_company: Dict[str, set] = {}
+
+    @classmethod
+    def from_holdings(cls, holdings: Dict[str, List[Dict[str, Any]]]) -> "FundPortfolioStore":
+        store = cls()
+        for fund_id, rows in holdings.items():
+            for row in rows:
+                if "org_air" in row and row["company_id"] not in store.scores:
+                    store.scores[row["company_id"]] = float(row["org_air"])
+                store.add_holding(fund_id, row["company_id"], row.get("weight", 1.0), row.get("name"))
+        return store
+
+    def add_holding(self, fund_id: str, company_id: str, weight: float = 1.0, name: Optional[str] = None) -> None:
+        """Add a company to a fund, or change its weight if already held."""
+        if weight <= 0:
+            raise ValueError("Holding weight must be positive")
+        fund = self.funds.setdefault(fund_id, _FundAggregate())
+        score = self.scores.get(company_id)
+        if company_id in fund.weights:
+            fund.apply(company_id, fund.weights[company_id], score, -1)
+        fund.weights[company_id] = float(weight)
+        fund.apply(company_id, float(weight), score, 1)
+        self.funds_by_company.setdefault(company_id, set()).add(fund_id)
+        if name:
+            self.names[company_id] = name
+
+    def remove_holding(self, fund_id: str, company_id: str) -> None:
+        fund = self.funds[fund_id]
+        weight = fund.weights.pop(company_id)
+        fund.apply(company_id, weight, self.scores.get(company_id), -1)
+        self.funds_by_company[company_id].discard(fund_id)
+
+    def record_score(self, company_id: str, score: float) -> List[str]:
+        """Store a company's latest Org-AI-R and update every fund holding it; returns those fund ids."""
+        previous = self.scores.get(company_id)
+        score = float(score)
+        self.scores[company_id] = score
+        fund_ids = sorted(self.funds_by_company.get(company_id, ()))
+        for fund_id in fund_ids:
+            fund = self.funds[fund_id]
+            weight = fund.weights[company_id]
+            fund.apply(company_id, weight, previous, -1)
+            fund.apply(company_id, weight, score, 1)
+        return fund_ids
+
+    def weights(self, fund_id: str) -> Dict[str, float]:
+        """Normalized holding weights of a fund."""
+        fund = self.funds[fund_id]
+        return {company_id: weight / fund.weight_total for company_id, weight in fund.weights.items()}
+
+    @staticmethod
+    def _fund_air_score(fund: _FundAggregate) -> Optional[float]:
+        if not fund.scored_count or fund.scored_weight_total <= 0:
+            return None
+        return fund.weighted_score_total / fund.scored_weight_total
+
+    def summary(self, fund_id: str, include_companies: bool = False) -> Dict[str, Any]:
+        """Fund-level aggregates from the running sums; raises ValueError for unknown funds."""
+        fund = self.funds.get(fund_id)
+        if fund is None:
+            raise ValueError(f"Unknown fund: {fund_id}")
+        hhi = fund.weight_sq_total / fund.weight_total ** 2 if fund.weight_total > 0 else 0.0
+        concentration = next((label for bound, label in CONCENTRATION_HHI_BANDS if hhi < bound), "high")
+        summary = {
+            "fund_id": fund_id,
+            "fund_air_score": self._fund_air_score(fund),
+            "company_count": len(fund.weights),
+            "scored_company_count": fund.scored_count,
+            "metrics": {
+                "avg_org_air": fund.score_total / fund.scored_count if fund.scored_count else None,
+                "min_org_air": fund.extreme(fund.min_heap, self.scores, 1),
+                "max_org_air": fund.extreme(fund.max_heap, self.scores, -1),
+                "concentration_risk": concentration,
+                "hhi": hhi,
+            },
+        }
+        if include_companies:
+            summary["companies"] = [
+                {
+                    "company_id": company_id,
+                    "name": self.names.get(company_id, company_id),
+                    "weight": weight / fund.weight_total,
+                    "org_air": self.scores.get(company_id),
+                }
+                for company_id, weight in sorted(fund.weights.items(), key=lambda item: -item[1])
+            ]
+        return summary
+
+
+class _ColumnBuffer:
+    """Append-only set of equal-length NumPy columns with amortized O(1) growth."""
+
+    def __init__(self, dtypes: Dict[str, Any], capacity: int = 16):
+        self.size = 0
+        self._columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in dtypes.items()}
+
+    def append(self, **values: Any) -> None:
+        if self.size == len(next(iter(self._columns.values()))):
+            for name, column in self._columns.items():
+                grown = np.empty(2 * len(column), dtype=column.dtype)
+                grown[:self.size] = column[:self.size]
+                self._columns[name] = grown
+        for name, value in values.items():
+            self._columns[name][self.size] = value
+        self.size += 1
+
+    def set_last(self, **values: Any) -> None:
+        for name, value in values.items():
+            self._columns[name][self.size - 1] = value
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self._columns[name][:self.size]
+
+
+_ROLLUP_DTYPES = {"key": np.int64, "count": np.int64, "total": np.float64, "min": np.float64, "max": np.float64, "last": np.float64}
+
+
+def _day_key(t: float) -> int:
+    return int(t // 86400)
+
+
+def _week_key(t: float) -> int:
+    # Day 0 (1970-01-01) is a Thursday; shift by 3 days so weeks start on Monday
+    return (int(t // 86400) + 3) // 7
+
+
+def _month_key(t: float) -> int:
+    moment = datetime.fromtimestamp(t, timezone.utc)
+    return moment.year * 12 + moment.month - 1
+
+
+# Rollup resolution -> (bucket key of a timestamp, bucket start of a key)
+SCORE_ROLLUPS: Dict[str, Tuple[Callable[[float], int], Callable[[int], datetime]]] = {
+    "daily": (_day_key, lambda key: datetime.fromtimestamp(key * 86400, timezone.utc)),
+    "weekly": (_week_key, lambda key: datetime.fromtimestamp((key * 7 - 3) * 86400, timezone.utc)),
+    "monthly": (_month_key, lambda key: datetime(key // 12, key % 12 + 1, 1, tzinfo=timezone.utc)),
+}
+
+
+class _CompanyHistory:
+    """Raw (timestamp, score) columns plus one running rollup per SCORE_ROLLUPS resolution."""
+
+    def __init__(self):
+        self.raw = _ColumnBuffer({"time": np.float64, "score": np.float64})
+        self.rollups = {resolution: _ColumnBuffer(_ROLLUP_DTYPES) for resolution in SCORE_ROLLUPS}
+
+    def append(self, t: float, score: float) -> None:
+        # Append-only: a clock that stepped backwards is clamped to the last timestamp
+        if self.raw.size:
+            t = max(t, float(self.raw["time"][-1]))
+        self.raw.append(time=t, score=score)
+        for resolution, (bucket_of, _) in SCORE_ROLLUPS.items():
+            rollup = self.rollups[resolution]
+            key = bucket_of(t)
+            if rollup.size and rollup["key"][-1] == key:
+                rollup.set_last(
+                    count=rollup["count"][-1] + 1,
+                    total=rollup["total"][-1] + score,
+                    min=min(rollup["min"][-1], score),
+                    max=max(rollup["max"][-1], score),
+                    last=score,
+                )
+            else:
+                rollup.append(key=key, count=1, total=score, min=score, max=score, last=score)
+
+
+class ScoreHistoryStore:
+    """Append-only per-company Org-AI-R history with precomputed daily/weekly/monthly rollups.
+
+    Every appended score updates the open bucket of each rollup in O(1), so a trend
+    query reads O(buckets) rows however many raw scores a company has. With a `path`
+    the store replays and then appends to a binary log: an 8-byte magic and uint32
+    version, then one `<ddH` (timestamp, score, id length) record plus the UTF-8
+    company id per score. A torn final record is ignored on replay.
+    """
+
+    MAGIC = b"ORGAIRSH"
+    VERSION = 1
+    _PREFIX = struct.Struct("<8sI")
+    _RECORD = struct.Struct("<ddH")
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.companies: Dict[str, _CompanyHistory] = {}
+        self._log = None
+        if path:
+            self._replay(path)
+            self._log = open(path, "ab")
+            if self._log.tell() == 0:
+                self._log.write(self._PREFIX.pack(self.MAGIC, self.VERSION))
+                self._log.flush()
+
+    def _replay(self, path: str) -> None:
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as handle:
+            data = handle.read()
+        if not data:
+            return
+        magic, version = self._PREFIX.unpack_from(data, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError(f"Not a score history log (magic={magic!r}, version={version})")
+        offset = self._PREFIX.size
+        while offset + self._RECORD.size <= len(data):
+            t, score, id_length = self._RECORD.unpack_from(data, offset)
+            end = offset + self._RECORD.size + id_length
+            if end > len(data):
+                break
+            company_id = data[offset + self._RECORD.size:end].decode()
+            self.companies.setdefault(company_id, _CompanyHistory()).append(t, score)
+            offset = end
+
+    def append_many(self, scores: Dict[str, float], timestamp: Optional[datetime] = None) -> None:
+        """Record one score per company at `timestamp` (default now), persisting before returning."""
+        t = (timestamp or datetime.now(timezone.utc)).timestamp()
+        records = []
+        for company_id, score in scores.items():
+            self.companies.setdefault(company_id, _CompanyHistory()).append(t, float(score))
+            encoded = company_id.encode()
+            records.append(self._RECORD.pack(t, float(score), len(encoded)) + encoded)
+        if self._log is not None and records:
+            self._log.write(b"".join(records))
+            self._log.flush()
+
+    def append(self, company_id: str, score: float, timestamp: Optional[datetime] = None) -> None:
+        self.append_many({company_id: score}, timestamp)
+
+    def latest(self, company_id: str) -> Optional[Tuple[datetime, float]]:
+        history = self.companies.get(company_id)
+        if history is None or not history.raw.size:
+            return None
+        return datetime.fromtimestamp(float(history.raw["time"][-1]), timezone.utc), float(history.raw["score"][-1])
+
+    def count(self, company_id: str) -> int:
+        history = self.companies.get(company_id)
+        return history.raw.size if history else 0
+
+    def _rollup(self, company_id: str, resolution: str) -> Optional[_ColumnBuffer]:
+        if resolution not in SCORE_ROLLUPS:
+            raise ValueError(f"Unknown resolution '{resolution}'; expected one of: {', '.join(SCORE_ROLLUPS)}")
+        history = self.companies.get(company_id)
+        return history.rollups[resolution] if history else None
+
+    def trend(self, company_id: str, resolution: str = "monthly", limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """The most recent `limit` buckets (all when None), oldest first."""
+        rollup = self._rollup(company_id, resolution)
+        if rollup is None:
+            return []
+        start = max(0, rollup.size - limit) if limit else 0
+        period_start = SCORE_ROLLUPS[resolution][1]
+        columns = {name: rollup[name][start:].tolist() for name in _ROLLUP_DTYPES}
+        return [
+            {
+                "period_start": period_start(key).isoformat(),
+                "count": count,
+                "mean": total / count,
+                "min": low,
+                "max": high,
+                "last": last,
+            }
+            for key, count, total, low, high, last in zip(
+                columns["key"], columns["count"], columns["total"], columns["min"], columns["max"], columns["last"]
+            )
+        ]
+
+    def weighted_trend(
+        self, weights: Dict[str, float], resolution: str = "monthly", limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Weighted mean of each company's last score as of every bucket, carried forward.
+
+        Companies enter the mean from their first bucket on; cost is O(companies x buckets).
+        """
+        rollups = {c: r for c, r in ((c, self._rollup(c, resolution)) for c in weights) if r is not None and r.size}
+        if not rollups:
+            return []
+        keys = np.unique(np.concatenate([rollup["key"] for rollup in rollups.values()]))
+        if limit:
+            keys = keys[-limit:]
+        weighted = np.zeros(keys.size)
+        weight_seen = np.zeros(keys.size)
+        for company_id, rollup in rollups.items():
+            position = np.searchsorted(rollup["key"], keys, side="right") - 1
+            present = position >= 0
+            weighted[present] += weights[company_id] * rollup["last"][position[present]]
+            weight_seen[present] += weights[company_id]
+        period_start = SCORE_ROLLUPS[resolution][1]
+        return [
+            {"period_start": period_start(int(key)).isoformat(), "fund_air_score": float(w / seen)}
+            for key, w, seen in zip(keys, weighted, weight_seen)
+            if seen > 0
+        ]
+
+
+SCORE_HISTORY_ENV = "ORGAIR_SCORE_HISTORY"
+
+org_air_calculator = MockOrgAIRCalculator()
+hybrid_retriever = MockHybridRetriever(rerank_stage=RerankStage())
+evidence_ingestor = EvidenceIngestor(hybrid_retriever, on_flush=lambda: tool_result_cache.invalidate("get_company_evidence"))
+fund_portfolio_store = FundPortfolioStore.from_holdings(MOCK_FUND_HOLDINGS)
+score_history_store = ScoreHistoryStore(os.environ.get(SCORE_HISTORY_ENV))
+
+
+def _sync_seed_scores(funds: FundPortfolioStore, history: ScoreHistoryStore) -> None:
+    """Persisted history wins over seed scores; seed-only companies start their history now."""
+    seeds = {}
+    for company_id, seed_score in list(funds.scores.items()):
+        latest = history.latest(company_id)
+        if latest is None:
+            seeds[company_id] = seed_score
+        else:
+            funds.record_score(company_id, latest[1])
+    history.append_many(seeds)
+
+
+_sync_seed_scores(fund_portfolio_store, score_history_store)
+
+# --- Response Serialization ---
+
+
+def _json_default(obj: Any) -> Any:
+    """Encode the non-JSON types our payloads carry; anything else is a bug, not a string."""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class JsonSerializer:
+    """Encodes tool and resource payloads with one prebuilt encoder.
+
+    Compact output (no whitespace, UTF-8 kept as-is) is the default for clients;
+    `pretty=True` restores the indented layout for human-facing demos.
+    """
+
+    def __init__(self, pretty: bool = False):
+        self.pretty = pretty
+        self._encoder = json.JSONEncoder(
+            ensure_ascii=False,
+            indent=2 if pretty else None,
+            separators=(",", ": ") if pretty else (",", ":"),
+            default=_json_default,
+        )
+
+    def dumps(self, obj: Any) -> str:
+        return self._encoder.encode(obj)
+
+
+COMPACT_JSON = JsonSerializer()
+PRETTY_JSON = JsonSerializer(pretty=True)
+
+# Serializer used for every MCP response; set ORGAIR_PRETTY_JSON=1 (e.g. for the Streamlit demo) to indent
+response_serializer = PRETTY_JSON if os.environ.get("ORGAIR_PRETTY_JSON") else COMPACT_JSON
+
+
+# --- Tool Definitions ---
+
+
+# --- Argument Validation ---
+
+# Per-call validation overhead we budget for, in microseconds (see benchmark_argument_validation):
+# accepted calls take the fast path, rejected calls also build field-level errors
+VALIDATION_BUDGET_US = {"valid": 10.0, "invalid": 50.0}
+
+_JSON_TYPE_CHECKS = {
+    "string": lambda v: isinstance(v, str),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "integer": lambda v: (isinstance(v, int) and not isinstance(v, bool)) or (isinstance(v, float) and v.is_integer()),
+    "boolean": lambda v: isinstance(v, bool),
+    "array": lambda v: isinstance(v, list),
+    "object": lambda v: isinstance(v, dict),
+    "null": lambda v: v is None,
+}
+
+
+def _field_error(path: str, constraint: str, message: str) -> Dict[str, str]:
+    return {"field": path or "<arguments>", "constraint": constraint, "message": message}
+
+
+def _coerces_integral_floats(schema: Any) -> bool:
+    """Whether values of this node should be normalised from 5.0 to 5: declared integer, not number."""
+    declared = schema.get("type") if isinstance(schema, dict) else None
+    names = [declared] if isinstance(declared, str) else declared or ()
+    return "integer" in names and "number" not in names
+
+
+def _compile_node(schema: Dict[str, Any]) -> Callable[[Any, str, List[Dict[str, str]]], None]:
+    """Compile one schema node into a closure appending field-level errors.
+
+    Supports the subset the tool schemas use: type, enum, minimum/maximum,
+    minLength/maxLength, minItems/maxItems, items, properties, required,
+    additionalProperties and anyOf. Unknown keywords (description, default, ...) are ignored.
+    Integral floats held by integer-typed items and properties are rewritten to ints in place.
+    """
+    checks: List[Callable[[Any, str, List[Dict[str, str]]], bool]] = []
+
+    if "anyOf" in schema:
+        branches = [(_compile_fast(sub), _compile_node(sub), sub.get("type")) for sub in schema["anyOf"]]
+        branch_types = [t for _, _, declared in branches for t in ([declared] if isinstance(declared, str) else declared or ())]
+
+        def check_any_of(value, path, errors):
+            if any(fast(value) for fast, _, _ in branches):
+                return True
+            # Explain the failure against the first branch of the value's own type
+            for _, check, declared in branches:
+                names = [declared] if isinstance(declared, str) else declared
+                if not names or any(_JSON_TYPE_CHECKS[t](value) for t in names):
+                    check(value, path, errors)
+                    return False
+            errors.append(_field_error(path, "type", f"expected {' or '.join(branch_types)}, got {type(value).__name__}"))
+            return False
+        checks.append(check_any_of)
+
+    declared = schema.get("type")
+    if declared is not None:
+        type_names = [declared] if isinstance(declared, str) else list(declared)
+        type_checks = [_JSON_TYPE_CHECKS[t] for t in type_names]
+        expected = " or ".join(type_names)
+
+        def check_type(value, path, errors):
+            if any(check(value) for check in type_checks):
+                return True
+            errors.append(_field_error(path, "type", f"expected {expected}, got {type(value).__name__}"))
+            return False
+        checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = frozenset(schema["enum"])
+        allowed_text = ", ".join(map(str, schema["enum"]))
+
+        def check_enum(value, path, errors):
+            try:
+                if value in allowed:
+                    return True
+            except TypeError:
+                pass
+            errors.append(_field_error(path, "enum", f"must be one of: {allowed_text}"))
+            return False
+        checks.append(check_enum)
+
+    is_number = _JSON_TYPE_CHECKS["number"]
+    for keyword, compare, word in (("minimum", float.__ge__, ">="), ("maximum", float.__le__, "<=")):
+        if keyword in schema:
+            bound = float(schema[keyword])
+
+            def check_bound(value, path, errors, bound=bound, compare=compare, keyword=keyword, word=word):
+                if not is_number(value) or compare(float(value), bound):
+                    return True
+                errors.append(_field_error(path, keyword, f"must be {word} {schema[keyword]}, got {value}"))
+                return True
+            checks.append(check_bound)
+
+    for keyword, kind, compare, word in (
+        ("minLength", str, int.__ge__, "at least"),
+        ("maxLength", str, int.__le__, "at most"),
+        ("minItems", list, int.__ge__, "at least"),
+        ("maxItems", list, int.__le__, "at most"),
+    ):
+        if keyword in schema:
+            limit = int(schema[keyword])
+            unit = "characters" if kind is str else "items"
+
+            def check_size(value, path, errors, limit=limit, kind=kind, compare=compare, keyword=keyword, word=word, unit=unit):
+                if not isinstance(value, kind) or compare(len(value), limit):
+                    return True
+                errors.append(_field_error(path, keyword, f"must have {word} {limit} {unit}, got {len(value)}"))
+                return True
+            checks.append(check_size)
+
+    if "items" in schema:
+        item_fast = _compile_fast(schema["items"])
+        item_check = _compile_node(schema["items"])
+        item_coerces = _coerces_integral_floats(schema["items"])
+
+        def check_items(value, path, errors):
+            if isinstance(value, list):
+                for i, item in enumerate(value):
+                    if not item_fast(item):
+                        item_check(item, f"{path}[{i}]", errors)
+                        if item_coerces and isinstance(item, float) and item.is_integer():
+                            value[i] = int(item)
+            return True
+        checks.append(check_items)
+
+    # Children are pre-screened with their fast predicate; only failing ones are walked
+    properties = {
+        key: (_compile_fast(sub), _compile_node(sub), _coerces_integral_floats(sub))
+        for key, sub in schema.get("properties", {}).items()
+    }
+    required = tuple(schema.get("required", ()))
+    additional = schema.get("additionalProperties", True)
+    additional_check = (
+        (_compile_fast(additional), _compile_node(additional), _coerces_integral_floats(additional))
+        if isinstance(additional, dict) else None
+    )
+    if properties or required or additional is not True:
+
+        def check_object(value, path, errors):
+            if not isinstance(value, dict):
+                return True
+            prefix = f"{path}." if path else ""
+            for key in required:
+                if key not in value:
+                    errors.append(_field_error(prefix + key, "required", "is required"))
+            for key, item in value.items():
+                checks_for_key = properties.get(key, additional_check)
+                if checks_for_key is not None:
+                    fast, check, coerces = checks_for_key
+                    if not fast(item):
+                        check(item, prefix + key, errors)
+                        if coerces and isinstance(item, float) and item.is_integer():
+                            value[key] = int(item)
+                elif additional is False:
+                    errors.append(_field_error(prefix + key, "additionalProperties", "is not an allowed property"))
+            return True
+        checks.append(check_object)
+
+    def validate_node(value, path, errors):
+        for check in checks:
+            # Only a failed type or enum check stops the walk; range and size errors accumulate
+            if not check(value, path, errors):
+                return
+
+    return validate_node
+
+
+_JSON_TYPE_CLASSES = {
+    "string": (str,),
+    "number": (int, float),
+    "integer": (int,),
+    "boolean": (bool,),
+    "array": (list,),
+    "object": (dict,),
+    "null": (type(None),),
+}
+
+
+def _compile_fast(schema: Dict[str, Any]) -> Callable[[Any], bool]:
+    """Compile one schema node into a single predicate for the common all-valid case.
+
+    Exact class checks keep it to one call per value; anything it rejects (including
+    valid edge cases such as 5.0 for an integer) falls through to the detailed validator.
+    """
+    declared = schema.get("type")
+    classes = None
+    if declared is not None:
+        classes = frozenset(cls for t in ([declared] if isinstance(declared, str) else declared) for cls in _JSON_TYPE_CLASSES[t])
+    enum = frozenset(schema["enum"]) if "enum" in schema else None
+    lo = schema.get("minimum")
+    hi = schema.get("maximum")
+    min_size = schema.get("minItems", schema.get("minLength"))
+    max_size = schema.get("maxItems", schema.get("maxLength"))
+    item_fast = _compile_fast(schema["items"]) if "items" in schema else None
+    properties = {key: _compile_fast(sub) for key, sub in schema.get("properties", {}).items()}
+    required = tuple(schema.get("required", ()))
+    additional = schema.get("additionalProperties", True)
+    additional_fast = _compile_fast(additional) if isinstance(additional, dict) else None
+    any_of = [_compile_fast(sub) for sub in schema.get("anyOf", ())]
+    numeric = (int, float)
+
+    def fast(value):
+        cls = value.__class__
+        if any_of and not any(branch(value) for branch in any_of):
+            return False
+        if classes is not None and cls not in classes:
+            return False
+        if enum is not None and (cls is list or cls is dict or value not in enum):
+            return False
+        if cls in numeric:
+            if (lo is not None and value < lo) or (hi is not None and value > hi):
+                return False
+        elif cls is list or cls is str:
+            if (min_size is not None and len(value) < min_size) or (max_size is not None and len(value) > max_size):
+                return False
+            if item_fast is not None and cls is list:
+                for item in value:
+                    if not item_fast(item):
+                        return False
+        elif cls is dict:
+            for key in required:
+                if key not in value:
+                    return False
+            for key, item in value.items():
+                check = properties.get(key)
+                if check is not None:
+                    if not check(item):
+                        return False
+                elif additional is False or (additional_fast is not None and not additional_fast(item)):
+                    return False
+        return True
+
+    return fast
+
+
+def compile_schema(schema: Dict[str, Any]) -> Callable[[Any], List[Dict[str, str]]]:
+    """Compile a JSON schema once into a function returning a list of field-level errors.
+
+    Valid arguments take the single-predicate fast path; only rejected ones pay for
+    the detailed walk that names each failing field. That walk also rewrites integral
+    floats given for integer fields (5.0) to ints in place, so handlers only see ints.
+    """
+    fast = _compile_fast(schema)
+    root = _compile_node(schema)
+
+    def validate(arguments: Any) -> List[Dict[str, str]]:
+        if fast(arguments):
+            return []
+        errors: List[Dict[str, str]] = []
+        root(arguments, "", errors)
+        return errors
+
+    return validate
+
+
+class RegisteredTool(NamedTuple):
+    """A tool's handler, MCP definition, cache policy and execution class, captured once at import."""
+
+    name: str
+    handler: Callable[[Dict], Awaitable[Dict]]
+    tool: Tool
+    validate: Callable[[Any], List[Dict[str, str]]]
+    cache_ttl: float
+    restamp: Tuple[str, ...]
+    execution: Any
+    on_result: Optional[Callable[[Dict, Dict], None]]
+    input_schema: Dict[str, Any]
+
+    def execution_class(self, arguments: Dict) -> str:
+        return self.execution(arguments) if callable(self.execution) else self.execution
+
+
+TOOL_REGISTRY: Dict[str, RegisteredTool] = {}
+EXECUTION_CLASSES = ("loop", "process")
+_tool_list: Optional[List[Tool]] = None
+
+
+def register_tool(
+    name: str,
+    description: str,
+    input_schema: Dict[str, Any],
+    cache_ttl: float = 300.0,
+    restamp: Tuple[str, ...] = (),
+    execution: Any = "loop",
+    on_result: Optional[Callable[[Dict, Dict], None]] = None,
+):
+    """Decorator registering a `_handle_*` coroutine as an MCP tool.
+
+    `cache_ttl` (seconds, 0 disables) and `restamp` feed the tool result cache.
+    `execution` is "loop" (I/O-bound, runs on the event loop) or "process" (CPU-bound,
+    runs in the tool worker pool), or a function of the arguments returning one of
+    those. Process handlers must not await and must not mutate server state; put side
+    effects in `on_result(arguments, result)`, which always runs on the loop.
+    """
+    def decorator(handler: Callable[[Dict], Awaitable[Dict]]) -> Callable[[Dict], Awaitable[Dict]]:
+        global _tool_list
+        if name in TOOL_REGISTRY:
+            raise ValueError(f"Tool already registered: {name}")
+        tool = Tool(name=name, description=description, inputSchema=input_schema)
+        if not callable(execution) and execution not in EXECUTION_CLASSES:
+            raise ValueError(f"Unknown execution class for {name}: {execution!r}")
+        TOOL_REGISTRY[name] = RegisteredTool(
+            name, handler, tool, compile_schema(input_schema), cache_ttl, tuple(restamp), execution, on_result, input_schema
+        )
+        _tool_list = None
+        return handler
+    return decorator
+
+
+def recompile_tool_schemas() -> None:
+    """Rebuild every tool's MCP definition and validator after its input schema was edited in place."""
+    global _tool_list
+    for name, spec in list(TOOL_REGISTRY.items()):
+        TOOL_REGISTRY[name] = spec._replace(
+            tool=Tool(name=name, description=spec.tool.description, inputSchema=spec.input_schema),
+            validate=compile_schema(spec.input_schema),
+        )
+    _tool_list = None
+
+
+def registered_tool_list() -> List[Tool]:
+    """The Tool definitions, built once after the last registration and then reused.
+
+    Callers must treat the returned list as read-only.
+    """
+    global _tool_list
+    if _tool_list is None:
+        _tool_list = [spec.tool for spec in TOOL_REGISTRY.values()]
+    return _tool_list
+
+
+# --- Parameter Registry ---
+
+PARAMETERS_ENV = "ORGAIR_PARAMETERS"
+DEFAULT_PARAMETERS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "orgair_parameters.json")
+EBITDA_PARAMETER_NAMES = ("gamma_0", "gamma_1", "gamma_2", "gamma_3", "threshold")
+
+
+def _json_number(value: Decimal) -> Any:
+    """Render a Decimal parameter as an int when integral, else a float."""
+    return int(value) if value == value.to_integral_value() else float(value)
+
+
+class ParameterSnapshot(NamedTuple):
+    """One immutable version of the model parameters with its precomputed lookups."""
+
+    version: str
+    digest: str
+    sectors: Tuple[Dict[str, Any], ...]
+    hr_baselines: Dict[str, float]
+    default_hr_baseline: float
+    position_factor: float
+    model: Dict[str, float]
+    ebitda_decimal: Dict[str, Decimal]
+    ebitda_float: Dict[str, float]
+
+    def hr_baseline(self, sector_id: Optional[str]) -> float:
+        return self.hr_baselines.get(sector_id, self.default_hr_baseline)
+
+    def sectors_payload(self) -> Dict[str, Any]:
+        return {"sectors": [dict(sector) for sector in self.sectors]}
+
+    def parameters_payload(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "parameters": {
+                **self.model,
+                "ebitda": {name: _json_number(value) for name, value in self.ebitda_decimal.items()},
+            },
+        }
+
+    @classmethod
+    def parse(cls, raw: bytes) -> "ParameterSnapshot":
+        """Build a snapshot from the parameter file's bytes; raises ValueError when malformed."""
+        try:
+            document = json.loads(raw)
+            sectors = tuple(
+                {"id": str(s["id"]), "name": str(s["name"]), "h_r_baseline": s["h_r_baseline"]}
+                for s in document["sectors"]
+            )
+            ebitda = {name: Decimal(str(document["ebitda"][name])) for name in EBITDA_PARAMETER_NAMES}
+            return cls(
+                version=str(document["version"]),
+                digest=hashlib.sha256(raw).hexdigest(),
+                sectors=sectors,
+                hr_baselines={s["id"]: float(s["h_r_baseline"]) for s in sectors},
+                default_hr_baseline=float(document["default_h_r_baseline"]),
+                position_factor=float(document["position_factor"]),
+                model={name: float(value) for name, value in document["model"].items()},
+                ebitda_decimal=ebitda,
+                ebitda_float={name: float(value) for name, value in ebitda.items()},
+            )
+        except (KeyError, TypeError, ArithmeticError, json.JSONDecodeError) as e:
+            raise ValueError(f"Malformed parameter file: {e!r}") from e
+
+
+class ParameterRegistry:
+    """Versioned model parameters loaded from a JSON file, hot-swappable at runtime.
+
+    `snapshot` is replaced by a single reference assignment, so a handler that reads it
+    once at the start of a call computes and reports one consistent parameter_version
+    even if a reload lands mid-call. A malformed file leaves the current snapshot in place.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.mtime = os.stat(path).st_mtime_ns
+        with open(path, "rb") as handle:
+            self.snapshot = ParameterSnapshot.parse(handle.read())
+
+    def reload(self) -> bool:
+        """Re-read the file; returns True when a snapshot with different content was swapped in."""
+        mtime = os.stat(self.path).st_mtime_ns
+        with open(self.path, "rb") as handle:
+            raw = handle.read()
+        self.mtime = mtime
+        if hashlib.sha256(raw).hexdigest() == self.snapshot.digest:
+            return False
+        self.snapshot = ParameterSnapshot.parse(raw)
+        return True
+
+    def changed_on_disk(self) -> bool:
+        return os.stat(self.path).st_mtime_ns != self.mtime
+
+
+parameter_registry = ParameterRegistry(os.environ.get(PARAMETERS_ENV) or DEFAULT_PARAMETERS_PATH)
+
+
+def reload_parameters() -> bool:
+    """Hot-reload the parameter file and drop every response rendered from the old version."""
+    previous = parameter_registry.snapshot.version
+    if not parameter_registry.reload():
+        return False
+    refresh_sector_schemas()
+    tool_result_cache.invalidate()
+    invalidate_static_resources()
+    logger.info("parameters_reloaded", previous=previous, version=parameter_registry.snapshot.version)
+    return True
+
+
+# Schema nodes whose enum is the configured sector list, refreshed on every reload
+_SECTOR_SCHEMA_NODES: List[Dict[str, Any]] = []
+
+
+def sector_id_schema(**keywords: Any) -> Dict[str, Any]:
+    """A sector_id schema node enumerating the sectors in the current parameter file."""
+    node = {"type": "string", "enum": list(parameter_registry.snapshot.hr_baselines), **keywords}
+    _SECTOR_SCHEMA_NODES.append(node)
+    return node
+
+
+def refresh_sector_schemas() -> None:
+    sectors = list(parameter_registry.snapshot.hr_baselines)
+    if all(node["enum"] == sectors for node in _SECTOR_SCHEMA_NODES):
+        return
+    for node in _SECTOR_SCHEMA_NODES:
+        node["enum"] = sectors
+    recompile_tool_schemas()
+
+
+# How often the running server checks the parameter file for edits
+PARAMETERS_WATCH_INTERVAL_S = 5.0
+
+
+async def watch_parameters(interval: Optional[float] = None) -> None:
+    """Poll the parameter file's mtime and reload on change; run as a background task."""
+    while True:
+        await asyncio.sleep(PARAMETERS_WATCH_INTERVAL_S if interval is None else interval)
+        if parameter_registry.changed_on_disk():
+            try:
+                reload_parameters()
+            except (OSError, ValueError):
+                logger.exception("parameters_reload_failed", path=parameter_registry.path)
+
+# _handle_ functions (implementing tool logic)
+
+@register_tool(
+    name="calculate_org_air_score",
+    description="""Calculate the Org-AI-R (Organizational AI-Readiness) score for a company.\nReturns a comprehensive assessment including:\n- Final Org-AI-R score (0-100)\n- V^R (Idiosyncratic Readiness) component\n- H^R (Systematic Opportunity) component\n- Synergy score\n- SEM-based confidence interval\n- Calculation audit trail""",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "company_id": {"type": "string", "description": "Unique company identifier"},
+            "sector_id": sector_id_schema(description="Industry sector (e.g., 'technology', 'healthcare')"),
+            "dimension_scores": {
+                "type": "array",
+                "items": {"type": "number", "minimum": 0, "maximum": 100},
+                "minItems": 7,
+                "maxItems": 7,
+                "description": "Seven dimension scores: [data_infra, governance, tech_stack, talent, leadership, use_cases, culture]",
+            },
+            "talent_concentration": {
+                "type": "number",
+                "minimum": 0,
+                "maximum": 1,
+                "description": "Talent concentration ratio (0-1)",
+            },
+        },
+        "required": ["company_id", "sector_id", "dimension_scores"],
+    },
+    # Every result is appended to the score history, so repeat calls must run
+    cache_ttl=0.0,
+    restamp=("score_id", "timestamp"),
+)
+async def _handle_calculate_score(args: Dict) -> Dict:
+    """Handle score calculation."""
+    company_id = args["company_id"]
+    sector_id = args["sector_id"]
+    dimension_scores = args["dimension_scores"]
+    talent_concentration = args.get("talent_concentration", 0.2)
+    params = parameter_registry.snapshot
+
+    # Get HR baseline from the parameter registry (default baseline if sector not found)
+    hr_baseline = params.hr_baseline(sector_id)
+
+    # Mock parameters for the calculator
+    position_factor = params.position_factor
+    evidence_count = args.get("evidence_count", 10)
+
+    result = org_air_calculator.calculate(
+        company_id=company_id,
+        sector_id=sector_id,
+        dimension_scores=dimension_scores,
+        talent_concentration=talent_concentration,
+        hr_baseline=hr_baseline,
+        position_factor=position_factor,
+        evidence_count=evidence_count,
+    )
+
+    _record_scores({company_id: result["final_score"]})
+
+    # Format the timestamp for JSON serialization
+    result["timestamp"] = result["timestamp"].isoformat()
+    result["parameter_version"] = params.version
+    return result
+
+
+def _record_scores(scores: Dict[str, float]) -> None:
+    """Persist fresh final scores to the history, update fund aggregates, drop stale fund responses."""
+    score_history_store.append_many(scores)
+    changed = {company_id: score for company_id, score in scores.items() if fund_portfolio_store.scores.get(company_id) != score}
+    affected_funds = [fund_portfolio_store.record_score(company_id, score) for company_id, score in changed.items()]
+    if any(affected_funds):
+        tool_result_cache.invalidate("get_fund_portfolio")
+
+
+def _record_batch_scores(result: Dict) -> None:
+    """Record a batch response's scores; later rows win when a company appears more than once."""
+    _record_scores({row["company_id"]: row["final_score"] for row in result["results"]})
+
+
+def _hr_baselines_for(sector_ids: Sequence[str], params: Optional["ParameterSnapshot"] = None) -> np.ndarray:
+    """Map per-row sector ids to H^R baselines, looking each distinct sector up once."""
+    params = params or parameter_registry.snapshot
+    unique_sectors, inverse = np.unique(np.asarray(sector_ids, dtype=object).astype(str), return_inverse=True)
+    lookup = np.array([params.hr_baseline(s) for s in unique_sectors], dtype=np.float64)
+    return lookup[inverse]
+
+
+@register_tool(
+    name="calculate_org_air_scores_batch",
+    description="""Calculate Org-AI-R scores for many companies in one call.\nTakes an N x 7 dimension-score matrix with per-row company, sector\nand talent concentration values and returns one assessment per row,\nidentical to calling calculate_org_air_score for each company.""",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "company_ids": {"type": "array", "items": {"type": "string"}, "minItems": 1, "description": "Company identifier for each row"},
+            "sector_ids": {
+                "type": "array",
+                "items": sector_id_schema(),
+                "minItems": 1,
+                "description": "Industry sector for each row",
+            },
+            "dimension_scores": {
+                "type": "array",
+                "items": {
+                    "type": "array",
+                    "items": {"type": "number", "minimum": 0, "maximum": 100},
+                    "minItems": 7,
+                    "maxItems": 7,
+                },
+                "minItems": 1,
+                "description": "N x 7 matrix of dimension scores, one row per company",
+            },
+            "talent_concentration": {
+                "type": "array",
+                "items": {"type": "number", "minimum": 0, "maximum": 1},
+                "description": "Talent concentration ratio (0-1) for each row",
+            },
+        },
+        "required": ["company_ids", "sector_ids", "dimension_scores"],
+    },
+    # Large payloads with per-row score ids; re-scoring is cheaper than caching them
+    cache_ttl=0.0,
+    execution="process",
+    on_result=lambda args, result: _record_batch_scores(result),
+)
+async def _handle_calculate_batch(args: Dict) -> Dict:
+    """Handle batch score calculation over an N x 7 dimension-score matrix."""
+    company_ids = list(args["company_ids"])
+    sector_ids = args["sector_ids"]
+    dimension_scores = np.asarray(args["dimension_scores"], dtype=np.float64)
+    talent_concentration = args.get("talent_concentration", 0.2)
+    params = parameter_registry.snapshot
+
+    n_rows = len(company_ids)
+    if len(sector_ids) != n_rows or dimension_scores.shape[0] != n_rows:
+        raise ValueError("company_ids, sector_ids and dimension_scores must have the same number of rows")
+    if not np.isscalar(talent_concentration) and len(talent_concentration) != n_rows:
+        raise ValueError("talent_concentration must be a number or one value per row")
+
+    batch = org_air_calculator.calculate_batch(
+        dimension_scores=dimension_scores,
+        talent_concentration=talent_concentration,
+        hr_baseline=_hr_baselines_for(sector_ids, params),
+        position_factor=params.position_factor,
+    )
+    # Pull every column into Python floats once instead of per cell
+    columns = {name: values.tolist() for name, values in batch.items()}
+    timestamp = datetime.now(timezone.utc).isoformat()
+
+    results = [
+        {
+            "score_id": str(uuid.uuid4()),
+            "company_id": company_id,
+            "final_score": columns["final_score"][i],
+            "components": {
+                "v_r_score": columns["v_r_score"][i],
+                "h_r_score": columns["h_r_score"][i],
+                "synergy_score": columns["synergy_score"][i],
+            },
+            "confidence_interval": {
+                "lower": columns["ci_lower"][i],
+                "upper": columns["ci_upper"][i],
+                "sem": columns["sem"][i],
+            },
+            "audit_trail": {
+                "weighted_mean": columns["weighted_mean"][i],
+                "cv": columns["cv"][i],
+                "talent_risk_adj": columns["talent_risk_adj"][i],
+            },
+            "timestamp": timestamp,
+            "parameter_version": params.version,
+        }
+        for i, company_id in enumerate(company_ids)
+    ]
+
+    return {
+        "company_count": n_rows,
+        "results": results,
+        "timestamp": timestamp,
+        "parameter_version": params.version,
+    }
+
+
+@register_tool(
+    name="get_company_evidence",
+    description="""Retrieve AI-readiness evidence for a company.\nSearches SEC filings, job postings, and other sources for evidence\nsupporting dimension assessments. Returns ranked evidence items with\nconfidence scores and source citations.""",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "company_id": {"type": "string", "description": "Company identifier"},
+            "dimension": {
+                "anyOf": [
+                    {"type": "string", "enum": list(DIMENSION_NAMES) + ["all"]},
+                    {"type": "array", "items": {"type": "string", "enum": list(DIMENSION_NAMES)}, "minItems": 1},
+                ],
+                "description": "Specific dimension to search (e.g., 'data_infrastructure'); 'all' or a list returns top-k evidence per dimension in one call",
+            },
+            "query": {"type": "string", "description": "Optional search query to refine results"},
+            "limit": {"type": "integer", "minimum": 1, "maximum": 50, "default": 10},
+            "diversify": {
+                "type": "boolean",
+                "default": True,
+                "description": "Collapse near-duplicate evidence (the same fact from several sources) into one item listing the others",
+            },
+            "rerank": {
+                "type": "boolean",
+                "default": True,
+                "description": "Re-rank the top candidates on query, dimension and source features within a fixed latency budget",
+            },
+        },
+        "required": ["company_id"],
+    },
+)
+async def _handle_get_evidence(args: Dict) -> Dict:
+    """Handle evidence retrieval."""
+    company_id = args["company_id"]
+    dimension = args.get("dimension")
+    limit = args.get("limit", 10)
+
+    if dimension == "all" or isinstance(dimension, list):
+        # Multi-dimension mode: one query per dimension over a shared company candidate set,
+        # each group filtered to its own dimension
+        dimensions = list(DIMENSION_NAMES) if dimension == "all" else list(dict.fromkeys(dimension))
+        groups = await hybrid_retriever.retrieve_many(
+            [f"{args.get('query', 'AI readiness')} {name}" for name in dimensions],
+            k=limit,
+            company_id=company_id,
+            max_content_chars=500,
+            diversify=args.get("diversify", True),
+            rerank=args.get("rerank", True),
+            dimensions=dimensions,
+        )
+        return {
+            "company_id": company_id,
+            "dimension": dimension,
+            "evidence_count": len({item["doc_id"] for group in groups for item in group}),
+            "evidence_groups": dict(zip(dimensions, groups)),
+        }
+
+    dimension = dimension or "all"
+    query = args.get("query", f"AI readiness {dimension}")
+
+    # Content is truncated to 500 chars for brevity, sliced straight out of the store
+    results = await hybrid_retriever.retrieve(
+        query=query,
+        k=limit,
+        filter_metadata={"company_id": company_id} if company_id else None,
+        max_content_chars=500,
+        diversify=args.get("diversify", True),
+        rerank=args.get("rerank", True),
+    )
+
+    return {
+        "company_id": company_id,
+        "dimension": dimension,
+        "evidence_count": len(results),
+        "evidence_items": results,
+    }
+
+
+@register_tool(
+    name="ingest_evidence",
+    description="""Add new evidence documents (filings, job postings, transcripts) to the corpus.\nDocuments are chunked, deduplicated by content hash and become\nsearchable immediately through get_company_evidence.""",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "documents": {
+                "type": "array",
+                "minItems": 1,
+                "maxItems": 1000,
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "doc_id": {"type": "string", "minLength": 1},
+                        "content": {"type": "string", "minLength": 1},
+                        "company_id": {"type": "string", "minLength": 1},
+                        "dimension": {"type": "string", "enum": list(DIMENSION_NAMES)},
+                        "source": {"type": "string"},
+                        "score": {"type": "number", "minimum": 0, "maximum": 1},
+                    },
+                    "required": ["doc_id", "content", "company_id", "dimension"],
+                },
+            },
+        },
+        "required": ["documents"],
+    },
+    cache_ttl=0.0,
+)
+async def _handle_ingest_evidence(args: Dict) -> Dict:
+    """Handle evidence ingestion."""
+    counts = evidence_ingestor.ingest(evidence_item(document) for document in args["documents"])
+    return {**counts, "corpus": evidence_ingestor.stats()}
+
+
+# Scenario multipliers on the base case: 30% haircut and 30% uplift
+EBITDA_SCENARIO_MULTIPLIERS_DECIMAL = {"conservative": Decimal("0.7"), "base": Decimal("1"), "optimistic": Decimal("1.3")}
+EBITDA_SCENARIO_MULTIPLIERS_FLOAT = {name: float(value) for name, value in EBITDA_SCENARIO_MULTIPLIERS_DECIMAL.items()}
+
+# Largest absolute float64 vs Decimal difference we accept for ebitda_impact_pct (see test_source.py)
+EBITDA_FLOAT_TOLERANCE = 1e-12
+
+
+def _project_ebitda_decimal(
+    entry_score: Any, target_score: Any, h_r_score: Any, params: Optional[ParameterSnapshot] = None
+) -> Dict[str, Decimal]:
+    """Exact-decimal projection for audit runs."""
+    params = (params or parameter_registry.snapshot).ebitda_decimal
+    delta_air = Decimal(str(target_score)) - Decimal(str(entry_score))
+    h_r = Decimal(str(h_r_score))
+
+    # Base calculation formula
+    # This formula represents a simplified attribution model where EBITDA impact is a
+    # function of the change in Org-AI-R score (delta_air) and systematic opportunity (h_r_score).
+    # The gamma parameters are coefficients that weigh these factors.
+    # $ base_impact = \gamma_0 + \gamma_1 \cdot \Delta_{{AIR}} + \gamma_2 \cdot \Delta_{{AIR}} \cdot \frac{{H_R}}{{100}} + (\gamma_3 \text{{ if }} \Delta_{{AIR}} > \text{{threshold else }} 0) $
+    base_impact = (
+        params["gamma_0"] +
+        params["gamma_1"] * delta_air +
+        params["gamma_2"] * delta_air * h_r / Decimal("100") +
+        (params["gamma_3"] if delta_air > params["threshold"] else Decimal("0"))
+    )
+    projection = {"delta_air": delta_air}
+    for scenario, multiplier in EBITDA_SCENARIO_MULTIPLIERS_DECIMAL.items():
+        projection[scenario] = base_impact * multiplier
+    return projection
+
+
+def _project_ebitda_float(
+    entry_score: Any, target_score: Any, h_r_score: Any, params: Optional[ParameterSnapshot] = None
+) -> Dict[str, float]:
+    """Scalar float64 projection; the default path for single tool calls."""
+    params = (params or parameter_registry.snapshot).ebitda_float
+    delta_air = float(target_score) - float(entry_score)
+    base_impact = (
+        params["gamma_0"] +
+        params["gamma_1"] * delta_air +
+        params["gamma_2"] * delta_air * float(h_r_score) / 100.0 +
+        (params["gamma_3"] if delta_air > params["threshold"] else 0.0)
+    )
+    projection = {"delta_air": delta_air}
+    for scenario, multiplier in EBITDA_SCENARIO_MULTIPLIERS_FLOAT.items():
+        projection[scenario] = base_impact * multiplier
+    return projection
+
+
+def project_ebitda_impact_batch(
+    entry_score: Any, target_score: Any, h_r_score: Any, params: Optional[ParameterSnapshot] = None
+) -> Dict[str, np.ndarray]:
+    """Vectorized float64 projection over broadcastable arrays of entry/target/H^R scores.
+
+    Same formula and evaluation order as `_project_ebitda_float`, so a grid cell equals
+    the single-call result; both stay within EBITDA_FLOAT_TOLERANCE of the Decimal path.
+    """
+    params = (params or parameter_registry.snapshot).ebitda_float
+    delta_air = np.asarray(target_score, dtype=np.float64) - np.asarray(entry_score, dtype=np.float64)
+    h_r = np.asarray(h_r_score, dtype=np.float64)
+    base_impact = (
+        params["gamma_0"] +
+        params["gamma_1"] * delta_air +
+        params["gamma_2"] * delta_air * h_r / 100.0 +
+        np.where(delta_air > params["threshold"], params["gamma_3"], 0.0)
+    )
+    projection = {"delta_air": np.broadcast_to(delta_air, base_impact.shape)}
+    for scenario, multiplier in EBITDA_SCENARIO_MULTIPLIERS_FLOAT.items():
+        projection[scenario] = base_impact * multiplier
+    return projection
+
+
+@register_tool(
+    name="project_ebitda_impact",
+    description="""Project EBITDA impact from AI-readiness improvements.\nUses the v2.0 conservative EBITDA attribution model to project\nfinancial impact across three scenarios (Conservative, Base, Optimistic).\nIncludes risk adjustments and confidence bounds.""",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "company_id": {"type": "string", "description": "Unique company identifier"},
+            "entry_score": {"type": "number", "minimum": 0, "maximum": 100, "description": "Current Org-AI-R score"},
+            "target_score": {"type": "number", "minimum": 0, "maximum": 100, "description": "Target Org-AI-R score after improvements"},
+            "holding_period_years": {"type": "integer", "minimum": 1, "maximum": 10, "default": 5, "description": "Number of years in the holding period for projection"},
+            "h_r_score": {"type": "number", "minimum": 0, "maximum": 100, "description": "Systematic opportunity score (H^R component)"},
+            "precision": {"type": "string", "enum": ["float", "decimal"], "default": "float", "description": "Arithmetic mode: float64 fast path or exact-decimal audit mode"},
+        },
+        "required": ["company_id", "entry_score", "target_score", "h_r_score"],
+    },
+)
+async def _handle_ebitda_projection(args: Dict) -> Dict:
+    """Handle EBITDA projection with v2.0 parameters.
+
+    Uses the float64 fast path unless `precision` is "decimal" (audit mode).
+    """
+    company_id = args["company_id"]
+    holding_period_years = float(args.get("holding_period_years", 5))
+    precision = args.get("precision", "float")
+    params = parameter_registry.snapshot
+
+    project = _project_ebitda_decimal if precision == "decimal" else _project_ebitda_float
+    projection = {
+        key: float(value)
+        for key, value in project(args["entry_score"], args["target_score"], args["h_r_score"], params).items()
+    }
+
+    return {
+        "company_id": company_id,
+        "entry_score": float(args["entry_score"]),
+        "target_score": float(args["target_score"]),
+        "delta_air": projection["delta_air"],
+        "holding_period_years": holding_period_years,
+        "scenarios": {
+            "conservative": {
+                "ebitda_impact_pct": projection["conservative"],
+                "description": "30% haircut on base case, accounting for higher risk",
+            },
+            "base": {
+                "ebitda_impact_pct": projection["base"],
+                "description": "Expected outcome based on v2.0 parameters",
+            },
+            "optimistic": {
+                "ebitda_impact_pct": projection["optimistic"],
+                "description": "30% uplift on base case, assuming optimal conditions",
+            },
+        },
+        "precision": precision,
+        "parameter_version": params.version,
+        "disclaimer": "Projections are estimates. Actual results may vary.",
+    }
+
+
+# Upper bound on target x H^R cells per grid call. Each cell serializes to roughly
+# 60 bytes of JSON (three scenario floats), so a response at the cap is about 1.2 MB
+EBITDA_GRID_MAX_CELLS = 20_000
+
+
+def _score_range_schema(description: str) -> Dict[str, Any]:
+    """Schema for an evenly spaced score axis: `steps` points from `start` to `stop` inclusive."""
+    return {
+        "type": "object",
+        "properties": {
+            "start": {"type": "number", "minimum": 0, "maximum": 100},
+            "stop": {"type": "number", "minimum": 0, "maximum": 100},
+            "steps": {"type": "integer", "minimum": 1, "maximum": 1001, "default": 11},
+        },
+        "required": ["start", "stop"],
+        "additionalProperties": False,
+        "description": description,
+    }
+
+
+def _score_axis(spec: Dict) -> np.ndarray:
+    """Materialize a score range spec as a float64 axis."""
+    return np.linspace(float(spec["start"]), float(spec["stop"]), int(spec.get("steps", 11)))
+
+
+@register_tool(
+    name="project_ebitda_grid",
+    description=f"""Project EBITDA impact over a grid of target and H^R scores.\nComputes the full Conservative/Base/Optimistic surface of the v2.0\nattribution model in one batched call, replacing repeated\nproject_ebitda_impact round trips during sensitivity analysis.\nGrids are capped at {EBITDA_GRID_MAX_CELLS:,} target x H^R cells (about 60 bytes of\nJSON per cell, roughly 1.2 MB per response at the cap).""",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "company_id": {"type": "string", "description": "Unique company identifier"},
+            "entry_score": {"type": "number", "minimum": 0, "maximum": 100, "description": "Current Org-AI-R score"},
+            "target_score": _score_range_schema("Target Org-AI-R score axis"),
+            "h_r_score": _score_range_schema("Systematic opportunity score (H^R component) axis"),
+            "holding_period_years": {
+                "type": "object",
+                "properties": {
+                    "start": {"type": "integer", "minimum": 1, "maximum": 10},
+                    "stop": {"type": "integer", "minimum": 1, "maximum": 10},
+                },
+                "required": ["start", "stop"],
+                "additionalProperties": False,
+                "description": "Holding period range in whole years (inclusive)",
+            },
+        },
+        "required": ["company_id", "entry_score", "target_score", "h_r_score"],
+    },
+    # Responses run to ~1 MB and the result cache is bounded by entry count, not bytes
+    cache_ttl=0.0,
+    execution="process",
+)
+async def _handle_ebitda_grid(args: Dict) -> Dict:
+    """Handle EBITDA sensitivity grid over target_score x h_r_score."""
+    entry_score = float(args["entry_score"])
+    target_axis = _score_axis(args["target_score"])
+    h_r_axis = _score_axis(args["h_r_score"])
+    if target_axis.size * h_r_axis.size > EBITDA_GRID_MAX_CELLS:
+        raise ValueError(f"Grid has {target_axis.size * h_r_axis.size} cells; the limit is {EBITDA_GRID_MAX_CELLS}")
+    holding = args.get("holding_period_years", {"start": 5, "stop": 5})
+    if holding["start"] > holding["stop"]:
+        raise ValueError("holding_period_years.start must not exceed holding_period_years.stop")
+
+    params = parameter_registry.snapshot
+    projection = project_ebitda_impact_batch(entry_score, target_axis[:, None], h_r_axis[None, :], params)
+    scenarios = list(EBITDA_SCENARIO_MULTIPLIERS_FLOAT)
+
+    return {
+        "company_id": args["company_id"],
+        "entry_score": entry_score,
+        "axes": {
+            "scenario": scenarios,
+            "target_score": target_axis.tolist(),
+            "h_r_score": h_r_axis.tolist(),
+        },
+        # v2.0 has no holding-period term, so the surface is identical for every year in the range
+        "holding_period_years": list(range(int(holding["start"]), int(holding["stop"]) + 1)),
+        "shape": [len(scenarios), target_axis.size, h_r_axis.size],
+        "ebitda_impact_pct": np.stack([projection[name] for name in scenarios]).tolist(),
+        # gamma_3 applies for targets strictly above this score
+        "gamma_3_threshold_target": entry_score + params.ebitda_float["threshold"],
+        "parameter_version": params.version,
+        "disclaimer": "Projections are estimates. Actual results may vary.",
+    }
+
+
+# Short names accepted in what-if `dimension_changes`, mapped onto DIMENSION_NAMES
+DIMENSION_ALIASES = {
+    "data_infra": "data_infrastructure",
+    "governance": "ai_governance",
+    "tech_stack": "technology_stack",
+    "use_cases": "use_case_portfolio",
+}
+
+# Monte Carlo what-if settings
+WHATIF_PERCENTILES = (5, 25, 50, 75, 95)
+WHATIF_CHUNK_ROWS = 65_536          # samples scored per calculate_batch pass
+WHATIF_DEFAULT_BASELINE = 50.0      # per-dimension score when no baseline is supplied
+WHATIF_IMPACT_RATE = 0.05           # projected_impact = org_air_change * investment_usd * rate
+
+
+def _resolve_dimension_changes(dimension_changes: Dict[str, float]) -> np.ndarray:
+    """Map a {dimension: change} dict (full names or aliases) onto a length-7 vector."""
+    vector = np.zeros(len(DIMENSION_NAMES))
+    for name, change in dimension_changes.items():
+        dimension = DIMENSION_ALIASES.get(name, name)
+        if dimension not in DIMENSION_NAMES:
+            raise ValueError(f"Unknown dimension '{name}'; expected one of: {', '.join(DIMENSION_NAMES)}")
+        vector[DIMENSION_NAMES.index(dimension)] += float(change)
+    return vector
+
+
+def _percentile_band(values: np.ndarray) -> Dict[str, float]:
+    """Summarize samples as mean/std plus the WHATIF_PERCENTILES."""
+    band = {"mean": float(values.mean()), "std": float(values.std())}
+    for q, value in zip(WHATIF_PERCENTILES, np.percentile(values, WHATIF_PERCENTILES)):
+        band[f"p{q}"] = float(value)
+    return band
+
+
+def simulate_whatif(
+    dimension_changes: np.ndarray,
+    baseline_scores: np.ndarray,
+    hr_baseline: float,
+    talent_concentration: float,
+    investment_usd: float,
+    samples: int,
+    seed: int,
+    change_uncertainty: float = 0.25,
+    talent_uncertainty: float = 0.05,
+    latency_budget_s: float = 0.5,
+    position_factor: float = 0.1,
+) -> Dict[str, Any]:
+    """Monte Carlo what-if over perturbed dimension changes and talent concentration.
 
-# nest_asyncio.apply()
-# logger = structlog.get_logger()
-# mcp_server = Server("pe-orgair-server")
+    Each sample scales every dimension change by (1 + change_uncertainty * N(0, 1)),
+    draws talent concentration from N(talent_concentration, talent_uncertainty)
+    clipped to [0, 1], and scores baseline and improved profiles with
+    `calculate_batch` in chunks of WHATIF_CHUNK_ROWS. Chunks stop being drawn once
+    the latency budget is spent, so `samples_completed` may be below `samples`.
+    """
+    rng = np.random.default_rng(seed)
+    baseline_scores = np.asarray(baseline_scores, dtype=np.float64)
+    start = time.perf_counter()
+    changes = []
+    done = 0
+    while done < samples:
+        rows = min(WHATIF_CHUNK_ROWS, samples - done)
+        noise = rng.standard_normal((rows, len(DIMENSION_NAMES)))
+        talent = np.clip(talent_concentration + talent_uncertainty * rng.standard_normal(rows), 0.0, 1.0)
+        improved = np.clip(baseline_scores + dimension_changes * (1 + change_uncertainty * noise), 0.0, 100.0)
+        before = org_air_calculator.calculate_batch(
+            np.broadcast_to(baseline_scores, improved.shape), talent, hr_baseline, position_factor
+        )["final_score"]
+        after = org_air_calculator.calculate_batch(improved, talent, hr_baseline, position_factor)["final_score"]
+        changes.append(after - before)
+        done += rows
+        if time.perf_counter() - start > latency_budget_s:
+            break
+
+    org_air_change = np.concatenate(changes)
+    return {
+        "samples_requested": samples,
+        "samples_completed": int(org_air_change.size),
+        "seed": seed,
+        "elapsed_ms": (time.perf_counter() - start) * 1e3,
+        "org_air_change": _percentile_band(org_air_change),
+        "projected_impact_usd": _percentile_band(org_air_change * investment_usd * WHATIF_IMPACT_RATE),
+    }
+
+
+def _band_confidence(band: Dict[str, float]) -> str:
+    """Label a simulated band by its 90% interval width relative to the median."""
+    spread = band["p95"] - band["p5"]
+    scale = abs(band["p50"])
+    if scale and spread / scale < 0.25:
+        return "high"
+    if scale and spread / scale < 0.75:
+        return "medium"
+    return "low"
+
+
+@register_tool(
+    name="analyze_whatif_scenario",
+    description="""Analyze what-if scenarios for AI investment decisions.\nModel the impact of specific AI initiatives on Org-AI-R score\nand downstream financial metrics. Set mode to "monte_carlo" for\npercentile bands from simulated perturbations of the scenario.""",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "company_id": {"type": "string", "description": "Unique company identifier"},
+            "scenario_name": {"type": "string", "description": "Name for the what-if scenario"},
+            "dimension_changes": {
+                "type": "object",
+                "description": "Map of dimension name to expected score change (e.g., {'data_infra': 5, 'talent': 10})",
+                "additionalProperties": {"type": "number"},
+            },
+            "investment_usd": {"type": "number", "minimum": 0, "description": "Planned investment amount in USD"},
+            "mode": {"type": "string", "enum": ["linear", "monte_carlo"], "default": "linear", "description": "Single linear estimate or Monte Carlo simulation"},
+            "samples": {"type": "integer", "minimum": 100, "maximum": 1000000, "default": 10000, "description": "Monte Carlo sample count"},
+            "seed": {"type": "integer", "minimum": 0, "description": "Random seed for reproducible simulations"},
+            "baseline_scores": {
+                "type": "array",
+                "items": {"type": "number", "minimum": 0, "maximum": 100},
+                "minItems": 7,
+                "maxItems": 7,
+                "description": "Current seven dimension scores (defaults to 50 each)",
+            },
+            "sector_id": sector_id_schema(description="Industry sector, used for the H^R baseline"),
+            "talent_concentration": {"type": "number", "minimum": 0, "maximum": 1, "default": 0.2, "description": "Talent concentration ratio"},
+            "change_uncertainty": {"type": "number", "minimum": 0, "maximum": 2, "default": 0.25, "description": "Relative standard deviation of each dimension change"},
+            "talent_uncertainty": {"type": "number", "minimum": 0, "maximum": 0.5, "default": 0.05, "description": "Standard deviation of talent concentration"},
+            "latency_budget_ms": {"type": "number", "minimum": 1, "maximum": 10000, "default": 500, "description": "Stop drawing samples once this budget is spent"},
+        },
+        "required": ["company_id", "scenario_name", "dimension_changes"],
+    },
+    # The linear estimate is a few arithmetic ops; only simulations are worth a worker
+    execution=lambda args: "process" if args.get("mode") == "monte_carlo" else "loop",
+)
+async def _handle_whatif(args: Dict) -> Dict:
+    """Handle what-if scenario analysis."""
+    company_id = args["company_id"]
+    scenario_name = args["scenario_name"]
+    dimension_changes = args["dimension_changes"]
+    investment_usd = args.get("investment_usd", 0)  # Optional investment amount
+
+    if args.get("mode", "linear") == "monte_carlo":
+        seed = args.get("seed")
+        params = parameter_registry.snapshot
+        simulation = simulate_whatif(
+            dimension_changes=_resolve_dimension_changes(dimension_changes),
+            baseline_scores=np.asarray(args.get("baseline_scores", [WHATIF_DEFAULT_BASELINE] * len(DIMENSION_NAMES))),
+            hr_baseline=params.hr_baseline(args.get("sector_id")),
+            talent_concentration=args.get("talent_concentration", 0.2),
+            investment_usd=float(investment_usd),
+            samples=int(args.get("samples", 10_000)),
+            seed=int(np.random.SeedSequence().entropy % 2**32) if seed is None else int(seed),
+            change_uncertainty=args.get("change_uncertainty", 0.25),
+            talent_uncertainty=args.get("talent_uncertainty", 0.05),
+            latency_budget_s=args.get("latency_budget_ms", 500) / 1e3,
+            position_factor=params.position_factor,
+        )
+        return {
+            "company_id": company_id,
+            "scenario_name": scenario_name,
+            "dimension_changes": dimension_changes,
+            "mode": "monte_carlo",
+            **simulation,
+            "confidence": _band_confidence(simulation["org_air_change"]),
+            "recommendation": "Plan against the p5-p95 band rather than the median alone.",
+        }
+
+    # Simplified logic for Org-AI-R change based on sum of dimension changes
+    org_air_change = sum(dimension_changes.values()) * 0.14  # As per OCR
+
+    # Simplified projected financial impact
+    # $ projected_impact = org_air_change \times \text{{investment_usd}} \times 0.05 $
+    projected_impact = org_air_change * investment_usd * WHATIF_IMPACT_RATE
+
+    # A simple linear relationship for demo
+    return {
+        "company_id": company_id,
+        "scenario_name": scenario_name,
+        "dimension_changes": dimension_changes,
+        "org_air_change": float(org_air_change),
+        "projected_impact_usd": float(projected_impact),
+        "confidence": "medium",
+        "recommendation": "Further analysis recommended to validate projected impact and associated risks.",
+    }
+
+
+@register_tool(
+    name="get_fund_portfolio",
+    description="""Get portfolio summary for a fund.\nReturns Fund-AI-R score, company breakdown, concentration metrics,\nand portfolio-level insights.""",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "fund_id": {"type": "string", "description": "Unique fund identifier"},
+            "include_companies": {"type": "boolean", "default": True, "description": "Include detailed company list in the output"},
+            "include_trends": {"type": "boolean", "default": False, "description": "Include historical trends in the output"},
+            "trend_resolution": {"type": "string", "enum": ["daily", "weekly", "monthly"], "default": "monthly", "description": "Bucket size of the trend series"},
+            "trend_periods": {"type": "integer", "minimum": 1, "maximum": 520, "default": 12, "description": "Number of most recent trend buckets to return"},
+        },
+        "required": ["fund_id"],
+    },
+    cache_ttl=60.0,
+    restamp=("as_of",),
+)
+async def _handle_fund_portfolio(args: Dict) -> Dict:
+    """Handle fund portfolio request."""
+    fund_id = args["fund_id"]
+    summary = fund_portfolio_store.summary(fund_id, include_companies=args.get("include_companies", True))
+    if args.get("include_trends", False):
+        resolution = args.get("trend_resolution", "monthly")
+        summary["trends"] = {
+            "resolution": resolution,
+            "points": score_history_store.weighted_trend(
+                fund_portfolio_store.weights(fund_id), resolution, limit=int(args.get("trend_periods", 12))
+            ),
+        }
+    summary["as_of"] = datetime.now(timezone.utc).isoformat()
+    return summary
+
+
+async def run_dag(
+    steps: Dict[str, Tuple[Sequence[str], Callable[[Dict[str, Any]], Awaitable[Any]]]],
+) -> Dict[str, Any]:
+    """Run named async steps as a dependency DAG; each starts as soon as its dependencies finish.
+
+    `steps` maps a name to (dependency names, step function); a step function receives its
+    dependencies' results by name. Dependencies must be declared before their dependents,
+    which rules out cycles. Independent steps run concurrently via asyncio.gather.
+    """
+    seen = set()
+    for name, (deps, _) in steps.items():
+        missing = [dep for dep in deps if dep not in seen]
+        if missing:
+            raise ValueError(f"Step '{name}' depends on undeclared or later steps: {', '.join(missing)}")
+        seen.add(name)
+
+    tasks: Dict[str, asyncio.Future] = {}
+
+    async def run_step(name: str) -> Any:
+        deps, step = steps[name]
+        results = await asyncio.gather(*(tasks[dep] for dep in deps))
+        return await step(dict(zip(deps, results)))
+
+    for name in steps:
+        tasks[name] = asyncio.ensure_future(run_step(name))
+    results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    return dict(zip(steps, results))
+
+
+class PlanStepError(Exception):
+    """A value-creation-plan step returned an error payload."""
+
+
+async def _plan_tool_step(name: str, arguments: Dict, timings: Dict[str, float], label: str) -> Dict:
+    """Run one tool through call_tool (validation, cache, worker pool) and time it."""
+    started = time.perf_counter()
+    result = json.loads((await call_tool(name, arguments))[0].text)
+    timings[label] = (time.perf_counter() - started) * 1e3
+    if "error" in result:
+        raise PlanStepError(f"{name}: {result['error']}")
+    return result
+
+
+@register_tool(
+    name="build_value_creation_plan",
+    description="""Build an AI value creation plan for a company in one call.\nScores the company, gathers evidence for the focus dimensions,\nmodels the improvement scenario and projects EBITDA impact, running\nindependent steps concurrently.""",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "company_id": {"type": "string", "description": "Unique company identifier"},
+            "sector_id": sector_id_schema(description="Industry sector of the company"),
+            "dimension_scores": {
+                "type": "array",
+                "items": {"type": "number", "minimum": 0, "maximum": 100},
+                "minItems": 7,
+                "maxItems": 7,
+                "description": "Current seven dimension scores",
+            },
+            "talent_concentration": {"type": "number", "minimum": 0, "maximum": 1, "default": 0.2, "description": "Talent concentration ratio"},
+            "target_score": {"type": "number", "minimum": 0, "maximum": 100, "description": "Target Org-AI-R score"},
+            "timeline_months": {"type": "integer", "minimum": 1, "maximum": 120, "default": 18, "description": "Plan timeline in months"},
+            "holding_period_years": {"type": "integer", "minimum": 1, "maximum": 10, "default": 3, "description": "Holding period for the EBITDA projection"},
+            "focus_dimensions": {
+                "type": "array",
+                "items": {"type": "string", "enum": list(DIMENSION_NAMES)},
+                "minItems": 1,
+                "default": ["data_infrastructure", "talent"],
+                "description": "Dimensions the plan targets; evidence is gathered for each",
+            },
+            "dimension_changes": {
+                "type": "object",
+                "additionalProperties": {"type": "number"},
+                "description": "Expected change per dimension (defaults to each focus dimension's gap to the target score)",
+            },
+            "investment_usd": {"type": "number", "minimum": 0, "default": 0, "description": "Planned investment amount in USD"},
+            "evidence_per_dimension": {"type": "integer", "minimum": 1, "maximum": 10, "default": 3},
+            "scenario_mode": {"type": "string", "enum": ["linear", "monte_carlo"], "default": "linear", "description": "What-if analysis mode"},
+        },
+        "required": ["company_id", "sector_id", "dimension_scores", "target_score"],
+    },
+    # Scoring records the company's score, so every plan must run
+    cache_ttl=0.0,
+)
+async def _handle_value_creation_plan(args: Dict) -> Dict:
+    """Handle value creation plan: score, evidence and scenario concurrently, then EBITDA."""
+    company_id = args["company_id"]
+    target_score = float(args["target_score"])
+    dimension_scores = args["dimension_scores"]
+    focus_dimensions = list(dict.fromkeys(args.get("focus_dimensions", ["data_infrastructure", "talent"])))
+    dimension_changes = args.get("dimension_changes") or {
+        dimension: max(0.0, target_score - dimension_scores[DIMENSION_NAMES.index(dimension)])
+        for dimension in focus_dimensions
+    }
+    timings: Dict[str, float] = {}
+
+    async def score(_: Dict) -> Dict:
+        return await _plan_tool_step("calculate_org_air_score", {
+            "company_id": company_id,
+            "sector_id": args["sector_id"],
+            "dimension_scores": dimension_scores,
+            "talent_concentration": args.get("talent_concentration", 0.2),
+        }, timings, "score")
+
+    async def evidence(_: Dict) -> Dict:
+        return await _plan_tool_step("get_company_evidence", {
+            "company_id": company_id,
+            "dimension": focus_dimensions,
+            "limit": args.get("evidence_per_dimension", 3),
+        }, timings, "evidence")
+
+    async def scenario(_: Dict) -> Dict:
+        return await _plan_tool_step("analyze_whatif_scenario", {
+            "company_id": company_id,
+            "scenario_name": f"Value creation plan to {target_score:g}",
+            "dimension_changes": dimension_changes,
+            "investment_usd": args.get("investment_usd", 0),
+            "mode": args.get("scenario_mode", "linear"),
+            "baseline_scores": dimension_scores,
+            "sector_id": args["sector_id"],
+        }, timings, "scenario")
+
+    async def ebitda(inputs: Dict) -> Dict:
+        current = inputs["score"]
+        return await _plan_tool_step("project_ebitda_impact", {
+            "company_id": company_id,
+            "entry_score": current["final_score"],
+            "target_score": target_score,
+            "h_r_score": current["components"]["h_r_score"],
+            "holding_period_years": args.get("holding_period_years", 3),
+        }, timings, "ebitda")
+
+    steps: Dict[str, Tuple[Sequence[str], Callable[[Dict], Awaitable[Any]]]] = {
+        "score": ((), score),
+        "evidence": ((), evidence),
+        "scenario": ((), scenario),
+        "ebitda": (("score",), ebitda),
+    }
+
+    started = time.perf_counter()
+    results = await run_dag(steps)
+    elapsed_ms = (time.perf_counter() - started) * 1e3
+    errors = {name: str(result) for name, result in results.items() if isinstance(result, BaseException)}
+    ok = {name: result for name, result in results.items() if name not in errors}
+
+    current = ok.get("score")
+    projection = ok.get("ebitda")
+    scenario_result = ok.get("scenario")
+    # Monte Carlo scenarios report a percentile band; the summary keeps a number (the median)
+    change = scenario_result["org_air_change"] if scenario_result else None
+    change_band = change if isinstance(change, dict) else None
+    return {
+        "company_id": company_id,
+        "target_score": target_score,
+        "timeline_months": args.get("timeline_months", 18),
+        "current_score": current,
+        "evidence": ok["evidence"]["evidence_groups"] if "evidence" in ok else {},
+        "scenario": scenario_result,
+        "ebitda_projection": projection,
+        "summary": {
+            "current_org_air": current["final_score"] if current else None,
+            "gap_to_target": target_score - current["final_score"] if current else None,
+            "projected_org_air_change": change_band["p50"] if change_band else change,
+            "projected_org_air_change_band": change_band,
+            "base_ebitda_impact_pct": projection["scenarios"]["base"]["ebitda_impact_pct"] if projection else None,
+        },
+        "errors": errors,
+        "timings_ms": timings,
+        "elapsed_ms": elapsed_ms,
+    }
+
+
+# Register all tools with the MCP server
+@mcp_server.list_tools()
+async def list_tools() -> List[Tool]:
+    """List all available tools."""
+    return registered_tool_list()
+
+
+# --- Tool Result Cache ---
+
+# Generators for fields that must differ between otherwise identical responses
+RESTAMP_GENERATORS = {
+    "score_id": lambda: str(uuid.uuid4()),
+    "timestamp": lambda: datetime.now(timezone.utc).isoformat(),
+    "as_of": lambda: datetime.now(timezone.utc).isoformat(),
+}
+
+
+class ToolResultCache:
+    """TTL + LRU cache of serialized tool responses, keyed on tool name and canonical arguments.
+
+    Entries hold the response text as a template: fields named in a tool's `restamp` policy
+    are serialized as placeholders and filled with fresh values on every hit, so cached
+    responses never repeat a score_id or timestamp and no JSON is re-encoded.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        policies: Optional[Dict[str, Dict[str, Any]]] = None,
+        default_ttl: float = 0.0,
+        serialize=None,
+        clock=time.monotonic,
+    ):
+        self.max_entries = max_entries
+        # None means "use each registered tool's cache_ttl / restamp"
+        self.policies = policies
+        self.default_ttl = default_ttl
+        self.serialize = serialize or (lambda obj: response_serializer.dumps(obj))
+        self.clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, List[Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(name: str, arguments: Optional[Dict[str, Any]]) -> str:
+        return json.dumps([name, arguments or {}], sort_keys=True, separators=(",", ":"), default=str)
+
+    def _policy(self, name: str) -> Dict[str, Any]:
+        if self.policies is not None:
+            return self.policies.get(name, {"ttl": self.default_ttl, "restamp": ()})
+        spec = TOOL_REGISTRY.get(name)
+        if spec is None:
+            return {"ttl": self.default_ttl, "restamp": ()}
+        return {"ttl": spec.cache_ttl, "restamp": spec.restamp}
+
+    def get(self, name: str, arguments: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Return the cached response text, re-stamped, or None on a miss."""
+        if self._policy(name)["ttl"] <= 0:
+            return None
+        key = self.make_key(name, arguments)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, template = entry
+        if self.clock() >= expires_at:
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return self._render(template, {})
+
+    def put(self, name: str, arguments: Optional[Dict[str, Any]], result: Dict[str, Any]) -> str:
+        """Serialize `result` once, cache it if the tool allows, and return the response text."""
+        template, originals = self.store(name, arguments, result)
+        # The miss path returns the original values rather than fresh ones
+        return self._render(template, originals)
+
+    def store(self, name: str, arguments: Optional[Dict[str, Any]], result: Dict[str, Any]) -> Tuple[List[Any], Dict[str, Any]]:
+        """Serialize `result` into a template, cache it if the tool allows; returns it with the original restamp values."""
+        policy = self._policy(name)
+        restamp = [field for field in policy["restamp"] if field in result]
+        placeholders = {field: f"\x00restamp:{field}\x00" for field in restamp}
+        text = self.serialize({**result, **placeholders})
+        template: List[Any] = [text]
+        for field, placeholder in placeholders.items():
+            encoded = self.serialize(placeholder)
+            template = [
+                part
+                for segment in template
+                for part in (
+                    self._interleave(segment.split(encoded), field) if isinstance(segment, str) else [segment]
+                )
+            ]
+        if policy["ttl"] > 0:
+            key = self.make_key(name, arguments)
+            self._entries[key] = (self.clock() + policy["ttl"], template)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return template, {field: result[field] for field in restamp}
+
+    @staticmethod
+    def _interleave(literals: List[str], field: str) -> List[Any]:
+        parts: List[Any] = [literals[0]]
+        for literal in literals[1:]:
+            parts.extend([(field,), literal])
+        return parts
+
+    def render(self, template: List[Any], values: Dict[str, Any]) -> str:
+        """Fill a template's restamp fields from `values`, generating fresh ones for the rest."""
+        return self._render(template, values)
+
+    def _render(self, template: List[Any], values: Dict[str, Any]) -> str:
+        return "".join(
+            part if isinstance(part, str)
+            else self.serialize(values[part[0]] if part[0] in values else RESTAMP_GENERATORS[part[0]]())
+            for part in template
+        )
+
+    def invalidate(self, name: Optional[str] = None) -> int:
+        """Drop every entry, or only one tool's entries; returns how many were dropped."""
+        if name is None:
+            dropped = len(self._entries)
+            self._entries.clear()
+            return dropped
+        prefix = json.dumps([name], separators=(",", ":"))[:-1] + ","
+        stale = [key for key in self._entries if key.startswith(prefix)]
+        for key in stale:
+            del self._entries[key]
+        return len(stale)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "size": len(self._entries),
+        }
+
+
+tool_result_cache = ToolResultCache()
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key onto one in-flight task.
+
+    The first caller for a key starts the work as its own task; callers arriving
+    before it finishes await that task instead of starting another. The task is
+    shielded, so a cancelled caller does not cancel the work for the others.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.coalesced_by_name: Dict[str, int] = {}
+
+    async def run(self, key: str, name: str, work: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Returns (result, shared): shared is True when this caller joined another's flight."""
+        task = self._in_flight.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+            self.coalesced_by_name[name] = self.coalesced_by_name.get(name, 0) + 1
+        else:
+            self.executed += 1
+            task = asyncio.ensure_future(work())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task), shared
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._in_flight),
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "coalesced_by_tool": dict(self.coalesced_by_name),
+        }
+
+
+tool_single_flight = SingleFlight()
+
+
+# --- Tool Worker Pool ---
+
+# Number of worker processes for "process"-class tools; unset or 0 runs them on the loop
+TOOL_WORKERS_ENV = "ORGAIR_TOOL_WORKERS"
+
+
+def _run_coroutine_sync(coroutine: Any) -> Any:
+    """Drive a coroutine that never suspends to completion without an event loop."""
+    try:
+        coroutine.send(None)
+    except StopIteration as done:
+        return done.value
+    coroutine.close()
+    raise RuntimeError("Process-class tool handlers must not await")
+
+
+def _run_tool_in_worker(name: str, arguments: Dict, snapshot: "ParameterSnapshot") -> Tuple[Dict, float, float]:
+    """Worker-process entry point: run one handler against the caller's parameter snapshot."""
+    started = time.time()
+    parameter_registry.snapshot = snapshot
+    result = _run_coroutine_sync(TOOL_REGISTRY[name].handler(arguments))
+    return result, started, time.time()
+
+
+def _latency_summary(samples: Sequence[float]) -> Dict[str, Optional[float]]:
+    if not samples:
+        return {"mean": None, "p50": None, "p99": None}
+    values = np.asarray(samples) * 1e3
+    return {"mean": float(values.mean()), "p50": float(np.percentile(values, 50)), "p99": float(np.percentile(values, 99))}
+
+
+class ToolWorkerPool:
+    """Bounded ProcessPoolExecutor for "process"-class tools, with queueing metrics.
+
+    Workers start through forkserver (spawn where unavailable) rather than fork, so a
+    worker never inherits a lock some other thread held at fork time; each worker
+    imports the module fresh, and the current ParameterSnapshot travels with each
+    call so hot reloads reach workers immediately. At most `max_pending` calls are
+    dispatched at once, further calls wait on the loop. `max_workers=0` runs handlers
+    inline on the loop instead.
+    """
+
+    def __init__(self, max_workers: int, max_pending: Optional[int] = None, sample_size: int = 1024):
+        self.max_workers = max_workers
+        self.max_pending = max_pending or 4 * max(1, max_workers)
+        self._slots = asyncio.Semaphore(self.max_pending)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.waiting = 0
+        self.dispatched = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_queue_depth = 0
+        self._wait_times: deque = deque(maxlen=sample_size)
+        self._run_times: deque = deque(maxlen=sample_size)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+        return self._executor
+
+    def queue_depth(self) -> int:
+        """Calls not yet running: waiting for a dispatch slot or queued inside the executor."""
+        return self.waiting + max(0, self.dispatched - self.max_workers)
+
+    async def run(self, name: str, arguments: Dict) -> Dict:
+        if self.max_workers <= 0:
+            return await TOOL_REGISTRY[name].handler(arguments)
+        submitted = time.time()
+        self.waiting += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth())
+        async with self._slots:
+            self.waiting -= 1
+            self.dispatched += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth())
+            try:
+                result, started, finished = await asyncio.get_running_loop().run_in_executor(
+                    self._pool(), _run_tool_in_worker, name, arguments, parameter_registry.snapshot
+                )
+            except Exception:
+                self.failed += 1
+                raise
+            finally:
+                self.dispatched -= 1
+        self.completed += 1
+        self._wait_times.append(max(0.0, started - submitted))
+        self._run_times.append(finished - started)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "running": min(self.dispatched, self.max_workers),
+            "queue_depth": self.queue_depth(),
+            "max_queue_depth": self.max_queue_depth,
+            "completed": self.completed,
+            "failed": self.failed,
+            "wait_ms": _latency_summary(self._wait_times),
+            "run_ms": _latency_summary(self._run_times),
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+tool_worker_pool = ToolWorkerPool(int(os.environ.get(TOOL_WORKERS_ENV) or 0))
+
+
+# The call_tool handler orchestrates execution of registered tools.
+@mcp_server.call_tool()
+async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
+    """Execute a tool and return results."""
+    logger.info("mcp_tool_called", tool=name, args=arguments)
+    try:
+        spec = TOOL_REGISTRY.get(name)
+        if spec is None:
+            result = {"error": f"Unknown tool: {name}"}
+            return [TextContent(type="text", text=response_serializer.dumps(result))]
+
+        arguments = arguments or {}
+        errors = spec.validate(arguments)
+        if errors:
+            logger.info("mcp_tool_invalid_arguments", tool=name, errors=errors)
+            result = {"error": f"Invalid arguments for tool {name}", "details": errors}
+            return [TextContent(type="text", text=response_serializer.dumps(result))]
+
+        cached = tool_result_cache.get(name, arguments)
+        if cached is not None:
+            return [TextContent(type="text", text=cached)]
+
+        async def execute() -> Tuple[List[Any], Dict[str, Any]]:
+            if spec.execution_class(arguments) == "process":
+                result = await tool_worker_pool.run(name, arguments)
+            else:
+                result = await spec.handler(arguments)
+            if spec.on_result is not None:
+                spec.on_result(arguments, result)
+            return tool_result_cache.store(name, arguments, result)
+
+        # Identical concurrent calls share one execution; joiners get freshly restamped copies
+        (template, originals), shared = await tool_single_flight.run(
+            tool_result_cache.make_key(name, arguments), name, execute
+        )
+        text = tool_result_cache.render(template, {} if shared else originals)
+        return [TextContent(type="text", text=text)]
+
+    except Exception as e:
+        logger.exception("mcp_tool_error", tool=name)
+        return [TextContent(type="text", text=response_serializer.dumps({"error": str(e)}))]
+
+
+# --- Benchmarks ---
+
+
+def benchmark_calculate_batch(
+    sizes: Sequence[int] = (10_000, 1_000_000),
+    scalar_sample: int = 10_000,
+    seed: int = 0,
+) -> List[Dict[str, float]]:
+    """Compare per-company cost of `calculate_batch` against the scalar `calculate` loop.
+
+    The scalar path is timed on at most `scalar_sample` rows and reported per company.
+    """
+    rng = np.random.default_rng(seed)
+    sectors = np.array(list(parameter_registry.snapshot.hr_baselines))
+    report = []
+    for n_rows in sizes:
+        dimension_scores = rng.uniform(0, 100, size=(n_rows, len(DIMENSION_NAMES)))
+        talent = rng.uniform(0, 1, size=n_rows)
+        hr_baseline = _hr_baselines_for(rng.choice(sectors, size=n_rows))
+
+        start = time.perf_counter()
+        org_air_calculator.calculate_batch(dimension_scores, talent, hr_baseline, 0.1)
+        batch_seconds = time.perf_counter() - start
+
+        sample = min(n_rows, scalar_sample)
+        rows = dimension_scores[:sample].tolist()
+        talent_list = talent[:sample].tolist()
+        baseline_list = hr_baseline[:sample].tolist()
+        start = time.perf_counter()
+        for i in range(sample):
+            org_air_calculator.calculate("BENCH", "bench", rows[i], talent_list[i], baseline_list[i], 0.1, 10)
+        scalar_seconds = time.perf_counter() - start
+
+        batch_us = batch_seconds / n_rows * 1e6
+        scalar_us = scalar_seconds / sample * 1e6
+        report.append({
+            "rows": n_rows,
+            "batch_total_ms": batch_seconds * 1e3,
+            "batch_us_per_company": batch_us,
+            "scalar_us_per_company": scalar_us,
+            "speedup": scalar_us / batch_us if batch_us else float("inf"),
+        })
+    return report
+
+
+def benchmark_argument_validation(n_calls: int = 10_000) -> List[Dict[str, Any]]:
+    """Per-call cost of each tool's compiled validator on a valid and an invalid payload."""
+    payloads = {
+        "calculate_org_air_score": {
+            "company_id": "ACME-001", "sector_id": "technology",
+            "dimension_scores": [70, 65, 75, 68, 72, 60, 70], "talent_concentration": 0.2,
+        },
+        "get_company_evidence": {"company_id": "ACME-001", "dimension": "talent", "limit": 5},
+        "project_ebitda_impact": {"company_id": "ACME-001", "entry_score": 55, "target_score": 75, "h_r_score": 80},
+        "analyze_whatif_scenario": {
+            "company_id": "ACME-001", "scenario_name": "s",
+            "dimension_changes": {"talent": 5, "culture": 3}, "investment_usd": 1e6,
+        },
+        "get_fund_portfolio": {"fund_id": "PE-FUND-001", "include_companies": True},
+    }
+    report = []
+    for name, payload in payloads.items():
+        validate = TOOL_REGISTRY[name].validate
+        invalid = {key: value for key, value in payload.items() if key != "company_id" and key != "fund_id"}
+        timings = {}
+        for label, arguments in (("valid", payload), ("invalid", invalid)):
+            start = time.perf_counter()
+            for _ in range(n_calls):
+                validate(arguments)
+            timings[label] = (time.perf_counter() - start) / n_calls * 1e6
+        report.append({
+            "tool": name,
+            "valid_us": timings["valid"],
+            "invalid_us": timings["invalid"],
+            "within_budget": all(timings[label] <= VALIDATION_BUDGET_US[label] for label in timings),
+        })
+    return report
+
+
+def benchmark_serialization(n_calls: int = 2_000) -> List[Dict[str, Any]]:
+    """Bytes and microseconds per response: legacy `json.dumps(indent=2, default=str)` vs COMPACT_JSON."""
+    payloads = {
+        "get_company_evidence": asyncio.run(_handle_get_evidence({"company_id": "ACME-001", "limit": 10})),
+        "get_fund_portfolio": asyncio.run(_handle_fund_portfolio({"fund_id": "PE-FUND-001"})),
+    }
+    report = []
+    for name, payload in payloads.items():
+        encoders = {
+            "legacy": lambda obj: json.dumps(obj, indent=2, default=str),
+            "compact": COMPACT_JSON.dumps,
+        }
+        row: Dict[str, Any] = {"payload": name}
+        for label, encode in encoders.items():
+            start = time.perf_counter()
+            for _ in range(n_calls):
+                text = encode(payload)
+            row[f"{label}_us"] = (time.perf_counter() - start) / n_calls * 1e6
+            row[f"{label}_bytes"] = len(text.encode())
+        row["bytes_saved"] = row["legacy_bytes"] - row["compact_bytes"]
+        row["us_saved"] = row["legacy_us"] - row["compact_us"]
+        report.append(row)
+    return report
+
+
+def benchmark_ebitda_projection(n_calls: int = 2_000, grid_size: int = 100) -> List[Dict[str, Any]]:
+    """Per-projection cost of the Decimal audit path vs the float path, scalar and vectorized."""
+    entry, target = np.meshgrid(np.linspace(20, 80, grid_size), np.linspace(30, 95, grid_size))
+    report = []
+    start = time.perf_counter()
+    for _ in range(n_calls):
+        _project_ebitda_decimal(55.0, 80.0, 72.0)
+    report.append({"path": "decimal_scalar", "us_per_projection": (time.perf_counter() - start) / n_calls * 1e6})
+    start = time.perf_counter()
+    for _ in range(n_calls):
+        _project_ebitda_float(55.0, 80.0, 72.0)
+    report.append({"path": "float_scalar", "us_per_projection": (time.perf_counter() - start) / n_calls * 1e6})
+    start = time.perf_counter()
+    projection = project_ebitda_impact_batch(entry, target, 72.0)
+    report.append({"path": "float_batch", "us_per_projection": (time.perf_counter() - start) / entry.size * 1e6})
+    worst = max(
+        abs(float(_project_ebitda_decimal(e, t, 72.0)["base"]) - float(b))
+        for e, t, b in zip(entry.ravel()[::97], target.ravel()[::97], projection["base"].ravel()[::97])
+    )
+    for row in report:
+        row["max_abs_diff_vs_decimal"] = worst
+    return report
+
+
+def benchmark_whatif_simulation(sample_counts: Sequence[int] = (10_000, 100_000, 1_000_000)) -> List[Dict[str, Any]]:
+    """Wall time of Monte Carlo what-if runs at increasing sample counts."""
+    changes = _resolve_dimension_changes({"data_infra": 5, "talent": 10})
+    baseline = np.full(len(DIMENSION_NAMES), WHATIF_DEFAULT_BASELINE)
+    report = []
+    for samples in sample_counts:
+        result = simulate_whatif(changes, baseline, 82.5, 0.2, 1_000_000.0, samples, seed=0, latency_budget_s=10.0)
+        report.append({
+            "samples": samples,
+            "elapsed_ms": result["elapsed_ms"],
+            "p50_org_air_change": result["org_air_change"]["p50"],
+        })
+    return report
+
+
+def benchmark_evidence_shards(
+    n_companies: int = 200,
+    docs_per_company: int = 50,
+    n_queries: int = 50,
+    seed: int = 0,
+) -> List[Dict[str, float]]:
+    """Company-filtered retrieval from lazily loaded shards versus building the full-corpus index.
+
+    The corpus recombines the mock evidence texts across synthetic companies.
+    """
+    rng = np.random.default_rng(seed)
+    items = [
+        {
+            **template,
+            "doc_id": f"CO-{company}-{doc}",
+            "score": float(rng.uniform(0.5, 1.0)),
+            "metadata": {**template["metadata"], "company_id": f"CO-{company}"},
+        }
+        for company in range(n_companies)
+        for doc, template in enumerate(rng.choice(MOCK_EVIDENCE_POOL, docs_per_company).tolist())
+    ]
+    store = EvidenceStore.from_items(items)
+    # Deduplicated so every cold sample really loads its shard rather than hitting one a repeat draw already loaded
+    companies = list(dict.fromkeys(f"CO-{i}" for i in rng.integers(0, n_companies, n_queries).tolist()))
+
+    started = time.perf_counter()
+    MockHybridRetriever(store=store).segments[0].shard(None)
+    full_build_ms = (time.perf_counter() - started) * 1e3
+
+    retriever = MockHybridRetriever(store=store)
+
+    cold_ms, warm_ms = [], []
+    for company_id in companies:
+        for latencies in (cold_ms, warm_ms):
+            started = time.perf_counter()
+            asyncio.run(retriever.retrieve("cloud data infrastructure", 10, {"company_id": company_id}))
+            latencies.append((time.perf_counter() - started) * 1e3)
+    stats = retriever.shard_stats()
+    shards = list(stats["shards"].values())
+    return [{
+        "documents": len(store),
+        "full_index_build_ms": full_build_ms,
+        "shards_loaded": stats["loaded"],
+        "shard_load_p50_ms": float(np.percentile([shard["load_ms"] for shard in shards], 50)),
+        "shard_memory_bytes_mean": float(np.mean([shard["memory_bytes"] for shard in shards])),
+        "first_query_p50_ms": float(np.percentile(cold_ms, 50)),
+        "repeat_query_p50_ms": float(np.percentile(warm_ms, 50)),
+    }]
+
+
+def benchmark_evidence_ingestion(
+    n_batches: int = 200,
+    batch_size: int = 25,
+    n_companies: int = 20,
+    n_queries: int = 50,
+    seed: int = 0,
+) -> List[Dict[str, float]]:
+    """Streaming ingestion throughput and company-query latency with and without segment merging."""
+    rng = np.random.default_rng(seed)
+    batches = [
+        [
+            {
+                **template,
+                "doc_id": f"ING-{batch}-{i}",
+                "content": f"{template['content']} (update {batch}-{i})",
+                "metadata": {**template["metadata"], "company_id": f"CO-{int(rng.integers(n_companies))}"},
+            }
+            for i, template in enumerate(rng.choice(MOCK_EVIDENCE_POOL, batch_size).tolist())
+        ]
+        for batch in range(n_batches)
+    ]
+    report = []
+    for label, max_segments in (("no_merge", n_batches + 1), ("tiered_merge", 8)):
+        retriever = MockHybridRetriever()
+        ingestor = EvidenceIngestor(retriever, segment_size=batch_size, max_segments=max_segments)
+        started = time.perf_counter()
+        for batch in batches:
+            ingestor.ingest(batch)
+        ingest_seconds = time.perf_counter() - started
+        ingestor.wait_for_merges()
+
+        latencies = []
+        for company in rng.integers(0, n_companies, n_queries).tolist():
+            started = time.perf_counter()
+            asyncio.run(retriever.retrieve("cloud data platform", 10, {"company_id": f"CO-{company}"}))
+            latencies.append((time.perf_counter() - started) * 1e3)
+        report.append({
+            "policy": label,
+            "documents": len(retriever),
+            "docs_per_s": n_batches * batch_size / ingest_seconds,
+            "segments": len(retriever.segments),
+            "merges": ingestor.totals["merges"],
+            "query_p50_ms": float(np.percentile(latencies, 50)),
+            "query_p99_ms": float(np.percentile(latencies, 99)),
+        })
+    return report
+
+
+def benchmark_near_duplicates(
+    n_companies: int = 50,
+    facts_per_company: int = 20,
+    copies_per_fact: int = 4,
+    n_queries: int = 200,
+    k: int = 10,
+    seed: int = 0,
+) -> List[Dict[str, float]]:
+    """MinHash throughput at index time and the query latency added by near-duplicate collapse.
+
+    Each synthetic fact is reposted several times with a different source line, the way
+    an earnings call, a press release and a job ad repeat the same statement.
+    """
+    rng = np.random.default_rng(seed)
+    sources = ["Earnings Call Transcript", "Press Release", "Job Posting", "Analyst Note", "Investor Deck"]
+    items = []
+    for company in range(n_companies):
+        for fact, template in enumerate(rng.choice(MOCK_EVIDENCE_POOL, facts_per_company).tolist()):
+            for copy in range(copies_per_fact):
+                items.append({
+                    **template,
+                    "doc_id": f"CO-{company}-{fact}-{copy}",
+                    "content": f"{sources[copy % len(sources)]}: {template['content']} Fact {fact}.",
+                    "metadata": {**template["metadata"], "company_id": f"CO-{company}", "source": sources[copy % len(sources)]},
+                })
+    minhasher = MinHasher()
+    started = time.perf_counter()
+    minhasher.signatures([item["content"] for item in items])
+    signatures_per_s = len(items) / (time.perf_counter() - started)
+
+    retriever = MockHybridRetriever(store=EvidenceStore.from_items(items), minhasher=minhasher)
+    companies = [f"CO-{i}" for i in rng.integers(0, n_companies, n_queries).tolist()]
+    for company_id in set(companies):
+        retriever.segments[0].shard(company_id)
+
+    latencies: Dict[bool, List[float]] = {False: [], True: []}
+    distinct: Dict[bool, List[float]] = {False: [], True: []}
+    for company_id in companies:
+        for diversify in (False, True):
+            started = time.perf_counter()
+            results = asyncio.run(retriever.retrieve("cloud data ai team", k, {"company_id": company_id}, diversify=diversify))
+            latencies[diversify].append((time.perf_counter() - started) * 1e3)
+            distinct[diversify].append(len({r["doc_id"].rsplit("-", 1)[0] for r in results}) / max(1, len(results)))
+    return [{
+        "documents": len(items),
+        "signatures_per_s": signatures_per_s,
+        "query_p50_ms": float(np.percentile(latencies[False], 50)),
+        "diversified_query_p50_ms": float(np.percentile(latencies[True], 50)),
+        "added_p50_ms": float(np.percentile(latencies[True], 50) - np.percentile(latencies[False], 50)),
+        "distinct_fact_share": float(np.mean(distinct[False])),
+        "diversified_distinct_fact_share": float(np.mean(distinct[True])),
+    }]
+
+
+# Query phrase per dimension for the re-rank evaluation set
+RERANK_EVAL_PHRASES = {
+    "data_infrastructure": "data infrastructure",
+    "ai_governance": "ai governance",
+    "technology_stack": "technology stack",
+    "talent": "talent",
+    "leadership": "leadership",
+    "use_case_portfolio": "use case portfolio",
+    "culture": "culture",
+}
+
+
+def rerank_eval_set(n_companies: int = 10) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Fixed (corpus, queries) pair for judging re-rankers.
+
+    For every company and dimension, two filings discuss the dimension once and are the
+    relevant answers; two job ads from other dimensions repeat the query phrase and are
+    what a term-frequency first stage is drawn to.
+    """
+    dimensions = list(RERANK_EVAL_PHRASES)
+    items, queries = [], []
+    for company in range(n_companies):
+        company_id = f"EVAL-{company:02d}"
+        for d, (dimension, phrase) in enumerate(RERANK_EVAL_PHRASES.items()):
+            relevant = []
+            for i, source in enumerate(["Annual Report (10-K)", "Q3 Earnings Call Transcript"]):
+                doc_id = f"{company_id}-{dimension}-filing-{i}"
+                relevant.append(doc_id)
+                items.append({
+                    "doc_id": doc_id,
+                    "content": f"Management reported measurable progress on {phrase} this year, with board oversight and budget {company * 7 + d + i}.",
+                    "score": 0.8,
+                    "retrieval_method": "semantic",
+                    "metadata": {"company_id": company_id, "dimension": dimension, "source": source},
+                })
+            for i in range(2):
+                items.append({
+                    "doc_id": f"{company_id}-{dimension}-ad-{i}",
+                    "content": f"Hiring: {phrase} specialist. {phrase} experience required; join our {phrase} team (req {i}).",
+                    "score": 0.8,
+                    "retrieval_method": "keyword",
+                    "metadata": {"company_id": company_id, "dimension": dimensions[(d + 1 + i) % len(dimensions)], "source": "Company Careers Page"},
+                })
+            queries.append({"company_id": company_id, "query": phrase, "relevant": relevant})
+    return items, queries
+
+
+def ndcg_at_k(ranked: Sequence[str], relevant: Sequence[str], k: int) -> float:
+    relevant = set(relevant)
+    gain = sum(1 / math.log2(rank + 2) for rank, doc_id in enumerate(ranked[:k]) if doc_id in relevant)
+    ideal = sum(1 / math.log2(rank + 2) for rank in range(min(k, len(relevant))))
+    return gain / ideal if ideal else 0.0
+
+
+def evaluate_retrieval(
+    retriever: "MockHybridRetriever", queries: Sequence[Dict[str, Any]], k: int = 5, rerank: bool = False
+) -> Dict[str, float]:
+    """nDCG@k, MRR and per-query latency of a retriever over an evaluation set."""
+    ndcg, reciprocal_ranks, latencies = [], [], []
+    for case in queries:
+        started = time.perf_counter()
+        results = asyncio.run(retriever.retrieve(case["query"], k, {"company_id": case["company_id"]}, rerank=rerank))
+        latencies.append((time.perf_counter() - started) * 1e3)
+        ranked = [r["doc_id"] for r in results]
+        ndcg.append(ndcg_at_k(ranked, case["relevant"], k))
+        first = next((rank for rank, doc_id in enumerate(ranked, start=1) if doc_id in case["relevant"]), None)
+        reciprocal_ranks.append(1 / first if first else 0.0)
+    return {
+        f"ndcg_at_{k}": float(np.mean(ndcg)),
+        "mrr": float(np.mean(reciprocal_ranks)),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
 
-# # Mock Services Definitions (as defined in previous cells and needed for tool handlers)
-
-# class MockOrgAIRCalculator:
-#     def calculate(
-#         self,
-#         company_id: str,
-#         sector_id: str,
-#         dimension_scores: List[float],
-#         talent_concentration: float,
-#         hr_baseline: float,
-#         position_factor: float,
-#         evidence_count: int,
-#     ) -> Dict[str, Any]:
-
-#         avg_dimension_score = sum(dimension_scores) / len(dimension_scores) if dimension_scores else 0.0
-#         vr_score = avg_dimension_score * (1 - talent_concentration / 2)
-#         hr_score = hr_baseline * (1 + position_factor)
-#         synergy_score = (vr_score * hr_score) / 100 * 0.5
-#         final_score = (vr_score + hr_score + synergy_score) / 2.5
-#         final_score = min(100.0, max(0.0, final_score))
-#         ci_lower = max(0.0, final_score - (5 + (1-talent_concentration)*5))
-#         ci_upper = min(100.0, final_score + (5 + talent_concentration*5))
-#         sem = (ci_upper - ci_lower) / 3.92
-
-#         return {
-#             "score_id": str(uuid.uuid4()),
-#             "company_id": company_id,
-#             "final_score": float(final_score),
-#             "components": {
-#                 "v_r_score": float(vr_score),
-#                 "h_r_score": float(hr_score),
-#                 "synergy_score": float(synergy_score),
-#             },
-#             "confidence_interval": {
-#                 "lower": float(ci_lower),
-#                 "upper": float(ci_upper),
-#                 "sem": float(sem),
-#             },
-#             "audit_trail": {
-#                 "weighted_mean": float(avg_dimension_score),
-#                 "cv": float(talent_concentration * 10),
-#                 "talent_risk_adj": float(talent_concentration * 15),
-#             },
-#             "timestamp": datetime.now(timezone.utc), # Use timezone.utc for consistency
-#             "parameter_version": "v2.0",
-#         }
-
-# class MockHybridRetriever:
-#     async def retrieve(self, query: str, k: int, filter_metadata: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
-#         mock_evidence_pool = [
-#             {"doc_id": "doc_1", "content": "Company X has invested heavily in cloud infrastructure, with specific mention of AWS Lambda and Azure Functions for scalable AI model deployment. Their data lake utilizes Snowflake.", "score": 0.95, "retrieval_method": "semantic", "metadata": {"company_id": "ACME-001", "dimension": "data_infrastructure", "source": "Q3 2023 Earnings Call Transcript"}},
-#             {"doc_id": "doc_2", "content": "Recent job postings for 'AI Governance Lead' and 'Ethical AI Specialist' indicate a strong focus on responsible AI practices. They've also published an internal AI ethics guideline.", "score": 0.92, "retrieval_method": "keyword", "metadata": {"company_id": "ACME-001", "dimension": "ai_governance", "source": "Company Careers Page"}},
-#             {"doc_id": "doc_3", "content": "Competitor Y recently launched an AI-powered customer service bot, reducing call center volume by 30%. Their technology stack appears to be largely open-source, including TensorFlow and PyTorch.", "score": 0.88, "retrieval_method": "semantic", "metadata": {"company_id": "GLOBAL-INC", "dimension": "tech_stack", "source": "Industry Report 2024"}},
-#             {"doc_id": "doc_4", "content": "Internal HR data shows a 15% increase in AI/ML certifications among the engineering team over the last year. They run an internal AI academy.", "score": 0.91, "retrieval_method": "semantic", "metadata": {"company_id": "ACME-001", "dimension": "talent", "source": "Internal HR Report"}},
-#             {"doc_id": "doc_5", "content": "The CEO's recent keynote emphasized 'AI-first' strategy and substantial investment in R&D, forming a dedicated AI steering committee.", "score": 0.93, "retrieval_method": "semantic", "metadata": {"company_id": "ACME-001", "dimension": "leadership", "source": "CEO Keynote Transcript"}},
-#             {"doc_id": "doc_6", "content": "They are actively piloting AI solutions for predictive maintenance and supply chain optimization, with early success reported in cost reduction.", "score": 0.90, "retrieval_method": "keyword", "metadata": {"company_id": "ACME-001", "dimension": "use_case_portfolio", "source": "Pilot Project Update"}},
-#             {"doc_id": "doc_7", "content": "An internal survey indicates high employee engagement with AI initiatives and a strong willingness to adapt to new AI tools.", "score": 0.89, "retrieval_method": "semantic", "metadata": {"company_id": "ACME-001", "dimension": "culture", "source": "Employee Engagement Survey"}},
-#         ]
-
-#         filtered_results = []
-#         company_id_filter = filter_metadata.get("company_id") if filter_metadata else None
-
-#         for item in mock_evidence_pool:
-#             if company_id_filter and item["metadata"]["company_id"] != company_id_filter:
-#                 continue
-#             query_lower = query.lower()
-#             dimension_lower = item["metadata"]["dimension"].lower()
-
-#             # Simplified matching for testing: check if query is general, matches dimension exactly, or contains dimension
-#             if "ai readiness" in query_lower or "evidence" in query_lower or query_lower == dimension_lower:
-#                  filtered_results.append(item)
-#             elif dimension_lower in query_lower:
-#                 filtered_results.append(item)
-
-#         return sorted(filtered_results, key=lambda x: x['score'], reverse=True)[:k]
-
-
-# org_air_calculator = MockOrgAIRCalculator()
-# hybrid_retriever = MockHybridRetriever()
-
-# # --- Tool Definitions ---
-
-# # Sector baselines for H^R, as per OCR input
-# sector_baselines = {
-#     "technology": 85,
-#     "healthcare": 78,
-#     "financial_services": 82,
-#     "manufacturing": 72,
-#     "retail": 75,
-#     "energy": 68,
-# }
 
-# # _handle_ functions (implementing tool logic)
-
-# async def _handle_calculate_score(args: Dict) -> Dict:
-#     """Handle score calculation."""
-#     company_id = args["company_id"]
-#     sector_id = args["sector_id"]
-#     dimension_scores = args["dimension_scores"]
-#     talent_concentration = args.get("talent_concentration", 0.2)
-
-#     # Get HR baseline from our hardcoded sector_baselines
-#     hr_baseline = sector_baselines.get(sector_id, 75)  # Default to 75 if sector not found
-
-#     # Mock parameters for the calculator
-#     position_factor = 0.1
-#     evidence_count = args.get("evidence_count", 10)
-
-#     result = org_air_calculator.calculate(
-#         company_id=company_id,
-#         sector_id=sector_id,
-#         dimension_scores=dimension_scores,
-#         talent_concentration=talent_concentration,
-#         hr_baseline=hr_baseline,
-#         position_factor=position_factor,
-#         evidence_count=evidence_count,
-#     )
-
-#     # Format the timestamp for JSON serialization
-#     result["timestamp"] = result["timestamp"].isoformat()
-
-#     return {
-#         "score_id": result["score_id"],
-#         "company_id": result["company_id"],
-#         "final_score": float(result["final_score"]),
-#         "components": {
-#             "v_r_score": float(result["components"]["v_r_score"]),
-#             "h_r_score": float(result["components"]["h_r_score"]),
-#             "synergy_score": float(result["components"]["synergy_score"]),
-#         },
-#         "confidence_interval": {
-#             "lower": float(result["confidence_interval"]["lower"]),
-#             "upper": float(result["confidence_interval"]["upper"]),
-#             "sem": float(result["confidence_interval"]["sem"]),
-#         },
-#         "audit_trail": {
-#             "weighted_mean": float(result["audit_trail"]["weighted_mean"]),
-#             "cv": float(result["audit_trail"]["cv"]),
-#             "talent_risk_adj": float(result["audit_trail"]["talent_risk_adj"]),
-#         },
-#         "timestamp": result["timestamp"],
-#         "parameter_version": result["parameter_version"],
-#     }
-
-
-# async def _handle_get_evidence(args: Dict) -> Dict:
-#     """Handle evidence retrieval."""
-#     company_id = args["company_id"]
-#     dimension = args.get("dimension", "all")
-#     query = args.get("query", f"AI readiness {dimension}")
-#     limit = args.get("limit", 10)
-
-#     results = await hybrid_retriever.retrieve(
-#         query=query,
-#         k=limit,
-#         filter_metadata={"company_id": company_id} if company_id else None,
-#     )
-
-#     # Truncate content for brevity in output
-#     for r in results:
-#         r['content'] = r['content'][:500] + "..." if len(r['content']) > 500 else r['content']
-
-#     return {
-#         "company_id": company_id,
-#         "dimension": dimension,
-#         "evidence_count": len(results),
-#         "evidence_items": results,
-#     }
-
-
-# async def _handle_ebitda_projection(args: Dict) -> Dict:
-#     """Handle EBITDA projection with v2.0 parameters."""
-#     from decimal import Decimal
-
-#     company_id = args["company_id"]
-#     entry_score = Decimal(str(args["entry_score"]))
-#     target_score = Decimal(str(args["target_score"]))
-#     h_r_score = Decimal(str(args["h_r_score"]))
-#     holding_period_years = Decimal(str(args.get("holding_period_years", 5)))
-
-#     delta_air = target_score - entry_score
-
-#     # v2.0 conservative parameters (as per OCR)
-#     gamma_0 = Decimal("0.0025")  # 0.25%
-#     gamma_1 = Decimal("0.05")
-#     gamma_2 = Decimal("0.025")
-#     gamma_3 = Decimal("0.01")    # 1.0%
-#     threshold = Decimal("25")    # Delta_AIR threshold for gamma_3 activation
-
-#     # Base calculation formula
-#     # This formula represents a simplified attribution model where EBITDA impact is a
-#     # function of the change in Org-AI-R score (delta_air) and systematic opportunity (h_r_score).
-#     # The gamma parameters are coefficients that weigh these factors.
-#     # $ base_impact = \gamma_0 + \gamma_1 \cdot \Delta_{{AIR}} + \gamma_2 \cdot \Delta_{{AIR}} \cdot \frac{{H_R}}{{100}} + (\gamma_3 \text{{ if }} \Delta_{{AIR}} > \text{{threshold else }} 0) $
-#     base_impact = (
-#         gamma_0 +
-#         gamma_1 * delta_air +
-#         gamma_2 * delta_air * h_r_score / Decimal("100") +
-#         (gamma_3 if delta_air > threshold else Decimal("0"))
-#     )
-
-#     return {
-#         "company_id": company_id,
-#         "entry_score": float(entry_score),
-#         "target_score": float(target_score),
-#         "delta_air": float(delta_air),
-#         "holding_period_years": float(holding_period_years),
-#         "scenarios": {
-#             "conservative": {
-#                 "ebitda_impact_pct": float(base_impact * Decimal("0.7")),  # 30% haircut
-#                 "description": "30% haircut on base case, accounting for higher risk",
-#             },
-#             "base": {
-#                 "ebitda_impact_pct": float(base_impact),
-#                 "description": "Expected outcome based on v2.0 parameters",
-#             },
-#             "optimistic": {
-#                 "ebitda_impact_pct": float(base_impact * Decimal("1.3")),  # 30% uplift
-#                 "description": "30% uplift on base case, assuming optimal conditions",
-#             },
-#         },
-#         "parameter_version": "v2.0",
-#         "disclaimer": "Projections are estimates. Actual results may vary.",
-#     }
-
-
-# async def _handle_whatif(args: Dict) -> Dict:
-#     """Handle what-if scenario analysis."""
-#     company_id = args["company_id"]
-#     scenario_name = args["scenario_name"]
-#     dimension_changes = args["dimension_changes"]
-#     investment_usd = args.get("investment_usd", 0)  # Optional investment amount
-
-#     # Simplified logic for Org-AI-R change based on sum of dimension changes
-#     org_air_change = sum(dimension_changes.values()) * 0.14  # As per OCR
-
-#     # Simplified projected financial impact
-#     # $ projected_impact = org_air_change \times \text{{investment_usd}} \times 0.05 $
-#     projected_impact = org_air_change * investment_usd * 0.05
-
-#     # A simple linear relationship for demo
-#     return {
-#         "company_id": company_id,
-#         "scenario_name": scenario_name,
-#         "dimension_changes": dimension_changes,
-#         "org_air_change": float(org_air_change),
-#         "projected_impact_usd": float(projected_impact),
-#         "confidence": "medium",
-#         "recommendation": "Further analysis recommended to validate projected impact and associated risks.",
-#     }
-
-
-# async def _handle_fund_portfolio(args: Dict) -> Dict:
-#     """Handle fund portfolio request."""
-#     fund_id = args["fund_id"]
-#     # Mock data for fund portfolio, as per OCR
-#     return {
-#         "fund_id": fund_id,
-#         "fund_air_score": 68.5,
-#         "company_count": 12,
-#         "metrics": {
-#             "avg_org_air": 67.3,
-#             "min_org_air": 45.2,
-#             "max_org_air": 82.1,
-#             "concentration_risk": "medium",
-#         },
-#         "as_of": datetime.now(timezone.utc).isoformat(),
-#     }
-
-
-# # Register all tools with the MCP server
-# @mcp_server.list_tools()
-# async def list_tools() -> List[Tool]:
-#     """List all available tools."""
-#     return [
-#         Tool(
-#             name="calculate_org_air_score",
-#             description="""Calculate the Org-AI-R (Organizational AI-Readiness) score for a company.\nReturns a comprehensive assessment including:\n- Final Org-AI-R score (0-100)\n- V^R (Idiosyncratic Readiness) component\n- H^R (Systematic Opportunity) component\n- Synergy score\n- SEM-based confidence interval\n- Calculation audit trail""",
-#             inputSchema={
-#                 "type": "object",
-#                 "properties": {
-#                     "company_id": {"type": "string", "description": "Unique company identifier"},
-#                     "sector_id": {
-#                         "type": "string",
-#                         "description": "Industry sector (e.g., 'technology', 'healthcare')",
-#                         "enum": ["technology", "healthcare", "financial_services", "manufacturing", "retail", "energy"],
-#                     },
-#                     "dimension_scores": {
-#                         "type": "array",
-#                         "items": {"type": "number", "minimum": 0, "maximum": 100},
-#                         "minItems": 7,
-#                         "maxItems": 7,
-#                         "description": "Seven dimension scores: [data_infra, governance, tech_stack, talent, leadership, use_cases, culture]",
-#                     },
-#                     "talent_concentration": {
-#                         "type": "number",
-#                         "minimum": 0,
-#                         "maximum": 1,
-#                         "description": "Talent concentration ratio (0-1)",
-#                     },
-#                 },
-#                 "required": ["company_id", "sector_id", "dimension_scores"],
-#             },
-#         ),
-#         Tool(
-#             name="get_company_evidence",
-#             description="""Retrieve AI-readiness evidence for a company.\nSearches SEC filings, job postings, and other sources for evidence\nsupporting dimension assessments. Returns ranked evidence items with\nconfidence scores and source citations.""",
-#             inputSchema={
-#                 "type": "object",
-#                 "properties": {
-#                     "company_id": {"type": "string", "description": "Company identifier"},
-#                     "dimension": {
-#                         "type": "string",
-#                         "description": "Specific dimension to search (e.g., 'data_infrastructure')",
-#                         "enum": ["data_infrastructure", "ai_governance", "technology_stack", "talent", "leadership", "use_case_portfolio", "culture", "all"],
-#                     },
-#                     "query": {"type": "string", "description": "Optional search query to refine results"},
-#                     "limit": {"type": "integer", "minimum": 1, "maximum": 50, "default": 10},
-#                 },
-#                 "required": ["company_id"],
-#             },
-#         ),
-#         Tool(
-#             name="project_ebitda_impact",
-#             description="""Project EBITDA impact from AI-readiness improvements.\nUses the v2.0 conservative EBITDA attribution model to project\nfinancial impact across three scenarios (Conservative, Base, Optimistic).\nIncludes risk adjustments and confidence bounds.""",
-#             inputSchema={
-#                 "type": "object",
-#                 "properties": {
-#                     "company_id": {"type": "string", "description": "Unique company identifier"},
-#                     "entry_score": {"type": "number", "minimum": 0, "maximum": 100, "description": "Current Org-AI-R score"},
-#                     "target_score": {"type": "number", "minimum": 0, "maximum": 100, "description": "Target Org-AI-R score after improvements"},
-#                     "holding_period_years": {"type": "integer", "minimum": 1, "maximum": 10, "default": 5, "description": "Number of years in the holding period for projection"},
-#                     "h_r_score": {"type": "number", "minimum": 0, "maximum": 100, "description": "Systematic opportunity score (H^R component)"},
-#                 },
-#                 "required": ["company_id", "entry_score", "target_score", "h_r_score"],
-#             },
-#         ),
-#         Tool(
-#             name="analyze_whatif_scenario",
-#             description="""Analyze what-if scenarios for AI investment decisions.\nModel the impact of specific AI initiatives on Org-AI-R score\nand downstream financial metrics.""",
-#             inputSchema={
-#                 "type": "object",
-#                 "properties": {
-#                     "company_id": {"type": "string", "description": "Unique company identifier"},
-#                     "scenario_name": {"type": "string", "description": "Name for the what-if scenario"},
-#                     "dimension_changes": {
-#                         "type": "object",
-#                         "description": "Map of dimension name to expected score change (e.g., {'data_infra': 5, 'talent': 10})",
-#                         "additionalProperties": {"type": "number"},
-#                     },
-#                     "investment_usd": {"type": "number", "minimum": 0, "description": "Planned investment amount in USD"},
-#                 },
-#                 "required": ["company_id", "scenario_name", "dimension_changes"],
-#             },
-#         ),
-#         Tool(
-#             name="get_fund_portfolio",
-#             description="""Get portfolio summary for a fund.\nReturns Fund-AI-R score, company breakdown, concentration metrics,\nand portfolio-level insights.""",
-#             inputSchema={
-#                 "type": "object",
-#                 "properties": {
-#                     "fund_id": {"type": "string", "description": "Unique fund identifier"},
-#                     "include_companies": {"type": "boolean", "default": True, "description": "Include detailed company list in the output"},
-#                     "include_trends": {"type": "boolean", "default": False, "description": "Include historical trends in the output"},
-#                 },
-#                 "required": ["fund_id"],
-#             },
-#         ),
-#     ]
-
-
-# # The call_tool handler orchestrates execution of registered tools.
-# @mcp_server.call_tool()
-# async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
-#     """Execute a tool and return results."""
-#     logger.info("mcp_tool_called", tool=name, args=arguments)
-#     try:
-#         result = {}
-#         if name == "calculate_org_air_score":
-#             result = await _handle_calculate_score(arguments)
-#         elif name == "get_company_evidence":
-#             result = await _handle_get_evidence(arguments)
-#         elif name == "project_ebitda_impact":
-#             result = await _handle_ebitda_projection(arguments)
-#         elif name == "analyze_whatif_scenario":
-#             result = await _handle_whatif(arguments)
-#         elif name == "get_fund_portfolio":
-#             result = await _handle_fund_portfolio(arguments)
-#         else:
-#             result = {"error": f"Unknown tool: {name}"}
-
-#         return [TextContent(type="text", text=json.dumps(result, indent=2, default=str))]
-
-#     except Exception as e:
-#         logger.exception("mcp_tool_error", tool=name)
-#         return [TextContent(type="text", text=json.dumps({"error": str(e)}, indent=2))]
+def benchmark_reranker(budgets_ms: Sequence[float] = (5.0, 0.0), k: int = 5, top_n: int = 20) -> List[Dict[str, Any]]:
+    """Re-rank quality lift and latency cost on `rerank_eval_set`; a zero budget shows the fallback."""
+    items, queries = rerank_eval_set()
+    store = EvidenceStore.from_items(items)
+    baseline_retriever = MockHybridRetriever(store=store)
+    evaluate_retrieval(baseline_retriever, queries, k)  # load shards outside the timings
+    baseline = evaluate_retrieval(baseline_retriever, queries, k)
+    report = [{"stage": "first_stage", **baseline}]
+    for budget_ms in budgets_ms:
+        retriever = MockHybridRetriever(store=store)
+        evaluate_retrieval(retriever, queries, k)
+        stage = retriever.rerank_stage = RerankStage(top_n=top_n, budget_ms=budget_ms)
+        quality = evaluate_retrieval(retriever, queries, k, rerank=True)
+        stats = stage.stats()
+        report.append({
+            "stage": f"rerank_budget_{budget_ms:g}ms",
+            **quality,
+            "ndcg_lift": quality[f"ndcg_at_{k}"] - baseline[f"ndcg_at_{k}"],
+            "rerank_p50_ms": stats["run_ms"]["p50"],
+            "added_p50_ms": quality["p50_ms"] - baseline["p50_ms"],
+            "over_budget_share": stats["over_budget"] / max(1, stats["queries"]),
+        })
+    return report
 
 
+def benchmark_vector_index(
+    sizes: Sequence[int] = (100_000, 1_000_000),
+    dim: int = 64,
+    k: int = 10,
+    n_queries: int = 200,
+    nprobe: int = 8,
+    seed: int = 0,
+) -> List[Dict[str, float]]:
+    """Recall@k and latency of IVFVectorIndex against exact brute-force cosine search.
+
+    Uses a synthetic clustered corpus (embedding millions of texts would dominate the run);
+    queries are noisy copies of stored vectors.
+    """
+    rng = np.random.default_rng(seed)
+    report = []
+    for n_rows in sizes:
+        centers = _normalize_rows(rng.standard_normal((max(1, n_rows // 500), dim)))
+        noise = rng.standard_normal((n_rows, dim)).astype(np.float32)
+        vectors = centers[rng.integers(0, len(centers), n_rows)] + (0.35 / math.sqrt(dim)) * noise
+        companies = [f"CO-{i}" for i in rng.integers(0, 1000, n_rows).tolist()]
+        query_noise = rng.standard_normal((n_queries, dim)).astype(np.float32)
+        queries = vectors[rng.integers(0, n_rows, n_queries)] + (0.1 / math.sqrt(dim)) * query_noise
+
+        exact = BruteForceVectorIndex(dim)
+        exact.add(vectors, companies)
+        start = time.perf_counter()
+        ivf = IVFVectorIndex(dim, nprobe=nprobe, train_threshold=n_rows, seed=seed)
+        ivf.add(vectors, companies)
+        build_seconds = time.perf_counter() - start
+
+        exact_ms, ivf_ms, recalls = [], [], []
+        for query in queries:
+            start = time.perf_counter()
+            truth = {row for _, row in exact.search(query, k)}
+            exact_ms.append((time.perf_counter() - start) * 1e3)
+            start = time.perf_counter()
+            found = {row for _, row in ivf.search(query, k)}
+            ivf_ms.append((time.perf_counter() - start) * 1e3)
+            recalls.append(len(truth & found) / k)
+
+        report.append({
+            "vectors": n_rows,
+            "ivf_build_s": build_seconds,
+            "recall_at_k": float(np.mean(recalls)),
+            "brute_force_p50_ms": float(np.percentile(exact_ms, 50)),
+            "brute_force_p99_ms": float(np.percentile(exact_ms, 99)),
+            "ivf_p50_ms": float(np.percentile(ivf_ms, 50)),
+            "ivf_p99_ms": float(np.percentile(ivf_ms, 99)),
+        })
+    return report
+
 # print("All tools defined and registered.")
 
 # # --- Test Tool Invocations ---
@@ -491,200 +4175,367 @@
 # fund_result = await call_tool("get_fund_portfolio", fund_args)
 # print(fund_result[0].text)
 
-# # --- Resource Definitions ---
-
-
-# @mcp_server.list_resources()
-# async def list_resources() -> List[Resource]:
-#     """List available static resources."""
-#     return [
-#         Resource(
-#             uri="orgair://companies",
-#             name="All Companies",
-#             description="List of all companies in the platform",
-#             mimeType="application/json",
-#         ),
-#         Resource(
-#             uri="orgair://sectors",
-#             name="Sector Calibrations",
-#             description="H^R baselines and dimension weights by sector",
-#             mimeType="application/json",
-#         ),
-#         Resource(
-#             uri="orgair://parameters/v2.0",
-#             name="Model Parameters v2.0",
-#             description="Current scoring and projection model parameters",
-#             mimeType="application/json",
-#         ),
-#     ]
-
-
-# @mcp_server.list_resource_templates()
-# async def list_resource_templates() -> List[ResourceTemplate]:
-#     """List resource templates for dynamic URIs."""
-#     return [
-#         ResourceTemplate(
-#             uriTemplate="orgair://company/{{company_id}}",
-#             name="Company Details",
-#             description="Get details for a specific company",
-#             mimeType="application/json",
-#         ),
-#         ResourceTemplate(
-#             uriTemplate="orgair://company/{{company_id}}/score",
-#             name="Company Score",
-#             description="Current Org-AI-R score for a company",
-#             mimeType="application/json",
-#         ),
-#         ResourceTemplate(
-#             uriTemplate="orgair://company/{{company_id}}/evidence",
-#             name="Company Evidence",
-#             description="Evidence items for a company's AI-readiness dimensions",
-#             mimeType="application/json",
-#         ),
-#         ResourceTemplate(
-#             uriTemplate="orgair://fund/{{fund_id}}",
-#             name="Fund Details",
-#             description="Fund portfolio and metrics summary",
-#             mimeType="application/json",
-#         ),
-#     ]
-
-
-# @mcp_server.read_resource()
-# async def read_resource(uri: str) -> str:
-#     """Read a resource by URI."""
-#     logger.info("mcp_resource_read", uri=uri)
-
-#     if uri == "orgair://companies":
-#         # Mock company list
-#         return json.dumps(
-#             {
-#                 "companies": [
-#                     {"id": "ACME-001", "name": "ACME Corp", "sector": "technology"},
-#                     {
-#                         "id": "GLOBAL-INC",
-#                         "name": "Global Innovations Inc.",
-#                         "sector": "manufacturing",
-#                     },
-#                     {
-#                         "id": "HEALTH-SYS",
-#                         "name": "Health Systems LLC",
-#                         "sector": "healthcare",
-#                     },
-#                 ]
-#             },
-#             indent=2,
-#         )
-
-#     elif uri == "orgair://sectors":
-#         # Sector baselines (same as used in calculate_org_air_score)
-#         return json.dumps(
-#             {
-#                 "sectors": [
-#                     {"id": "technology", "name": "Technology", "h_r_baseline": 85},
-#                     {"id": "healthcare", "name": "Healthcare", "h_r_baseline": 78},
-#                     {
-#                         "id": "financial_services",
-#                         "name": "Financial Services",
-#                         "h_r_baseline": 82,
-#                     },
-#                     {
-#                         "id": "manufacturing",
-#                         "name": "Manufacturing",
-#                         "h_r_baseline": 72,
-#                     },
-#                     {
-#                         "id": "retail",
-#                         "name": "Retail/Consumer",
-#                         "h_r_baseline": 75,
-#                     },
-#                     {
-#                         "id": "energy",
-#                         "name": "Energy/Utilities",
-#                         "h_r_baseline": 68,
-#                     },
-#                 ]
-#             },
-#             indent=2,
-#         )
-
-#     elif uri == "orgair://parameters/v2.0":
-#         # Model parameters for EBITDA (same as used in project_ebitda_impact)
-#         return json.dumps(
-#             {
-#                 "version": "v2.0",
-#                 "parameters": {
-#                     "alpha": 0.60,
-#                     "beta": 0.12,
-#                     "lambda": 0.25,
-#                     "delta": 0.15,
-#                     "ebitda": {
-#                         "gamma_0": 0.0025,
-#                         "gamma_1": 0.05,
-#                         "gamma_2": 0.025,
-#                         "gamma_3": 0.01,
-#                         "threshold": 25,
-#                     },
-#                 },
-#             },
-#             indent=2,
-#         )
-
-#     elif uri.startswith("orgair://company/"):
-#         parts = uri.replace("orgair://company/", "").split("/")
-#         company_id = parts[0]
-
-#         if len(parts) == 1:
-#             # orgair://company/{{company_id}}
-#             return json.dumps(
-#                 {
-#                     "company_id": company_id,
-#                     "name": f"Company {company_id} (Details Mock)",
-#                     "sector": "technology",
-#                 },
-#                 indent=2,
-#             )
-#         elif parts[1] == "score":
-#             # orgair://company/{{company_id}}/score
-#             # Return a mock score, could be retrieved from a database in a real scenario
-#             return json.dumps(
-#                 {
-#                     "company_id": company_id,
-#                     "org_air_score": 72.5,
-#                     "as_of": datetime.utcnow().isoformat(),
-#                 },
-#                 indent=2,
-#             )
-#         elif parts[1] == "evidence":
-#             # orgair://company/{{company_id}}/evidence
-#             # Return mock evidence count
-#             return json.dumps(
-#                 {
-#                     "company_id": company_id,
-#                     "evidence_count": 23,
-#                     "sample_evidence": ["doc_1", "doc_4"],
-#                 },
-#                 indent=2,
-#             )
-
-#     elif uri.startswith("orgair://fund/"):
-#         parts = uri.replace("orgair://fund/", "").split("/")
-#         fund_id = parts[0]
-
-#         if len(parts) == 1:
-#             # orgair://fund/{{fund_id}}
-#             # Return mock fund details
-#             return json.dumps(
-#                 {
-#                     "fund_id": fund_id,
-#                     "fund_name": f"Capital Partners {fund_id}",
-#                     "fund_air_score": 68.5,
-#                     "company_count": 12,
-#                 },
-#                 indent=2,
-#             )
-
-#     return json.dumps({"error": f"Unknown resource: {uri}"}, indent=2)
+# print("\n--- Testing calculate_org_air_scores_batch ---")
+# batch_args = {
+#     "company_ids": ["ACME-001", "GLOBAL-INC"],
+#     "sector_ids": ["technology", "manufacturing"],
+#     "dimension_scores": [[70, 65, 75, 68, 72, 60, 70], [55, 60, 50, 58, 62, 49, 57]],
+#     "talent_concentration": [0.2, 0.35],
+# }
+# batch_result = await call_tool("calculate_org_air_scores_batch", batch_args)
+# print(batch_result[0].text)
+
+# print("\n--- Benchmarking calculate_batch ---")
+# for row in benchmark_calculate_batch():
+#     print(row)
+
+# print("\n--- Benchmarking per-company evidence shards ---")
+# for row in benchmark_evidence_shards():
+#     print(row)
+
+# print("\n--- Benchmarking streaming evidence ingestion ---")
+# for row in benchmark_evidence_ingestion():
+#     print(row)
+
+# print("\n--- Benchmarking near-duplicate collapse ---")
+# for row in benchmark_near_duplicates():
+#     print(row)
+
+# print("\n--- Benchmarking re-ranking (quality lift vs cost) ---")
+# for row in benchmark_reranker():
+#     print(row)
+
+# print("\n--- Benchmarking vector index (IVF vs brute force) ---")
+# for row in benchmark_vector_index():
+#     print(row)
+
+# grid_result = await call_tool("project_ebitda_grid", {
+#     "company_id": "ACME-001",
+#     "entry_score": 55,
+#     "target_score": {"start": 60, "stop": 95, "steps": 8},
+#     "h_r_score": {"start": 50, "stop": 90, "steps": 5},
+#     "holding_period_years": {"start": 3, "stop": 7},
+# })
+# print(grid_result[0].text)
+
+# mc_result = await call_tool("analyze_whatif_scenario", {
+#     "company_id": "ACME-001",
+#     "scenario_name": "Data platform + AI academy",
+#     "dimension_changes": {"data_infra": 5, "talent": 10},
+#     "investment_usd": 2_000_000,
+#     "mode": "monte_carlo",
+#     "samples": 100_000,
+#     "seed": 7,
+# })
+# print(mc_result[0].text)
+
+# print("\n--- Benchmarking EBITDA projection (float vs Decimal) ---")
+# for row in benchmark_ebitda_projection():
+#     print(row)
+
+# print("\n--- Benchmarking Monte Carlo what-if ---")
+# for row in benchmark_whatif_simulation():
+#     print(row)
+
+# --- Resource Definitions ---
+
+# Template path segment: {name} or {name:type}
+_TEMPLATE_PARAM = re.compile(r"^\{(\w+)(?::(\w+))?\}$")
+RESOURCE_PARAM_TYPES: Dict[str, Callable[[str], Any]] = {"str": str, "int": int}
+
+
+class RegisteredResource(NamedTuple):
+    """A resource handler and its MCP definition (Resource, or ResourceTemplate when parameterized)."""
+
+    template: str
+    handler: Callable[..., Awaitable[Dict]]
+    definition: Any
+    params: Tuple[str, ...]
+    static: bool
+
+
+class _RouteNode:
+    def __init__(self):
+        self.literals: Dict[str, "_RouteNode"] = {}
+        self.param: Optional[Tuple[str, Callable[[str], Any], "_RouteNode"]] = None
+        self.resource: Optional[RegisteredResource] = None
+
+    def templates(self) -> List[str]:
+        """Every template registered at or below this node."""
+        found = [self.resource.template] if self.resource else []
+        children = list(self.literals.values()) + ([self.param[2]] if self.param else [])
+        for child in children:
+            found.extend(child.templates())
+        return found
+
+
+def _split_uri(uri: str) -> Tuple[str, List[str]]:
+    """Split `scheme://a/b/c?query` into the scheme and its path segments (query dropped)."""
+    scheme, sep, rest = uri.partition("://")
+    if not sep:
+        raise ValueError(f"Resource URI has no scheme: {uri}")
+    return scheme, rest.split("?", 1)[0].split("/")
+
+
+class ResourceRouter:
+    """Segment trie compiled from resource URI templates.
+
+    Literal segments are dict lookups and each node has at most one parameter
+    child, so resolving a URI costs O(path depth) regardless of how many
+    templates are registered. Literal segments win over parameters.
+    """
+
+    def __init__(self):
+        self.roots: Dict[str, _RouteNode] = {}
+        self.resources: Dict[str, RegisteredResource] = {}
+
+    def add(self, resource: RegisteredResource, segments: List[Tuple[str, Optional[Tuple[str, Callable]]]], scheme: str) -> None:
+        if resource.template in self.resources:
+            raise ValueError(f"Resource already registered: {resource.template}")
+        node = self.roots.setdefault(scheme, _RouteNode())
+        for literal, param in segments:
+            if param is None:
+                node = node.literals.setdefault(literal, _RouteNode())
+                continue
+            name, convert = param
+            if node.param is None:
+                node.param = (name, convert, _RouteNode())
+            elif node.param[0] != name or node.param[1] is not convert:
+                raise ValueError(f"Conflicting parameter {{{name}}} in {resource.template}; already routed as {{{node.param[0]}}}")
+            node = node.param[2]
+        if node.resource is not None:
+            raise ValueError(f"Resource already registered: {resource.template}")
+        node.resource = resource
+        self.resources[resource.template] = resource
+
+    def resolve(self, uri: str) -> Tuple[Optional[RegisteredResource], Dict[str, Any], List[str]]:
+        """Match a URI; returns (resource, typed params, templates under the deepest matched prefix)."""
+        scheme, segments = _split_uri(uri)
+        node = self.roots.get(scheme)
+        params: Dict[str, Any] = {}
+        if node is None:
+            return None, params, []
+        for segment in segments:
+            child = node.literals.get(segment)
+            if child is None and node.param is not None and segment:
+                name, convert, child = node.param
+                try:
+                    params[name] = convert(unquote(segment))
+                except ValueError:
+                    return None, params, node.templates()
+            if child is None:
+                return None, params, node.templates()
+            node = child
+        if node.resource is None:
+            return None, params, node.templates()
+        return node.resource, params, []
+
+
+RESOURCE_ROUTER = ResourceRouter()
+
+
+def register_resource(
+    uri_template: str,
+    name: str,
+    description: str,
+    mime_type: str = "application/json",
+    static: bool = False,
+):
+    """Decorator registering an async handler for a resource URI template.
+
+    Path parameters are written `{name}` or `{name:int}` and passed to the handler as
+    keyword arguments of that type. Templates without parameters are listed as static
+    resources; the published uriTemplate drops the type suffix. `static=True` marks a
+    parameterless resource whose content only changes via `invalidate_static_resources`.
+    """
+    def decorator(handler: Callable[..., Awaitable[Dict]]) -> Callable[..., Awaitable[Dict]]:
+        scheme, raw_segments = _split_uri(uri_template)
+        segments = []
+        for segment in raw_segments:
+            match = _TEMPLATE_PARAM.match(segment)
+            if match is None:
+                segments.append((segment, None))
+            else:
+                segments.append((segment, (match.group(1), RESOURCE_PARAM_TYPES[match.group(2) or "str"])))
+        params = tuple(param[0] for _, param in segments if param is not None)
+        if static and params:
+            raise ValueError(f"Static resources cannot take parameters: {uri_template}")
+        if params:
+            published = scheme + "://" + "/".join("{" + p[0] + "}" if p else s for s, p in segments)
+            definition = ResourceTemplate(uriTemplate=published, name=name, description=description, mimeType=mime_type)
+        else:
+            definition = Resource(uri=uri_template, name=name, description=description, mimeType=mime_type)
+        RESOURCE_ROUTER.add(RegisteredResource(uri_template, handler, definition, params, static), segments, scheme)
+        return handler
+    return decorator
+
+
+class StaticResourceEntry(NamedTuple):
+    """A static resource rendered once: response text, content hash, and its not-modified reply."""
+
+    text: str
+    etag: str
+    not_modified: str
+
+
+# Rendered static resources by template; rebuilt on first read after invalidation
+STATIC_RESOURCES: Dict[str, StaticResourceEntry] = {}
+
+
+async def _render_static_resource(spec: RegisteredResource) -> StaticResourceEntry:
+    """Serialize a static resource once; the etag hashes its compact JSON form."""
+    entry = STATIC_RESOURCES.get(spec.template)
+    if entry is None:
+        payload = await spec.handler()
+        etag = hashlib.sha256(COMPACT_JSON.dumps(payload).encode()).hexdigest()[:16]
+        entry = StaticResourceEntry(
+            text=response_serializer.dumps({**payload, "etag": etag}),
+            etag=etag,
+            not_modified=response_serializer.dumps({"uri": spec.template, "not_modified": True, "etag": etag}),
+        )
+        STATIC_RESOURCES[spec.template] = entry
+    return entry
+
+
+def invalidate_static_resources(uri: Optional[str] = None) -> None:
+    """Drop one (or every) rendered static resource after its underlying data changed."""
+    if uri is None:
+        STATIC_RESOURCES.clear()
+    else:
+        STATIC_RESOURCES.pop(uri, None)
+
+
+async def warm_static_resources() -> None:
+    """Render every static resource ahead of the first read."""
+    for spec in RESOURCE_ROUTER.resources.values():
+        if spec.static:
+            await _render_static_resource(spec)
+
+
+@register_resource("orgair://companies", name="All Companies", description="List of all companies in the platform", static=True)
+async def _resource_companies() -> Dict:
+    # Mock company list
+    return {
+        "companies": [
+            {"id": "ACME-001", "name": "ACME Corp", "sector": "technology"},
+            {
+                "id": "GLOBAL-INC",
+                "name": "Global Innovations Inc.",
+                "sector": "manufacturing",
+            },
+            {
+                "id": "HEALTH-SYS",
+                "name": "Health Systems LLC",
+                "sector": "healthcare",
+            },
+        ]
+    }
+
+
+@register_resource("orgair://sectors", name="Sector Calibrations", description="H^R baselines and dimension weights by sector", static=True)
+async def _resource_sectors() -> Dict:
+    # Sector baselines (same registry snapshot as used in calculate_org_air_score)
+    return parameter_registry.snapshot.sectors_payload()
+
+
+@register_resource("orgair://parameters/v2.0", name="Model Parameters v2.0", description="Current scoring and projection model parameters", static=True)
+async def _resource_parameters() -> Dict:
+    # Model parameters for EBITDA (same registry snapshot as used in project_ebitda_impact)
+    return parameter_registry.snapshot.parameters_payload()
+
+
+@register_resource("orgair://company/{company_id}", name="Company Details", description="Get details for a specific company")
+async def _resource_company(company_id: str) -> Dict:
+    return {
+        "company_id": company_id,
+        "name": f"Company {company_id} (Details Mock)",
+        "sector": "technology",
+    }
+
+
+@register_resource("orgair://company/{company_id}/score", name="Company Score", description="Current Org-AI-R score for a company")
+async def _resource_company_score(company_id: str) -> Dict:
+    latest = score_history_store.latest(company_id)
+    if latest is None:
+        return {"error": f"No scores recorded for company: {company_id}"}
+    as_of, score = latest
+    return {
+        "company_id": company_id,
+        "org_air_score": score,
+        "as_of": as_of.isoformat(),
+        "score_count": score_history_store.count(company_id),
+        "monthly_trend": score_history_store.trend(company_id, "monthly", limit=12),
+    }
+
+
+@register_resource("orgair://company/{company_id}/evidence", name="Company Evidence", description="Evidence items for a company's AI-readiness dimensions")
+async def _resource_company_evidence(company_id: str) -> Dict:
+    # Return mock evidence count
+    return {
+        "company_id": company_id,
+        "evidence_count": 23,
+        "sample_evidence": ["doc_1", "doc_4"],
+    }
+
+
+@register_resource("orgair://fund/{fund_id}", name="Fund Details", description="Fund portfolio and metrics summary")
+async def _resource_fund(fund_id: str) -> Dict:
+    if fund_id not in fund_portfolio_store.funds:
+        return {"error": f"Unknown fund: {fund_id}"}
+    summary = fund_portfolio_store.summary(fund_id)
+    return {
+        "fund_id": fund_id,
+        "fund_name": f"Capital Partners {fund_id}",
+        "fund_air_score": summary["fund_air_score"],
+        "company_count": summary["company_count"],
+    }
+
+
+@register_resource("orgair://server/metrics", name="Server Metrics", description="Tool worker pool queueing, result cache and evidence retrieval statistics")
+async def _resource_server_metrics() -> Dict:
+    return {
+        "tool_worker_pool": tool_worker_pool.stats(),
+        "tool_result_cache": tool_result_cache.stats(),
+        "single_flight": tool_single_flight.stats(),
+        "evidence_shards": hybrid_retriever.shard_stats(),
+        "evidence_ingestion": evidence_ingestor.stats(),
+        "evidence_rerank": hybrid_retriever.rerank_stage.stats(),
+    }
+
+
+@mcp_server.list_resources()
+async def list_resources() -> List[Resource]:
+    """List available static resources."""
+    return [spec.definition for spec in RESOURCE_ROUTER.resources.values() if not spec.params]
+
+
+@mcp_server.list_resource_templates()
+async def list_resource_templates() -> List[ResourceTemplate]:
+    """List resource templates for dynamic URIs."""
+    return [spec.definition for spec in RESOURCE_ROUTER.resources.values() if spec.params]
+
+
+@mcp_server.read_resource()
+async def read_resource(uri: str) -> str:
+    """Read a resource by URI.
+
+    Static resources carry an `etag`; appending `?if_none_match=<etag>` to the URI
+    returns a short not-modified reply while the content is unchanged.
+    """
+    logger.info("mcp_resource_read", uri=uri)
+    uri = str(uri)
+    try:
+        spec, params, candidates = RESOURCE_ROUTER.resolve(uri)
+    except ValueError as e:
+        return response_serializer.dumps({"error": str(e)})
+    if spec is None:
+        logger.info("mcp_resource_unknown", uri=uri, candidates=candidates)
+        return response_serializer.dumps({"error": f"Unknown resource: {uri}", "candidates": candidates})
+    if spec.static:
+        entry = STATIC_RESOURCES.get(spec.template) or await _render_static_resource(spec)
+        known = parse_qs(uri.partition("?")[2]).get("if_none_match", ())
+        return entry.not_modified if entry.etag in known else entry.text
+    return response_serializer.dumps(await spec.handler(**params))
 
 
 # print("All resources defined and registered.")
@@ -720,7 +4571,7 @@
 # print("\n--- Testing read_resource (Dynamic: fund details) ---")
 # fund_details_content = await read_resource("orgair://fund/PE-FUND-001")
 # print(fund_details_content)
-# # --- Prompt Definitions ---
+# --- Prompt Definitions ---
 # # Explicitly re-import Server to ensure we get the correct class
 # from mcp.server import Server
 # from mcp.types import (
@@ -735,163 +4586,163 @@
 # mcp_server = Server("pe-orgair-server")
 
 
-# @mcp_server.list_prompts()
-# async def list_prompts() -> List[Prompt]:
-#     """List available prompt templates."""
-#     return [
-#         Prompt(
-#             name="due_diligence_assessment",
-#             description="Comprehensive AI-readiness due diligence assessment for a company.",
-#             arguments=[
-#                 {
-#                     "name": "company_id",
-#                     "description": "Company to assess",
-#                     "required": True,
-#                 },
-#                 {
-#                     "name": "assessment_depth",
-#                     "description": "screening, limited, or full",
-#                     "required": False,
-#                 },
-#             ],
-#         ),
-#         Prompt(
-#             name="value_creation_plan",
-#             description="Generate an AI value creation plan for a portfolio company.",
-#             arguments=[
-#                 {
-#                     "name": "company_id",
-#                     "description": "Target company",
-#                     "required": True,
-#                 },
-#                 {
-#                     "name": "target_score",
-#                     "description": "Target Org-AI-R score to achieve",
-#                     "required": True,
-#                 },
-#                 {
-#                     "name": "timeline_months",
-#                     "description": "Implementation timeline in months",
-#                     "required": False,
-#                 },
-#             ],
-#         ),
-#         Prompt(
-#             name="competitive_analysis",
-#             description="Compare AI-readiness across peer companies.",
-#             arguments=[
-#                 {
-#                     "name": "company_ids",
-#                     "description": "Comma-separated company IDs for comparison",
-#                     "required": True,
-#                 },
-#                 {
-#                     "name": "focus_dimensions",
-#                     "description": "Specific dimensions to compare (comma-separated)",
-#                     "required": False,
-#                 },
-#             ],
-#         ),
-#     ]
-
-
-# @mcp_server.get_prompt()
-# async def get_prompt(
-#     name: str, arguments: Optional[Dict[str, str]] = None
-# ) -> List[PromptMessage]:
-#     """Get a prompt template with arguments."""
-#     arguments = arguments or {}
-
-#     if name == "due_diligence_assessment":
-#         company_id = arguments.get("company_id", "UNKNOWN_COMPANY")
-#         depth = arguments.get("assessment_depth", "limited")
-#         return [
-#             PromptMessage(
-#                 role="user",
-#                 content=TextContent(
-#                     type="text",
-#                     text=f"""Conduct a {depth} AI-readiness due diligence assessment for company {company_id}.
-
-# Please:
-# 1. First, retrieve the current Org-AI-R score using the `calculate_org_air_score` tool.
-# 2. Gather evidence for each of the seven dimensions using the `get_company_evidence` tool.
-# 3. Analyze strengths and gaps across dimensions based on the retrieved data and evidence.
-# 4. Compare {company_id}'s Org-AI-R profile to sector benchmarks (e.g., from `orgair://sectors` resource).
-# 5. Identify key risks and opportunities related to AI adoption and maturity.
-# 6. Provide a strategic recommendation with a confidence level (e.g., 'high', 'medium', 'low').
-
-# Structure your response as a formal due diligence memo, clearly stating the current Org-AI-R score, supporting evidence, comparative analysis, identified risks/opportunities, and a concise recommendation.""",
-#                 ),
-#             ),
-#         ]
-
-#     elif name == "value_creation_plan":
-#         company_id = arguments.get("company_id", "UNKNOWN_COMPANY")
-#         target_score = arguments.get("target_score", "75")
-#         timeline_months = arguments.get("timeline_months", "24")
-#         return [
-#             PromptMessage(
-#                 role="user",
-#                 content=TextContent(
-#                     type="text",
-#                     text=f"""Create an AI value creation plan for company {company_id}.
-# Target: Improve Org-AI-R score to {target_score} within {timeline_months} months.
-
-# Please:
-# 1. Get current Org-AI-R score using `calculate_org_air_score`.
-# 2. Identify highest-impact improvement areas (e.g., based on low dimension scores or evidence gaps).
-# 3. Use the `analyze_whatif_scenario` tool to model potential interventions and their impact on Org-AI-R score and financial metrics.
-# 4. Project potential EBITDA impact using the `project_ebitda_impact` tool based on planned improvements.
-# 5. Create a phased implementation roadmap, detailing key initiatives, estimated costs, and expected timelines.
-# 6. Estimate investment requirements and projected ROI.
-
-# Deliver as an executive-ready value creation plan, summarizing the current state, proposed initiatives, and projected financial benefits.""",
-#                 ),
-#             ),
-#         ]
-
-#     elif name == "competitive_analysis":
-#         company_ids_str = arguments.get("company_ids", "").strip()
-#         company_ids = [c.strip() for c in company_ids_str.split(",") if c.strip()]
-#         dimensions = arguments.get("focus_dimensions", "all")
-
-#         if not company_ids:
-#             return [
-#                 PromptMessage(
-#                     role="user",
-#                     content=TextContent(
-#                         type="text",
-#                         text="Error: 'company_ids' argument is required for competitive analysis.",
-#                     ),
-#                 )
-#             ]
-
-#         return [
-#             PromptMessage(
-#                 role="user",
-#                 content=TextContent(
-#                     type="text",
-#                     text=f"""Conduct a competitive AI-readiness analysis for: {', '.join(company_ids)}.
-# Focus dimensions: {dimensions}
-
-# Please:
-# 1. For each company, calculate its Org-AI-R score using the `calculate_org_air_score` tool.
-# 2. Compare dimension-level performance across all specified companies.
-# 3. Identify relative strengths and weaknesses for each company compared to its peers.
-# 4. Highlight best practices observed from leading companies in the peer group.
-# 5. Provide strategic recommendations for competitive positioning based on AI readiness.
-
-# Present as a comparative analysis report with key findings and actionable insights.""",
-#                 ),
-#             ),
-#         ]
-
-#     return [
-#         PromptMessage(
-#             role="user",
-#             content=TextContent(type="text", text=f"Unknown prompt: {name}"),
-#         )
-#     ]
+@mcp_server.list_prompts()
+async def list_prompts() -> List[Prompt]:
+    """List available prompt templates."""
+    return [
+        Prompt(
+            name="due_diligence_assessment",
+            description="Comprehensive AI-readiness due diligence assessment for a company.",
+            arguments=[
+                {
+                    "name": "company_id",
+                    "description": "Company to assess",
+                    "required": True,
+                },
+                {
+                    "name": "assessment_depth",
+                    "description": "screening, limited, or full",
+                    "required": False,
+                },
+            ],
+        ),
+        Prompt(
+            name="value_creation_plan",
+            description="Generate an AI value creation plan for a portfolio company.",
+            arguments=[
+                {
+                    "name": "company_id",
+                    "description": "Target company",
+                    "required": True,
+                },
+                {
+                    "name": "target_score",
+                    "description": "Target Org-AI-R score to achieve",
+                    "required": True,
+                },
+                {
+                    "name": "timeline_months",
+                    "description": "Implementation timeline in months",
+                    "required": False,
+                },
+            ],
+        ),
+        Prompt(
+            name="competitive_analysis",
+            description="Compare AI-readiness across peer companies.",
+            arguments=[
+                {
+                    "name": "company_ids",
+                    "description": "Comma-separated company IDs for comparison",
+                    "required": True,
+                },
+                {
+                    "name": "focus_dimensions",
+                    "description": "Specific dimensions to compare (comma-separated)",
+                    "required": False,
+                },
+            ],
+        ),
+    ]
+
+
+@mcp_server.get_prompt()
+async def get_prompt(
+    name: str, arguments: Optional[Dict[str, str]] = None
+) -> List[PromptMessage]:
+    """Get a prompt template with arguments."""
+    arguments = arguments or {}
+
+    if name == "due_diligence_assessment":
+        company_id = arguments.get("company_id", "UNKNOWN_COMPANY")
+        depth = arguments.get("assessment_depth", "limited")
+        return [
+            PromptMessage(
+                role="user",
+                content=TextContent(
+                    type="text",
+                    text=f"""Conduct a {depth} AI-readiness due diligence assessment for company {company_id}.
+
+Please:
+1. First, retrieve the current Org-AI-R score using the `calculate_org_air_score` tool.
+2. Gather evidence for all seven dimensions with a single `get_company_evidence` call using `dimension: "all"`.
+3. Analyze strengths and gaps across dimensions based on the retrieved data and evidence.
+4. Compare {company_id}'s Org-AI-R profile to sector benchmarks (e.g., from `orgair://sectors` resource).
+5. Identify key risks and opportunities related to AI adoption and maturity.
+6. Provide a strategic recommendation with a confidence level (e.g., 'high', 'medium', 'low').
+
+Structure your response as a formal due diligence memo, clearly stating the current Org-AI-R score, supporting evidence, comparative analysis, identified risks/opportunities, and a concise recommendation.""",
+                ),
+            ),
+        ]
+
+    elif name == "value_creation_plan":
+        company_id = arguments.get("company_id", "UNKNOWN_COMPANY")
+        target_score = arguments.get("target_score", "75")
+        timeline_months = arguments.get("timeline_months", "24")
+        return [
+            PromptMessage(
+                role="user",
+                content=TextContent(
+                    type="text",
+                    text=f"""Create an AI value creation plan for company {company_id}.
+Target: Improve Org-AI-R score to {target_score} within {timeline_months} months.
+
+Please:
+1. Get current Org-AI-R score using `calculate_org_air_score`.
+2. Identify highest-impact improvement areas (e.g., based on low dimension scores or evidence gaps).
+3. Use the `analyze_whatif_scenario` tool to model potential interventions and their impact on Org-AI-R score and financial metrics.
+4. Project potential EBITDA impact using the `project_ebitda_impact` tool based on planned improvements.
+5. Create a phased implementation roadmap, detailing key initiatives, estimated costs, and expected timelines.
+6. Estimate investment requirements and projected ROI.
+
+Deliver as an executive-ready value creation plan, summarizing the current state, proposed initiatives, and projected financial benefits.""",
+                ),
+            ),
+        ]
+
+    elif name == "competitive_analysis":
+        company_ids_str = arguments.get("company_ids", "").strip()
+        company_ids = [c.strip() for c in company_ids_str.split(",") if c.strip()]
+        dimensions = arguments.get("focus_dimensions", "all")
+
+        if not company_ids:
+            return [
+                PromptMessage(
+                    role="user",
+                    content=TextContent(
+                        type="text",
+                        text="Error: 'company_ids' argument is required for competitive analysis.",
+                    ),
+                )
+            ]
+
+        return [
+            PromptMessage(
+                role="user",
+                content=TextContent(
+                    type="text",
+                    text=f"""Conduct a competitive AI-readiness analysis for: {', '.join(company_ids)}.
+Focus dimensions: {dimensions}
+
+Please:
+1. For each company, calculate its Org-AI-R score using the `calculate_org_air_score` tool.
+2. Compare dimension-level performance across all specified companies.
+3. Identify relative strengths and weaknesses for each company compared to its peers.
+4. Highlight best practices observed from leading companies in the peer group.
+5. Provide strategic recommendations for competitive positioning based on AI readiness.
+
+Present as a comparative analysis report with key findings and actionable insights.""",
+                ),
+            ),
+        ]
+
+    return [
+        PromptMessage(
+            role="user",
+            content=TextContent(type="text", text=f"Unknown prompt: {name}"),
+        )
+    ]
 
 
 # print("All prompt templates defined and registered.")
@@ -1024,3 +4875,240 @@
 # This plan provides a strategic direction for {company_for_plan} to achieve its AI-readiness goals and unlock significant value.
 # """
 # print(final_plan_summary)
+
+# # The same workflow server-side in one round trip, with independent steps run concurrently.
+# plan_output = await call_tool(
+#     "build_value_creation_plan",
+#     {
+#         "company_id": company_for_plan,
+#         "sector_id": "technology",
+#         "dimension_scores": [70, 65, 75, 68, 72, 60, 70],
+#         "target_score": float(target_score_for_plan),
+#         "timeline_months": int(timeline_for_plan),
+#         "investment_usd": 2000000,
+#     },
+# )
+# print(json.loads(plan_output[0].text)["summary"])
+
+
+# --- Server Entry Point ---
+
+# Back-pressure defaults for the HTTP transport
+HTTP_MAX_CONCURRENT_REQUESTS = 64   # JSON-RPC POSTs executing at once
+HTTP_QUEUE_TIMEOUT_S = 5.0          # how long an excess POST waits for a slot before a 503
+HTTP_KEEPALIVE_S = 30               # idle keep-alive for client connections
+HTTP_SESSION_IDLE_TIMEOUT_S = 1800.0
+HTTP_MAX_SESSIONS = 1000
+
+
+class ConcurrencyLimitMiddleware:
+    """ASGI middleware bounding in-flight POST requests (the JSON-RPC calls).
+
+    Long-lived GET event streams are not counted. A POST that cannot get a slot
+    within `queue_timeout` seconds is answered 503 with Retry-After instead of
+    queueing without bound.
+    """
+
+    def __init__(self, app: Any, max_concurrent: int = HTTP_MAX_CONCURRENT_REQUESTS, queue_timeout: float = HTTP_QUEUE_TIMEOUT_S):
+        self.app = app
+        self.max_concurrent = max_concurrent
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self.in_flight = 0
+        self.rejected = 0
+
+    async def __call__(self, scope: Dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            response = JSONResponse({"error": "Server busy, retry later"}, status_code=503, headers={"Retry-After": "1"})
+            await response(scope, receive, send)
+            return
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+
+class _ASGIEndpoint:
+    """Wraps a raw ASGI coroutine so Starlette's Route passes scope/receive/send straight through."""
+
+    def __init__(self, handler: Callable[[Dict, Callable, Callable], Awaitable[None]]):
+        self.handler = handler
+
+    async def __call__(self, scope: Dict, receive: Callable, send: Callable) -> None:
+        await self.handler(scope, receive, send)
+
+
+def create_http_app(
+    max_concurrent_requests: int = HTTP_MAX_CONCURRENT_REQUESTS,
+    queue_timeout: float = HTTP_QUEUE_TIMEOUT_S,
+    session_idle_timeout: float = HTTP_SESSION_IDLE_TIMEOUT_S,
+    max_sessions: int = HTTP_MAX_SESSIONS,
+) -> ConcurrencyLimitMiddleware:
+    """ASGI app serving many MCP sessions from this process.
+
+    Streamable HTTP lives at `/mcp` and legacy SSE at `/sse` (+ `/messages/`). Every
+    session shares the module-level retriever, stores and caches.
+    """
+    session_manager = StreamableHTTPSessionManager(
+        app=mcp_server,
+        session_idle_timeout=session_idle_timeout,
+        max_sessions=max_sessions,
+    )
+    sse = SseServerTransport("/messages/")
+
+    async def handle_sse(request: Any) -> Response:
+        async with sse.connect_sse(request.scope, request.receive, request._send) as (read_stream, write_stream):
+            await mcp_server.run(read_stream, write_stream, mcp_server.create_initialization_options())
+        return Response()
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app: Any):
+        await warm_static_resources()
+        try:
+            async with session_manager.run():
+                yield
+        finally:
+            tool_worker_pool.shutdown()
+
+    app = Starlette(
+        routes=[
+            Route("/mcp", endpoint=_ASGIEndpoint(session_manager.handle_request), methods=["GET", "POST", "DELETE"]),
+            Route("/sse", endpoint=handle_sse, methods=["GET"]),
+            Mount("/messages/", app=sse.handle_post_message),
+        ],
+        lifespan=lifespan,
+    )
+    return ConcurrencyLimitMiddleware(app, max_concurrent_requests, queue_timeout)
+
+
+def _http_server(app: Any, host: str, port: int) -> uvicorn.Server:
+    # nest_asyncio patches the stdlib loop, so uvloop must not be selected
+    config = uvicorn.Config(app, host=host, port=port, loop="asyncio", timeout_keep_alive=HTTP_KEEPALIVE_S, log_level="warning")
+    return uvicorn.Server(config)
+
+
+async def main(transport: str = "stdio", host: str = "127.0.0.1", port: int = 8000) -> None:
+    """Run MCP server over stdio (one client) or HTTP (many concurrent sessions)."""
+    logger.info("starting_mcp_server", version=LATEST_PROTOCOL_VERSION, transport=transport)
+    # Parameter hot reload applies to every transport, so the watcher lives as long as the server
+    watcher = asyncio.create_task(watch_parameters())
+    try:
+        if transport == "http":
+            await _http_server(create_http_app(), host, port).serve()
+            return
+        async with stdio_server() as (read_stream, write_stream):
+            await mcp_server.run(
+                read_stream,
+                write_stream,
+                mcp_server.create_initialization_options(),
+            )
+    finally:
+        watcher.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await watcher
+
+
+async def run_load_test(
+    url: str,
+    sessions: int = 50,
+    concurrency: int = 10,
+    calls_per_session: int = 5,
+    tool: str = "get_fund_portfolio",
+    arguments: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Open `sessions` streamable-HTTP MCP sessions, `concurrency` at a time, each making
+    `calls_per_session` tool calls; reports throughput and call latency percentiles."""
+    # Client transports are only needed for the benchmark, not to import or run the server
+    from mcp import ClientSession
+    from mcp.client.streamable_http import streamable_http_client
+
+    arguments = arguments if arguments is not None else {"fund_id": "PE-FUND-001"}
+    gate = asyncio.Semaphore(concurrency)
+    call_latencies: List[float] = []
+    session_latencies: List[float] = []
+    errors = 0
+
+    async def one_session() -> None:
+        nonlocal errors
+        async with gate:
+            started = time.perf_counter()
+            try:
+                async with streamable_http_client(url) as (read_stream, write_stream, _):
+                    async with ClientSession(read_stream, write_stream) as session:
+                        await session.initialize()
+                        for _ in range(calls_per_session):
+                            call_started = time.perf_counter()
+                            result = await session.call_tool(tool, arguments)
+                            call_latencies.append(time.perf_counter() - call_started)
+                            errors += bool(result.isError)
+            except Exception:
+                logger.exception("load_test_session_failed")
+                errors += 1
+                return
+            session_latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_session() for _ in range(sessions)))
+    elapsed = time.perf_counter() - started
+    latencies_ms = np.array(call_latencies or [np.nan]) * 1e3
+    return {
+        "sessions": sessions,
+        "concurrency": concurrency,
+        "calls": len(call_latencies),
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "sessions_per_s": len(session_latencies) / elapsed,
+        "calls_per_s": len(call_latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "session_p50_ms": float(np.percentile(np.array(session_latencies or [np.nan]) * 1e3, 50)),
+    }
+
+
+def benchmark_http_transport(
+    sessions: int = 50, concurrency: int = 10, calls_per_session: int = 5, **load_args: Any
+) -> Dict[str, Any]:
+    """Start the HTTP app on a free local port in-process and run `run_load_test` against it."""
+
+    async def serve_and_load() -> Dict[str, Any]:
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        server = _http_server(create_http_app(), "127.0.0.1", port)
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            if serving.done():
+                serving.result()
+            await asyncio.sleep(0.01)
+        try:
+            return await run_load_test(f"http://127.0.0.1:{port}/mcp", sessions, concurrency, calls_per_session, **load_args)
+        finally:
+            server.should_exit = True
+            await serving
+
+    return asyncio.run(serve_and_load())
+
+
+# print("\n--- Load testing the HTTP transport ---")
+# print(benchmark_http_transport(sessions=100, concurrency=20))
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="PE Org-AI-R MCP server")
+    parser.add_argument("--transport", choices=["stdio", "http"], default="stdio")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--ingest", action="append", default=[], metavar="JSONL", help="Evidence dump to ingest before serving")
+    cli_args = parser.parse_args()
+    for dump in cli_args.ingest:
+        logger.info("evidence_ingested", path=dump, **evidence_ingestor.ingest(read_evidence_jsonl(dump)))
+    asyncio.run(main(cli_args.transport, cli_args.host, cli_args.port))
@@ -0,0 +1,1044 @@
+import asyncio
+import contextlib
+import json
+
+import numpy as np
+import pytest
+
+import source
+
+
+def call(name, args):
+    """Invoke an MCP tool synchronously and decode its JSON payload."""
+    result = asyncio.run(source.call_tool(name, args))
+    return json.loads(result[0].text)
+
+
+class TestBatchScoring:
+    def test_calculate_batch_matches_scalar_exactly(self):
+        rng = np.random.default_rng(7)
+        dimension_scores = rng.uniform(0, 100, size=(500, 7))
+        dimension_scores[:50] = rng.integers(0, 101, size=(50, 7))
+        talent = rng.uniform(0, 1, size=500)
+        hr_baseline = rng.choice([85, 78, 82, 72, 75, 68], size=500).astype(float)
+
+        batch = source.org_air_calculator.calculate_batch(dimension_scores, talent, hr_baseline, 0.1)
+
+        for i in range(500):
+            scalar = source.org_air_calculator.calculate(
+                "C", "s", dimension_scores[i].tolist(), float(talent[i]), float(hr_baseline[i]), 0.1, 10
+            )
+            assert batch["final_score"][i] == scalar["final_score"]
+            assert batch["v_r_score"][i] == scalar["components"]["v_r_score"]
+            assert batch["h_r_score"][i] == scalar["components"]["h_r_score"]
+            assert batch["synergy_score"][i] == scalar["components"]["synergy_score"]
+            assert batch["ci_lower"][i] == scalar["confidence_interval"]["lower"]
+            assert batch["ci_upper"][i] == scalar["confidence_interval"]["upper"]
+            assert batch["sem"][i] == scalar["confidence_interval"]["sem"]
+            assert batch["weighted_mean"][i] == scalar["audit_trail"]["weighted_mean"]
+
+    def test_batch_tool_matches_single_tool(self):
+        rows = [[70, 65, 75, 68, 72, 60, 70], [55, 60, 50, 58, 62, 49, 57]]
+        data = call("calculate_org_air_scores_batch", {
+            "company_ids": ["ACME-001", "GLOBAL-INC"],
+            "sector_ids": ["technology", "manufacturing"],
+            "dimension_scores": rows,
+            "talent_concentration": [0.2, 0.35],
+        })
+        assert data["company_count"] == 2
+        single = call("calculate_org_air_score", {
+            "company_id": "GLOBAL-INC",
+            "sector_id": "manufacturing",
+            "dimension_scores": rows[1],
+            "talent_concentration": 0.35,
+        })
+        batch_row = data["results"][1]
+        for key in ("final_score", "components", "confidence_interval", "audit_trail"):
+            assert batch_row[key] == single[key]
+
+    def test_batch_tool_rejects_ragged_rows(self):
+        data = call("calculate_org_air_scores_batch", {
+            "company_ids": ["ACME-001"],
+            "sector_ids": ["technology", "retail"],
+            "dimension_scores": [[70, 65, 75, 68, 72, 60, 70]],
+        })
+        assert "error" in data
+
+
+class TestEvidenceIndex:
+    def test_dimension_query_ranks_matching_evidence_first(self):
+        results = asyncio.run(source.hybrid_retriever.retrieve(
+            "AI readiness data_infrastructure", 3, {"company_id": "ACME-001"}
+        ))
+        assert results[0]["doc_id"] == "doc_1"
+        assert all(r["metadata"]["company_id"] == "ACME-001" for r in results)
+
+    def test_generic_query_returns_all_company_evidence_by_score(self):
+        results = asyncio.run(source.hybrid_retriever.retrieve("AI readiness all", 10, {"company_id": "ACME-001"}))
+        assert len(results) == 6
+        assert [r["score"] for r in results] == sorted((r["score"] for r in results), reverse=True)
+
+    def test_bm25_ranks_by_term_frequency_and_respects_filters(self):
+        index = source.EvidenceIndex()
+        index.add({"doc_id": "a", "content": "cloud cloud data", "score": 0.1, "metadata": {"company_id": "X", "dimension": "d"}})
+        index.add({"doc_id": "b", "content": "data data data", "score": 0.9, "metadata": {"company_id": "X", "dimension": "d"}})
+        index.add({"doc_id": "c", "content": "cloud platform", "score": 0.5, "metadata": {"company_id": "Y", "dimension": "d"}})
+        assert [n for _, n in index.search("cloud", 5)] == [0, 2]
+        assert [n for _, n in index.search("cloud", 5, company_id="Y")] == [2]
+        assert index.search("cloud", 5, company_id="missing") == []
+
+    def test_retrieve_many_matches_single_queries(self):
+        queries = ["AI readiness talent", "AI readiness culture", "AI readiness all"]
+        grouped = asyncio.run(source.hybrid_retriever.retrieve_many(queries, 3, company_id="ACME-001"))
+        for query, group in zip(queries, grouped):
+            assert group == asyncio.run(source.hybrid_retriever.retrieve(query, 3, {"company_id": "ACME-001"}))
+
+        dimensions = ["talent", "culture", None]
+        filtered = asyncio.run(source.hybrid_retriever.retrieve_many(queries, 3, company_id="ACME-001", dimensions=dimensions))
+        for query, dimension, group in zip(queries, dimensions, filtered):
+            assert group == asyncio.run(source.hybrid_retriever.retrieve(
+                query, 3, {"company_id": "ACME-001", "dimension": dimension}
+            ))
+
+    def test_evidence_tool_groups_all_dimensions_in_one_call(self):
+        data = call("get_company_evidence", {"company_id": "ACME-001", "dimension": "all", "limit": 2})
+        assert list(data["evidence_groups"]) == source.DIMENSION_NAMES
+        for dimension, group in data["evidence_groups"].items():
+            assert all(item["metadata"]["dimension"] == dimension for item in group)
+        assert [item["doc_id"] for item in data["evidence_groups"]["talent"]] == ["doc_4"]
+        assert data["evidence_groups"]["technology_stack"] == []
+        doc_ids = {item["doc_id"] for group in data["evidence_groups"].values() for item in group}
+        assert data["evidence_count"] == len(doc_ids) == 6
+
+        subset = call("get_company_evidence", {"company_id": "ACME-001", "dimension": ["culture", "talent"]})
+        assert list(subset["evidence_groups"]) == ["culture", "talent"]
+        bad = call("get_company_evidence", {"company_id": "ACME-001", "dimension": ["talent", "sales"]})
+        assert [(d["field"], d["constraint"]) for d in bad["details"]] == [("dimension[1]", "enum")]
+
+    def test_filtered_queries_load_only_that_company_shard(self):
+        items = [
+            {**item, "metadata": {**item["metadata"], "company_id": company}, "doc_id": f"{company}-{item['doc_id']}"}
+            for company in ("A", "B", "C") for item in source.MOCK_EVIDENCE_POOL
+        ]
+        retriever = source.MockHybridRetriever(store=source.EvidenceStore.from_items(items))
+        results = asyncio.run(retriever.retrieve("certifications academy", 2, {"company_id": "B"}))
+        assert results[0]["doc_id"] == "B-doc_4"
+        assert all(r["metadata"]["company_id"] == "B" for r in results)
+        assert asyncio.run(retriever.retrieve("talent", 2, {"company_id": "missing"})) == []
+
+        stats = retriever.shard_stats()
+        assert stats["loaded"] == 1 and list(stats["shards"]) == ["B"]
+        assert stats["shards"]["B"]["documents"] == len(source.MOCK_EVIDENCE_POOL)
+        assert stats["shards"]["B"]["memory_bytes"] > 0 and stats["shards"]["B"]["load_ms"] >= 0
+
+    def test_retrieve_returns_copies(self):
+        results = asyncio.run(source.hybrid_retriever.retrieve("talent", 1, {"company_id": "ACME-001"}))
+        results[0]["content"] = "changed"
+        again = asyncio.run(source.hybrid_retriever.retrieve("talent", 1, {"company_id": "ACME-001"}))
+        assert again[0]["content"] != "changed"
+
+
+class TestVectorIndex:
+    def test_hashed_embeddings_are_deterministic_and_normalised(self):
+        embedder = source.HashedNgramEmbedder(dim=64)
+        a = embedder.embed("cloud data infrastructure")
+        assert np.array_equal(a, source.HashedNgramEmbedder(dim=64).embed("cloud data infrastructure"))
+        assert np.isclose(np.linalg.norm(a), 1.0)
+        assert a @ embedder.embed("cloud data platform") > a @ embedder.embed("employee engagement survey")
+
+    def test_ivf_recall_against_brute_force(self):
+        rng = np.random.default_rng(3)
+        centers = source._normalize_rows(rng.standard_normal((40, 32)))
+        vectors = centers[rng.integers(0, 40, 4000)] + 0.05 * rng.standard_normal((4000, 32))
+        companies = [f"CO-{i % 50}" for i in range(4000)]
+        exact = source.BruteForceVectorIndex(32)
+        exact.add(vectors, companies)
+        ivf = source.IVFVectorIndex(32, nprobe=8, train_threshold=1000, exact_filter_threshold=10)
+        ivf.add(vectors, companies)
+        assert ivf.centroids is not None
+
+        recalls = []
+        for query in vectors[:50]:
+            truth = {row for _, row in exact.search(query, 10)}
+            recalls.append(len(truth & {row for _, row in ivf.search(query, 10)}) / 10)
+        assert np.mean(recalls) >= 0.9
+
+        filtered = ivf.search(vectors[0], 5, company_id="CO-7")
+        assert filtered and all(companies[row] == "CO-7" for _, row in filtered)
+
+    def test_large_shards_answer_semantic_queries_from_the_ivf_lists(self, monkeypatch):
+        items = [
+            {**template, "doc_id": f"BIG-{i}", "metadata": {**template["metadata"], "company_id": "BIG-1"}}
+            for i, template in enumerate(source.MOCK_EVIDENCE_POOL * (1100 // len(source.MOCK_EVIDENCE_POOL) + 1))
+        ]
+        retriever = source.MockHybridRetriever(store=source.EvidenceStore.from_items(items))
+        probed = []
+        inverted_list = source.IVFVectorIndex._inverted_list
+        monkeypatch.setattr(source.IVFVectorIndex, "_inverted_list", lambda self, i: probed.append(i) or inverted_list(self, i))
+
+        results = asyncio.run(retriever.retrieve("cloud data infrastructure", 5, {"company_id": "BIG-1"}))
+        assert retriever.segments[0].shard("BIG-1").embeddings.index.centroids is not None
+        assert probed and results and results[0]["vector_score"] > 0
+
+    def test_reciprocal_rank_fusion_rewards_agreement(self):
+        fused = source.reciprocal_rank_fusion([[1, 2, 3], [2, 3, 4]], k=60)
+        assert [doc for _, doc in fused] == [2, 3, 1, 4]
+
+    def test_retrieve_fuses_keyword_and_semantic_legs(self):
+        results = asyncio.run(source.hybrid_retriever.retrieve("certifications academy", 3, {"company_id": "ACME-001"}))
+        assert results[0]["doc_id"] == "doc_4"
+        assert results[0]["bm25_score"] > 0 and results[0]["vector_score"] > 0
+
+
+class TestEvidenceStore:
+    def test_round_trip_through_mmapped_file(self, tmp_path):
+        path = source.EvidenceStore.write(str(tmp_path / "evidence.oaev"), source.MOCK_EVIDENCE_POOL)
+        store = source.EvidenceStore.open(path)
+        assert len(store) == len(source.MOCK_EVIDENCE_POOL)
+        by_id = {item["doc_id"]: item for item in source.MOCK_EVIDENCE_POOL}
+        for row in range(len(store)):
+            item = store.item(row)
+            assert item == by_id[item["doc_id"]]
+
+        start, end = store.company_range("ACME-001")
+        assert end - start == 6
+        assert {store.company_id(row) for row in range(start, end)} == {"ACME-001"}
+        start, end = store.group_range("ACME-001", "talent")
+        assert [store.doc_id(row) for row in range(start, end)] == ["doc_4"]
+        assert store.company_range("UNKNOWN") == (0, 0)
+        assert store.group_range("ACME-001", "unknown") == (0, 0)
+
+    def test_excerpt_matches_string_truncation(self):
+        long_text = "é" * 600 + "tail"
+        store = source.EvidenceStore.from_items([
+            {"doc_id": "x", "content": long_text, "score": 0.5, "retrieval_method": "keyword",
+             "metadata": {"company_id": "C", "dimension": "talent", "source": "s"}},
+            {"doc_id": "y", "content": "short", "score": 0.4, "retrieval_method": "keyword",
+             "metadata": {"company_id": "C", "dimension": "culture", "source": "s"}},
+        ])
+        rows = {store.doc_id(row): row for row in range(len(store))}
+        assert store.excerpt(rows["x"], 500) == long_text[:500] + "..."
+        assert store.excerpt(rows["y"], 500) == "short"
+        assert isinstance(store.content_bytes(rows["y"]), memoryview)
+
+    def test_retriever_serves_from_store_file(self, tmp_path, monkeypatch):
+        path = source.EvidenceStore.write(str(tmp_path / "evidence.oaev"), source.MOCK_EVIDENCE_POOL)
+        monkeypatch.setenv(source.EVIDENCE_STORE_ENV, path)
+        retriever = source.MockHybridRetriever()
+        results = asyncio.run(retriever.retrieve("AI readiness data_infrastructure", 2, {"company_id": "ACME-001"}, 40))
+        assert results[0]["doc_id"] == "doc_1"
+        assert results[0]["content"].endswith("...") and len(results[0]["content"]) == 43
+
+
+class TestEvidenceIngestion:
+    def test_jsonl_stream_is_chunked_deduplicated_and_searchable(self, tmp_path):
+        long_text = " ".join(f"word{i}" for i in range(400)) + " quantum annealing"
+        dump = tmp_path / "dump.jsonl"
+        dump.write_text("\n".join([
+            json.dumps({"doc_id": "n1", "content": "Hired a Chief Data Officer", "company_id": "NEW-CO", "dimension": "leadership"}),
+            json.dumps({"doc_id": "n2", "content": "hired a  chief data officer", "metadata": {"company_id": "NEW-CO", "dimension": "leadership"}}),
+            "{not json",
+            json.dumps({"doc_id": "n3", "content": long_text, "company_id": "NEW-CO", "dimension": "technology_stack"}),
+            json.dumps({"doc_id": "n4", "content": "Hired a Chief Data Officer", "company_id": "OTHER-CO", "dimension": "leadership"}),
+        ]))
+        retriever = source.MockHybridRetriever()
+        ingestor = source.EvidenceIngestor(retriever, segment_size=2)
+        counts = ingestor.ingest(source.read_evidence_jsonl(str(dump)))
+        chunks = list(source.chunk_evidence([{"doc_id": "n3", "content": long_text}]))
+        assert len(chunks) > 1 and all(len(c["content"]) <= source.EVIDENCE_CHUNK_CHARS for c in chunks)
+        assert counts == {"read": 3 + len(chunks), "ingested": 2 + len(chunks), "duplicates": 1,
+                          "segments_flushed": len(retriever.segments) - 1}
+        assert ingestor.ingest(source.read_evidence_jsonl(str(dump)))["ingested"] == 0
+
+        results = asyncio.run(retriever.retrieve("quantum annealing", 3, {"company_id": "NEW-CO"}))
+        assert results[0]["doc_id"].startswith("n3#")
+        assert asyncio.run(retriever.retrieve("talent", 10, {"company_id": "ACME-001"}))[0]["doc_id"] == "doc_4"
+
+    def test_background_merges_bound_segments_without_losing_documents(self):
+        retriever = source.MockHybridRetriever()
+        ingestor = source.EvidenceIngestor(retriever, segment_size=1, max_segments=3, merge_factor=2)
+        for i in range(12):
+            ingestor.ingest([{"doc_id": f"m{i}", "content": f"data platform rollout phase {i}", "score": 0.5,
+                              "metadata": {"company_id": "MERGE-CO", "dimension": "data_infrastructure"}}])
+        ingestor.wait_for_merges()
+        assert len(retriever.segments) <= 3 and ingestor.totals["merges"] > 0
+        assert len(retriever) == len(source.MOCK_EVIDENCE_POOL) + 12
+        results = asyncio.run(retriever.retrieve("data platform rollout", 20, {"company_id": "MERGE-CO"}))
+        assert sorted(r["doc_id"] for r in results) == sorted(f"m{i}" for i in range(12))
+
+    def test_ingest_tool_invalidates_cached_evidence(self):
+        args = {"company_id": "TOOL-INGEST-CO", "dimension": "talent"}
+        assert call("get_company_evidence", args)["evidence_count"] == 0
+        doc = {"doc_id": "t1", "content": "Launched an internal ML guild", "company_id": "TOOL-INGEST-CO", "dimension": "talent"}
+        assert call("ingest_evidence", {"documents": [doc]})["ingested"] == 1
+        assert call("get_company_evidence", args)["evidence_items"][0]["doc_id"] == "t1"
+        assert call("ingest_evidence", {"documents": [doc]})["duplicates"] == 1
+
+
+class TestNearDuplicates:
+    def test_minhash_estimates_similarity_and_lsh_finds_candidates(self):
+        minhasher = source.MinHasher()
+        text = source.MOCK_EVIDENCE_POOL[0]["content"]
+        original, repost, other = minhasher.signatures([text, "Press release: " + text, source.MOCK_EVIDENCE_POOL[3]["content"]])
+        assert np.array_equal(original, source.MinHasher().signature(text))
+        assert source.minhash_similarity(original, repost)[0] >= source.NEAR_DUPLICATE_THRESHOLD
+        assert source.minhash_similarity(original, other)[0] < 0.2
+
+        lsh = source.LSHIndex(minhasher.num_perm)
+        lsh.add("original", original)
+        assert lsh.query(repost) == ["original"] and lsh.query(other) == []
+        with pytest.raises(ValueError):
+            source.LSHIndex(64, bands=5)
+
+    def test_diversified_retrieval_collapses_reposts(self):
+        talent = source.MOCK_EVIDENCE_POOL[3]
+        reposts = [
+            {**talent, "doc_id": f"repost_{i}", "content": f"{prefix}: {talent['content']}", "score": 0.5}
+            for i, prefix in enumerate(["Press release", "Job ad"])
+        ]
+        retriever = source.MockHybridRetriever(source.MOCK_EVIDENCE_POOL + reposts)
+        plain = asyncio.run(retriever.retrieve("certifications academy", 3, {"company_id": "ACME-001"}))
+        assert {r["doc_id"] for r in plain} == {"doc_4", "repost_0", "repost_1"}
+
+        diverse = asyncio.run(retriever.retrieve("certifications academy", 3, {"company_id": "ACME-001"}, diversify=True))
+        assert [r["doc_id"] for r in diverse] == [plain[0]["doc_id"]]
+        assert sorted(diverse[0]["near_duplicates"]) == sorted(r["doc_id"] for r in plain[1:])
+        assert retriever.shard_stats()["shards"]["ACME-001"]["near_duplicates"] == 2
+
+
+class TestReranker:
+    def test_feature_reranker_lifts_the_evaluation_set(self):
+        items, queries = source.rerank_eval_set(n_companies=2)
+        store = source.EvidenceStore.from_items(items)
+        baseline = source.evaluate_retrieval(source.MockHybridRetriever(store=store), queries)
+        stage = source.RerankStage()
+        reranked = source.evaluate_retrieval(source.MockHybridRetriever(store=store, rerank_stage=stage), queries, rerank=True)
+        assert reranked["ndcg_at_5"] > baseline["ndcg_at_5"] and reranked["mrr"] == 1.0
+        assert stage.stats()["queries"] == len(queries) and stage.stats()["over_budget"] == 0
+
+    def test_stage_batches_and_falls_back_to_first_stage_order_over_budget(self):
+        batches = []
+
+        class Reverse:
+            def score(self, query, candidates):
+                batches.append(len(candidates))
+                return np.array([float(c["rank"]) for c in candidates])
+
+        args = ("AI readiness all", 6, {"company_id": "ACME-001"})
+        first_stage = [r["doc_id"] for r in asyncio.run(source.hybrid_retriever.retrieve(*args))]
+        retriever = source.MockHybridRetriever(rerank_stage=source.RerankStage(Reverse(), top_n=5, batch_size=2))
+        reranked = asyncio.run(retriever.retrieve(*args, rerank=True))
+        assert batches == [2, 2, 1]
+        assert [r["doc_id"] for r in reranked] == first_stage[:5][::-1] + first_stage[5:]
+        assert [r["rerank_score"] for r in reranked[:5]] == [4.0, 3.0, 2.0, 1.0, 0.0] and "rerank_score" not in reranked[5]
+
+        ticks = iter(range(100))
+        retriever.rerank_stage = source.RerankStage(Reverse(), budget_ms=0.5, clock=lambda: next(ticks) * 1e-3)
+        fallback = asyncio.run(retriever.retrieve(*args, rerank=True))
+        assert [r["doc_id"] for r in fallback] == first_stage and "rerank_score" not in fallback[0]
+        assert retriever.rerank_stage.stats()["over_budget"] == 1
+
+    def test_evidence_tool_reranks_by_default(self):
+        data = call("get_company_evidence", {"company_id": "ACME-001", "dimension": "talent", "limit": 3})
+        assert data["evidence_items"][0]["doc_id"] == "doc_4" and "rerank_score" in data["evidence_items"][0]
+        plain = call("get_company_evidence", {"company_id": "ACME-001", "dimension": "talent", "limit": 3, "rerank": False})
+        assert "rerank_score" not in plain["evidence_items"][0]
+
+
+class TestToolResultCache:
+    def make_cache(self, clock, **policies):
+        return source.ToolResultCache(
+            max_entries=2,
+            policies=policies or {"tool": {"ttl": 10.0, "restamp": ("score_id",)}},
+            clock=lambda: clock[0],
+        )
+
+    def test_hits_are_restamped_and_expire(self):
+        clock = [0.0]
+        cache = self.make_cache(clock)
+        text = cache.put("tool", {"b": 1, "a": 2}, {"score_id": "original", "value": 1.5})
+        assert json.loads(text) == {"score_id": "original", "value": 1.5}
+
+        hit = json.loads(cache.get("tool", {"a": 2, "b": 1}))
+        assert hit["value"] == 1.5 and hit["score_id"] not in ("original", "\x00restamp:score_id\x00")
+        assert cache.stats()["hits"] == 1
+
+        clock[0] = 11.0
+        assert cache.get("tool", {"a": 2, "b": 1}) is None
+        assert cache.stats()["expirations"] == 1
+
+    def test_lru_eviction_and_opt_out(self):
+        clock = [0.0]
+        cache = self.make_cache(clock, tool={"ttl": 10.0, "restamp": ()}, uncached={"ttl": 0.0, "restamp": ()})
+        for i in range(3):
+            cache.put("tool", {"i": i}, {"i": i})
+            if i == 1:
+                cache.get("tool", {"i": 0})
+        assert cache.get("tool", {"i": 1}) is None
+        assert cache.get("tool", {"i": 0}) is not None
+        assert cache.stats()["evictions"] == 1
+
+        cache.put("uncached", {}, {"x": 1})
+        assert cache.get("uncached", {}) is None
+        assert cache.invalidate("tool") == 2
+
+    def test_call_tool_serves_repeat_calls_from_cache(self):
+        source.tool_result_cache.invalidate()
+        hits = source.tool_result_cache.hits
+        args = {"fund_id": "PE-FUND-001"}
+        first = call("get_fund_portfolio", args)
+        second = call("get_fund_portfolio", args)
+        assert source.tool_result_cache.hits == hits + 1
+        assert second["fund_air_score"] == first["fund_air_score"]
+        assert second["as_of"] != first["as_of"]
+
+    def test_scoring_is_not_cached(self):
+        # Every calculate_org_air_score result is persisted to the score history
+        hits = source.tool_result_cache.hits
+        args = {"company_id": "ACME-001", "sector_id": "technology", "dimension_scores": [70, 65, 75, 68, 72, 60, 70]}
+        first = call("calculate_org_air_score", args)
+        second = call("calculate_org_air_score", args)
+        assert source.tool_result_cache.hits == hits
+        assert second["final_score"] == first["final_score"]
+        assert second["score_id"] != first["score_id"]
+
+
+class TestToolRegistry:
+    def test_list_tools_is_built_once(self):
+        first = asyncio.run(source.list_tools())
+        assert first is asyncio.run(source.list_tools())
+        assert [tool.name for tool in first] == list(source.TOOL_REGISTRY)
+        assert "calculate_org_air_scores_batch" in source.TOOL_REGISTRY
+
+    def test_duplicate_registration_is_rejected(self):
+        with pytest.raises(ValueError):
+            source.register_tool("get_company_evidence", "dup", {"type": "object"})(source._handle_get_evidence)
+
+    def test_unknown_tool_returns_error(self):
+        assert call("no_such_tool", {}) == {"error": "Unknown tool: no_such_tool"}
+
+
+class TestArgumentValidation:
+    def test_call_tool_reports_field_level_errors(self):
+        data = call("calculate_org_air_score", {
+            "company_id": "ACME-001",
+            "sector_id": "aerospace",
+            "dimension_scores": [70, 65, 175, 68, 72, 60],
+        })
+        assert data["error"] == "Invalid arguments for tool calculate_org_air_score"
+        found = {(d["field"], d["constraint"]) for d in data["details"]}
+        assert found == {("sector_id", "enum"), ("dimension_scores", "minItems"), ("dimension_scores[2]", "maximum")}
+
+    def test_compiled_validator_covers_types_and_required(self):
+        validate = source.compile_schema({
+            "type": "object",
+            "properties": {
+                "limit": {"type": "integer", "minimum": 1, "maximum": 50},
+                "flag": {"type": "boolean"},
+                "changes": {"type": "object", "additionalProperties": {"type": "number"}},
+            },
+            "required": ["limit"],
+        })
+        arguments = {"limit": 5.0, "flag": True, "changes": {"a": 1.5}}
+        assert validate(arguments) == []
+        assert type(arguments["limit"]) is int and arguments["changes"]["a"] == 1.5
+        errors = validate({"limit": True, "changes": {"a": "x"}})
+        assert [(e["field"], e["constraint"]) for e in errors] == [("limit", "type"), ("changes.a", "type")]
+        assert validate({})[0] == {"field": "limit", "constraint": "required", "message": "is required"}
+
+    def test_any_of_accepts_either_branch(self):
+        validate = source.compile_schema({"anyOf": [
+            {"type": "string", "enum": ["all"]},
+            {"type": "array", "items": {"type": "integer"}},
+        ]})
+        assert validate("all") == [] and validate([1, 2]) == []
+        assert [e["constraint"] for e in validate("some")] == ["enum"]
+        assert [e["field"] for e in validate([1, "x"])] == ["[1]"]
+        assert validate(3)[0]["message"] == "expected string or array, got int"
+
+    def test_integral_floats_reach_handlers_as_ints(self):
+        validate = source.compile_schema({"type": "array", "items": {"type": "integer"}})
+        values = [1.0, 2]
+        assert validate(values) == [] and [type(v) for v in values] == [int, int]
+        evidence = call("get_company_evidence", {"company_id": "ACME-001", "limit": 5.0, "diversify": False})
+        assert evidence["evidence_count"] == len(evidence["evidence_items"]) == 5
+
+    def test_validators_fit_the_overhead_budget(self):
+        # 3x slack over VALIDATION_BUDGET_US absorbs timing noise on shared CI machines
+        slack = 3.0
+        for row in source.benchmark_argument_validation(n_calls=2000):
+            assert row["valid_us"] <= slack * source.VALIDATION_BUDGET_US["valid"], row
+            assert row["invalid_us"] <= slack * source.VALIDATION_BUDGET_US["invalid"], row
+
+
+class TestJsonSerializer:
+    def test_compact_encoding_of_rich_types(self):
+        import uuid as uuid_module
+        from datetime import datetime, timezone
+        from decimal import Decimal
+
+        stamp = datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+        ident = uuid_module.UUID(int=1)
+        text = source.COMPACT_JSON.dumps({"at": stamp, "amount": Decimal("1.25"), "id": ident, "n": np.float64(2.5)})
+        assert text == f'{{"at":"{stamp.isoformat()}","amount":1.25,"id":"{ident}","n":2.5}}'
+        assert source.PRETTY_JSON.dumps({"a": 1}) == '{\n  "a": 1\n}'
+
+    def test_unknown_types_are_rejected(self):
+        with pytest.raises(TypeError):
+            source.COMPACT_JSON.dumps({"x": object()})
+
+    def test_tool_responses_are_compact(self):
+        text = asyncio.run(source.call_tool("get_fund_portfolio", {"fund_id": "PE-FUND-001"}))[0].text
+        assert "\n" not in text and ": " not in text
+
+
+class TestEbitdaProjection:
+    def test_float_path_matches_decimal_audit(self):
+        rng = np.random.default_rng(9)
+        entry = rng.uniform(0, 100, 500).round(2)
+        target = rng.uniform(0, 100, 500).round(2)
+        h_r = rng.uniform(0, 100, 500).round(1)
+        target[:3] = entry[:3] + np.array([25.0, 25.01, 24.99])  # straddle the gamma_3 threshold
+        fast = source.project_ebitda_impact_batch(entry, target, h_r)
+        for i in range(len(entry)):
+            exact = source._project_ebitda_decimal(entry[i], target[i], h_r[i])
+            scalar = source._project_ebitda_float(entry[i], target[i], h_r[i])
+            for scenario in ("conservative", "base", "optimistic"):
+                assert fast[scenario][i] == scalar[scenario]
+                assert abs(fast[scenario][i] - float(exact[scenario])) <= source.EBITDA_FLOAT_TOLERANCE
+
+    def test_precision_argument_selects_audit_mode(self):
+        args = {"company_id": "ACME-001", "entry_score": 40, "target_score": 70, "h_r_score": 72}
+        fast = call("project_ebitda_impact", args)
+        audit = call("project_ebitda_impact", {**args, "precision": "decimal"})
+        assert fast["precision"] == "float" and audit["precision"] == "decimal"
+        assert audit["scenarios"]["base"]["ebitda_impact_pct"] == pytest.approx(0.0025 + 1.5 + 0.54 + 0.01)
+        for scenario in ("conservative", "base", "optimistic"):
+            assert fast["scenarios"][scenario]["ebitda_impact_pct"] == pytest.approx(
+                audit["scenarios"][scenario]["ebitda_impact_pct"], abs=source.EBITDA_FLOAT_TOLERANCE
+            )
+
+
+class TestEbitdaGrid:
+    ARGS = {
+        "company_id": "ACME-001",
+        "entry_score": 50,
+        "target_score": {"start": 60, "stop": 90, "steps": 7},
+        "h_r_score": {"start": 40, "stop": 80, "steps": 3},
+        "holding_period_years": {"start": 3, "stop": 5},
+    }
+
+    def test_grid_matches_single_projections(self):
+        grid = call("project_ebitda_grid", self.ARGS)
+        assert grid["shape"] == [3, 7, 3]
+        assert grid["holding_period_years"] == [3, 4, 5]
+        for s, scenario in enumerate(grid["axes"]["scenario"]):
+            for i, target in enumerate(grid["axes"]["target_score"]):
+                for j, h_r in enumerate(grid["axes"]["h_r_score"]):
+                    single = call("project_ebitda_impact", {
+                        "company_id": "ACME-001", "entry_score": 50, "target_score": target, "h_r_score": h_r,
+                    })
+                    assert grid["ebitda_impact_pct"][s][i][j] == single["scenarios"][scenario]["ebitda_impact_pct"]
+
+    def test_grids_are_not_cached(self):
+        hits = source.tool_result_cache.hits
+        call("project_ebitda_grid", self.ARGS)
+        call("project_ebitda_grid", self.ARGS)
+        assert source.tool_result_cache.hits == hits
+
+    def test_threshold_step_and_cell_limit(self):
+        grid = call("project_ebitda_grid", {**self.ARGS, "target_score": {"start": 75, "stop": 75.5, "steps": 2}})
+        assert grid["gamma_3_threshold_target"] == 75.0
+        below, above = grid["ebitda_impact_pct"][1][0][0], grid["ebitda_impact_pct"][1][1][0]
+        assert above - below == pytest.approx(0.05 * 0.5 + 0.025 * 0.5 * 40 / 100 + 0.01)
+        at_cap = {**self.ARGS, "target_score": {"start": 0, "stop": 100, "steps": 200},
+                  "h_r_score": {"start": 0, "stop": 100, "steps": 100}}
+        assert len(json.dumps(call("project_ebitda_grid", at_cap))) < 2_000_000
+        too_big = {**at_cap, "h_r_score": {"start": 0, "stop": 100, "steps": 101}}
+        assert "limit" in call("project_ebitda_grid", too_big)["error"]
+
+
+class TestWhatIfSimulation:
+    ARGS = {
+        "company_id": "ACME-001",
+        "scenario_name": "Data platform",
+        "dimension_changes": {"data_infra": 7, "talent": 7},
+        "investment_usd": 1_000_000,
+        "mode": "monte_carlo",
+        "samples": 20_000,
+        "seed": 3,
+    }
+
+    def test_bands_are_reproducible_and_centred_on_scalar_math(self):
+        first = call("analyze_whatif_scenario", self.ARGS)
+        source.tool_result_cache.invalidate()
+        second = call("analyze_whatif_scenario", self.ARGS)
+        assert first["org_air_change"] == second["org_air_change"]
+        assert first["samples_completed"] == 20_000
+
+        calc = source.org_air_calculator
+        common = dict(company_id="ACME-001", sector_id="technology", talent_concentration=0.2,
+                      hr_baseline=75, position_factor=0.1, evidence_count=10)
+        improved = [57.0, 50.0, 50.0, 57.0, 50.0, 50.0, 50.0]
+        expected = (calc.calculate(dimension_scores=improved, **common)["final_score"]
+                    - calc.calculate(dimension_scores=[50.0] * 7, **common)["final_score"])
+        band = first["org_air_change"]
+        assert band["p5"] < band["p25"] < band["p50"] < band["p75"] < band["p95"]
+        assert band["p50"] == pytest.approx(expected, rel=0.05)
+        assert first["projected_impact_usd"]["p50"] == pytest.approx(band["p50"] * 1_000_000 * 0.05, rel=1e-6)
+
+    def test_float_typed_integers_are_accepted(self):
+        source.tool_result_cache.invalidate()
+        expected = call("analyze_whatif_scenario", self.ARGS)
+        source.tool_result_cache.invalidate()
+        result = call("analyze_whatif_scenario", {**self.ARGS, "samples": 20_000.0, "seed": 3.0})
+        assert result["samples_completed"] == 20_000
+        assert result["org_air_change"] == expected["org_air_change"]
+
+    def test_latency_budget_and_unknown_dimensions(self):
+        result = source.simulate_whatif(
+            source._resolve_dimension_changes({"culture": 5}), np.full(7, 50.0), 82.5, 0.2, 0.0,
+            samples=10 * source.WHATIF_CHUNK_ROWS, seed=0, latency_budget_s=0.0,
+        )
+        assert result["samples_completed"] == source.WHATIF_CHUNK_ROWS
+        assert "Unknown dimension" in call("analyze_whatif_scenario", {**self.ARGS, "dimension_changes": {"moat": 3}})["error"]
+
+
+class TestFundPortfolio:
+    def test_incremental_aggregates_match_full_rescan(self):
+        rng = np.random.default_rng(12)
+        store = source.FundPortfolioStore.from_holdings(source.MOCK_FUND_HOLDINGS)
+        companies = [row["company_id"] for row in source.MOCK_FUND_HOLDINGS["PE-FUND-001"]]
+        for step in range(500):
+            store.record_score(companies[rng.integers(len(companies))], float(rng.uniform(0, 100)))
+            if step == 250:
+                store.remove_holding("PE-FUND-001", "GRID-ENR")
+                store.add_holding("PE-FUND-001", "ACME-001", weight=0.3)
+
+        summary = store.summary("PE-FUND-001", include_companies=True)
+        weights = {row["company_id"]: row["weight"] for row in summary["companies"]}
+        scores = np.array([store.scores[c] for c in weights])
+        w = np.array(list(weights.values()))
+        assert summary["company_count"] == 11
+        assert summary["fund_air_score"] == pytest.approx(float(w @ scores))
+        assert summary["metrics"]["avg_org_air"] == pytest.approx(scores.mean())
+        assert summary["metrics"]["min_org_air"] == scores.min()
+        assert summary["metrics"]["max_org_air"] == scores.max()
+        assert summary["metrics"]["hhi"] == pytest.approx(float((w ** 2).sum()))
+        assert len(store.funds["PE-FUND-001"].min_heap) <= 2 * 11 + 17
+
+    def test_rescoring_refreshes_cached_fund_portfolio(self):
+        original = source.fund_portfolio_store.scores["ACME-001"]
+        try:
+            before = call("get_fund_portfolio", {"fund_id": "PE-FUND-002", "include_trends": True})
+            call("calculate_org_air_score", {
+                "company_id": "ACME-001", "sector_id": "technology", "dimension_scores": [95] * 7,
+            })
+            after = call("get_fund_portfolio", {"fund_id": "PE-FUND-002", "include_trends": True})
+            assert after["fund_air_score"] > before["fund_air_score"]
+            assert after["trends"]["points"][-1]["fund_air_score"] == pytest.approx(after["fund_air_score"])
+            assert "companies" in after
+            assert "companies" not in call("get_fund_portfolio", {"fund_id": "PE-FUND-002", "include_companies": False})
+            assert call("get_fund_portfolio", {"fund_id": "NO-SUCH-FUND"})["error"] == "Unknown fund: NO-SUCH-FUND"
+        finally:
+            source._record_scores({"ACME-001": original})
+
+    def test_float_typed_trend_periods(self):
+        trends = call("get_fund_portfolio", {"fund_id": "PE-FUND-002", "include_trends": True, "trend_periods": 3.0})["trends"]
+        assert 0 < len(trends["points"]) <= 3
+
+
+class TestScoreHistory:
+    def test_rollups_match_raw_scores_and_survive_reopen(self, tmp_path):
+        from datetime import datetime, timedelta, timezone
+
+        path = str(tmp_path / "history.bin")
+        store = source.ScoreHistoryStore(path)
+        rng = np.random.default_rng(13)
+        start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+        stamps = [start + timedelta(hours=int(h)) for h in np.sort(rng.integers(0, 24 * 400, 2_000))]
+        scores = rng.uniform(40, 90, len(stamps))
+        for stamp, score in zip(stamps, scores):
+            store.append("ACME-001", float(score), stamp)
+
+        monthly = store.trend("ACME-001", "monthly")
+        assert len(monthly) == 14 and sum(point["count"] for point in monthly) == 2_000
+        january = scores[[s.month == 1 and s.year == 2023 for s in stamps]]
+        assert monthly[0]["period_start"] == "2023-01-01T00:00:00+00:00"
+        assert monthly[0]["mean"] == pytest.approx(january.mean())
+        assert monthly[0]["min"] == january.min() and monthly[0]["last"] == january[-1]
+        weekly = store.trend("ACME-001", "weekly", limit=3)
+        assert len(weekly) == 3 and datetime.fromisoformat(weekly[0]["period_start"]).weekday() == 0
+
+        with open(path, "ab") as handle:
+            handle.write(b"\x01\x02")  # torn trailing record
+        reopened = source.ScoreHistoryStore(path)
+        assert reopened.count("ACME-001") == 2_000
+        assert reopened.trend("ACME-001", "daily") == store.trend("ACME-001", "daily")
+
+    def test_scoring_feeds_history_and_score_resource(self):
+        count = source.score_history_store.count("HEALTH-SYS")
+        result = call("calculate_org_air_score", {
+            "company_id": "HEALTH-SYS", "sector_id": "healthcare", "dimension_scores": [60] * 7,
+        })
+        resource = json.loads(asyncio.run(source.read_resource("orgair://company/HEALTH-SYS/score")))
+        assert resource["org_air_score"] == result["final_score"]
+        assert resource["score_count"] == count + 1
+        assert resource["monthly_trend"][-1]["last"] == result["final_score"]
+        missing = json.loads(asyncio.run(source.read_resource("orgair://company/NOBODY/score")))
+        assert "error" in missing
+
+
+def read(uri):
+    return json.loads(asyncio.run(source.read_resource(uri)))
+
+
+class TestResourceRouter:
+    def test_templates_dispatch_with_params(self):
+        assert read("orgair://sectors")["sectors"][0]["id"] == "technology"
+        assert read("orgair://company/ACME-001")["company_id"] == "ACME-001"
+        assert read("orgair://company/ACME%2F01/evidence")["company_id"] == "ACME/01"
+        assert read("orgair://fund/PE-FUND-001")["company_count"] == 12
+        templates = [t.uriTemplate for t in asyncio.run(source.list_resource_templates())]
+        assert "orgair://company/{company_id}/score" in templates
+        assert [str(r.uri) for r in asyncio.run(source.list_resources())] == [
+            "orgair://companies", "orgair://sectors", "orgair://parameters/v2.0", "orgair://server/metrics",
+        ]
+
+    def test_unknown_uris_report_candidates(self):
+        unknown = read("orgair://company/ACME-001/unknown")
+        assert unknown["error"] == "Unknown resource: orgair://company/ACME-001/unknown"
+        assert sorted(unknown["candidates"]) == [
+            "orgair://company/{company_id}",
+            "orgair://company/{company_id}/evidence",
+            "orgair://company/{company_id}/score",
+        ]
+        assert read("other://companies")["candidates"] == []
+
+    def test_typed_params_and_conflicts(self):
+        router = source.ResourceRouter()
+        source.RESOURCE_ROUTER, original = router, source.RESOURCE_ROUTER
+        try:
+            @source.register_resource("test://fund/{fund_id}/year/{year:int}", name="Year", description="")
+            async def by_year(fund_id, year):
+                return {"fund_id": fund_id, "year": year}
+
+            spec, params, _ = router.resolve("test://fund/F1/year/2024")
+            assert spec.definition.uriTemplate == "test://fund/{fund_id}/year/{year}"
+            assert params == {"fund_id": "F1", "year": 2024}
+            spec, _, candidates = router.resolve("test://fund/F1/year/last")
+            assert spec is None and candidates == ["test://fund/{fund_id}/year/{year:int}"]
+            with pytest.raises(ValueError):
+                source.register_resource("test://fund/{company_id}", name="Clash", description="")(by_year)
+        finally:
+            source.RESOURCE_ROUTER = original
+
+
+class TestStaticResources:
+    def test_rendered_once_with_etag_and_not_modified(self, monkeypatch):
+        source.invalidate_static_resources()
+        first = read("orgair://sectors")
+        etag = first["etag"]
+        assert len(etag) == 16 and first["sectors"][0]["h_r_baseline"] == 85
+
+        calls = []
+        spec = source.RESOURCE_ROUTER.resources["orgair://sectors"]
+        original_handler = spec.handler
+
+        async def counting_handler():
+            calls.append(1)
+            return await original_handler()
+
+        monkeypatch.setattr(source.RESOURCE_ROUTER.roots["orgair"].literals["sectors"], "resource",
+                            spec._replace(handler=counting_handler))
+        assert read("orgair://sectors")["etag"] == etag and calls == []
+        assert read(f"orgair://sectors?if_none_match={etag}") == {
+            "uri": "orgair://sectors", "not_modified": True, "etag": etag,
+        }
+        assert read("orgair://sectors?if_none_match=stale")["etag"] == etag
+
+        source.invalidate_static_resources("orgair://sectors")
+        assert read("orgair://sectors")["etag"] == etag and calls == [1]
+
+    def test_static_resources_reject_parameters(self):
+        with pytest.raises(ValueError):
+            source.register_resource("test://x/{y}", name="X", description="", static=True)(source._resource_company)
+
+
+class TestParameterRegistry:
+    @pytest.fixture
+    def registry_file(self, tmp_path, monkeypatch):
+        path = tmp_path / "params.json"
+        path.write_text(open(source.DEFAULT_PARAMETERS_PATH).read())
+        registry = source.ParameterRegistry(str(path))
+        monkeypatch.setattr(source, "parameter_registry", registry)
+        source.tool_result_cache.invalidate()
+        source.invalidate_static_resources()
+        yield path, registry
+        monkeypatch.undo()
+        source.refresh_sector_schemas()
+        source.tool_result_cache.invalidate()
+        source.invalidate_static_resources()
+
+    def test_hot_reload_swaps_every_consumer(self, registry_file):
+        path, registry = registry_file
+        args = {"company_id": "ACME-001", "entry_score": 40, "target_score": 70, "h_r_score": 72}
+        before = call("project_ebitda_impact", args)
+        assert before["parameter_version"] == "v2.0"
+        assert not source.reload_parameters()
+
+        document = json.loads(path.read_text())
+        document["version"] = "v2.1"
+        document["sectors"][0]["h_r_baseline"] = 90
+        document["ebitda"]["gamma_0"] = "0.0125"
+        path.write_text(json.dumps(document))
+        assert source.reload_parameters()
+
+        after = call("project_ebitda_impact", args)
+        assert after["parameter_version"] == "v2.1"
+        assert after["scenarios"]["base"]["ebitda_impact_pct"] == pytest.approx(
+            before["scenarios"]["base"]["ebitda_impact_pct"] + 0.01
+        )
+        assert read("orgair://sectors")["sectors"][0]["h_r_baseline"] == 90
+        assert read("orgair://parameters/v2.0")["version"] == "v2.1"
+        score = call("calculate_org_air_score", {
+            "company_id": "TEST-CO", "sector_id": "technology", "dimension_scores": [50] * 7,
+        })
+        assert score["components"]["h_r_score"] == pytest.approx(90 * 1.1)
+        assert score["parameter_version"] == "v2.1"
+
+    def test_stdio_main_watches_the_parameter_file(self, registry_file, monkeypatch):
+        path, registry = registry_file
+        monkeypatch.setattr(source, "PARAMETERS_WATCH_INTERVAL_S", 0.01)
+        args = {"company_id": "ACME-001", "entry_score": 40, "target_score": 70, "h_r_score": 72}
+        seen = []
+
+        @contextlib.asynccontextmanager
+        async def fake_stdio():
+            yield None, None
+
+        async def fake_run(read_stream, write_stream, options):
+            seen.append(json.loads((await source.call_tool("project_ebitda_impact", args))[0].text)["parameter_version"])
+            document = json.loads(path.read_text())
+            document["version"] = "v2.2"
+            path.write_text(json.dumps(document))
+            for _ in range(200):
+                await asyncio.sleep(0.01)
+                if registry.snapshot.version == "v2.2":
+                    break
+            seen.append(json.loads((await source.call_tool("project_ebitda_impact", args))[0].text)["parameter_version"])
+
+        monkeypatch.setattr(source, "stdio_server", fake_stdio)
+        monkeypatch.setattr(source.mcp_server, "run", fake_run)
+        asyncio.run(source.main("stdio"))
+        assert seen == ["v2.0", "v2.2"]
+
+    def test_sectors_added_to_the_file_are_accepted_by_every_tool(self, registry_file):
+        path, registry = registry_file
+        args = {"company_id": "AERO-1", "sector_id": "aerospace", "dimension_scores": [50] * 7}
+        assert call("calculate_org_air_score", args)["details"][0]["constraint"] == "enum"
+
+        document = json.loads(path.read_text())
+        document["sectors"].append({**document["sectors"][0], "id": "aerospace", "h_r_baseline": 77})
+        path.write_text(json.dumps(document))
+        assert source.reload_parameters()
+
+        assert call("calculate_org_air_score", args)["components"]["h_r_score"] == pytest.approx(77 * 1.1)
+        batch = call("calculate_org_air_scores_batch", {
+            "company_ids": ["AERO-1"], "sector_ids": ["aerospace"], "dimension_scores": [[50] * 7],
+        })
+        assert batch["company_count"] == 1
+        tool = next(t for t in asyncio.run(source.list_tools()) if t.name == "analyze_whatif_scenario")
+        assert "aerospace" in tool.inputSchema["properties"]["sector_id"]["enum"]
+
+    def test_malformed_file_keeps_current_snapshot(self, registry_file):
+        path, registry = registry_file
+        snapshot = registry.snapshot
+        path.write_text('{"version": "v9"}')
+        with pytest.raises(ValueError):
+            source.reload_parameters()
+        assert registry.snapshot is snapshot
+
+
+class TestHttpTransport:
+    def test_concurrent_sessions_share_one_process(self):
+        report = source.benchmark_http_transport(sessions=4, concurrency=2, calls_per_session=2)
+        assert report["errors"] == 0 and report["calls"] == 8
+        assert report["p50_ms"] <= report["p99_ms"]
+
+    def test_excess_posts_get_503(self):
+        release = asyncio.Event()
+
+        async def slow_app(scope, receive, send):
+            await release.wait()
+
+        async def scenario():
+            limiter = source.ConcurrencyLimitMiddleware(slow_app, max_concurrent=1, queue_timeout=0.05)
+            sent = []
+
+            async def send(message):
+                sent.append(message)
+
+            scope = {"type": "http", "method": "POST", "headers": []}
+            first = asyncio.create_task(limiter(scope, None, send))
+            await asyncio.sleep(0)
+            await limiter(scope, None, send)
+            assert sent[0]["status"] == 503 and limiter.rejected == 1 and limiter.in_flight == 1
+            release.set()
+            await first
+            assert limiter.in_flight == 0
+
+        asyncio.run(scenario())
+
+
+class TestToolWorkerPool:
+    BATCH = {
+        "company_ids": ["POOL-A", "POOL-B"],
+        "sector_ids": ["technology", "energy"],
+        "dimension_scores": [[60] * 7, [40] * 7],
+    }
+
+    @pytest.fixture(autouse=True)
+    def pool(self, monkeypatch):
+        pool = source.ToolWorkerPool(2)
+        monkeypatch.setattr(source, "tool_worker_pool", pool)
+        yield pool
+        pool.shutdown()
+
+    def test_workers_do_not_fork_the_server(self, pool):
+        assert pool._pool()._mp_context.get_start_method() in ("forkserver", "spawn")
+
+    def test_cpu_tools_run_in_workers_with_side_effects_on_the_loop(self, pool):
+        completed = pool.completed
+        recorded = source.score_history_store.count("POOL-A")
+        result = call("calculate_org_air_scores_batch", self.BATCH)
+        assert [row["company_id"] for row in result["results"]] == ["POOL-A", "POOL-B"]
+        assert pool.completed == completed + 1
+        assert source.score_history_store.count("POOL-A") == recorded + 1
+
+        linear = call("analyze_whatif_scenario", {
+            "company_id": "ACME-001", "scenario_name": "x", "dimension_changes": {"talent": 5},
+        })
+        assert linear["org_air_change"] == pytest.approx(0.7) and pool.completed == completed + 1
+
+        metrics = read("orgair://server/metrics")["tool_worker_pool"]
+        assert metrics["completed"] == pool.completed and metrics["run_ms"]["p50"] is not None
+
+    def test_worker_sees_callers_parameter_snapshot(self, monkeypatch):
+        document = json.loads(open(source.DEFAULT_PARAMETERS_PATH, "rb").read())
+        document["version"] = "v-test"
+        snapshot = source.ParameterSnapshot.parse(json.dumps(document).encode())
+        monkeypatch.setattr(source.parameter_registry, "snapshot", snapshot)
+        assert call("calculate_org_air_scores_batch", self.BATCH)["parameter_version"] == "v-test"
+
+    def test_awaiting_handlers_are_rejected(self):
+        async def awaits():
+            await asyncio.sleep(0)
+
+        with pytest.raises(RuntimeError):
+            source._run_coroutine_sync(awaits())
+        with pytest.raises(ValueError):
+            source.register_tool("bad_tool", "", {"type": "object"}, execution="thread")(awaits)
+
+
+class TestValueCreationPlan:
+    def test_dag_runs_independent_steps_concurrently(self):
+        order = []
+
+        def step(name, delay):
+            async def run(inputs):
+                order.append(("start", name, sorted(inputs)))
+                await asyncio.sleep(delay)
+                return name
+            return run
+
+        async def failing(inputs):
+            raise RuntimeError("boom")
+
+        steps = {
+            "a": ((), step("a", 0.05)),
+            "b": ((), step("b", 0.05)),
+            "c": (("a", "b"), step("c", 0.0)),
+            "bad": ((), failing),
+            "after_bad": (("bad",), step("after_bad", 0.0)),
+        }
+        import time
+
+        started = time.perf_counter()
+        results = asyncio.run(source.run_dag(steps))
+        assert time.perf_counter() - started < 0.09  # a and b overlap
+        assert results["c"] == "c" and ("start", "c", ["a", "b"]) in order
+        assert isinstance(results["bad"], RuntimeError) and isinstance(results["after_bad"], RuntimeError)
+        with pytest.raises(ValueError):
+            asyncio.run(source.run_dag({"x": (("y",), step("x", 0)), "y": ((), step("y", 0))}))
+
+    def test_plan_matches_sequential_tool_calls(self):
+        args = {"company_id": "ACME-001", "sector_id": "technology",
+                "dimension_scores": [70, 65, 75, 68, 72, 60, 70], "target_score": 80, "investment_usd": 2_000_000}
+        plan = call("build_value_creation_plan", args)
+        assert plan["errors"] == {}
+        assert set(plan["evidence"]) == {"data_infrastructure", "talent"}
+        score = call("calculate_org_air_score", {k: args[k] for k in ("company_id", "sector_id", "dimension_scores")})
+        assert plan["summary"]["current_org_air"] == score["final_score"]
+        ebitda = call("project_ebitda_impact", {
+            "company_id": "ACME-001", "entry_score": score["final_score"], "target_score": 80,
+            "h_r_score": score["components"]["h_r_score"], "holding_period_years": 3,
+        })
+        assert plan["summary"]["base_ebitda_impact_pct"] == ebitda["scenarios"]["base"]["ebitda_impact_pct"]
+        # gaps to the target for data_infrastructure (70) and talent (68)
+        assert plan["scenario"]["dimension_changes"] == {"data_infrastructure": 10.0, "talent": 12.0}
+
+
+    def test_monte_carlo_plan_summarises_the_median_change(self):
+        args = {"company_id": "ACME-001", "sector_id": "technology", "dimension_scores": [70, 65, 75, 68, 72, 60, 70],
+                "target_score": 80, "scenario_mode": "monte_carlo"}
+        plan = call("build_value_creation_plan", args)
+        assert plan["errors"] == {}
+        summary = plan["summary"]
+        assert summary["projected_org_air_change"] == plan["scenario"]["org_air_change"]["p50"]
+        assert summary["projected_org_air_change_band"] == plan["scenario"]["org_air_change"]
+
+        linear = call("build_value_creation_plan", {**args, "scenario_mode": "linear"})["summary"]
+        assert isinstance(linear["projected_org_air_change"], float) and linear["projected_org_air_change_band"] is None
+
+
+class TestSingleFlight:
+    def test_identical_concurrent_calls_share_one_execution(self, monkeypatch):
+        spec = source.TOOL_REGISTRY["calculate_org_air_score"]
+        executions = []
+
+        async def slow_handler(args):
+            executions.append(args["company_id"])
+            await asyncio.sleep(0.02)
+            return await spec.handler(args)
+
+        monkeypatch.setitem(source.TOOL_REGISTRY, "calculate_org_air_score", spec._replace(handler=slow_handler))
+        args = {"company_id": "FLIGHT-1", "sector_id": "technology", "dimension_scores": [55] * 7}
+        other = {**args, "company_id": "FLIGHT-2"}
+        coalesced = source.tool_single_flight.coalesced
+
+        async def burst():
+            return await asyncio.gather(*(source.call_tool("calculate_org_air_score", a) for a in [args] * 5 + [other]))
+
+        results = [json.loads(r[0].text) for r in asyncio.run(burst())]
+        assert sorted(executions) == ["FLIGHT-1", "FLIGHT-2"]
+        assert source.tool_single_flight.coalesced == coalesced + 4
+        assert len({r["final_score"] for r in results[:5]}) == 1
+        assert len({r["score_id"] for r in results[:5]}) == 5
+        assert source.tool_single_flight.stats()["in_flight"] == 0
+
+    def test_cancelled_caller_does_not_cancel_shared_work(self):
+        flight = source.SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.02)
+            return "done"
+
+        async def scenario():
+            first = asyncio.ensure_future(flight.run("k", "tool", work))
+            second = asyncio.ensure_future(flight.run("k", "tool", work))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second
+
+        assert asyncio.run(scenario()) == ("done", True)